@@ -0,0 +1,68 @@
+import hashlib
+import os
+import tempfile
+import zlib
+from pathlib import Path
+from typing import Optional
+
+from settings import BLOB_PREVIEW_CHARS, BLOB_READ_CHARS
+
+HANDLE_LENGTH = 12
+
+class BlobStore:
+    """Content-addressed store for large tool outputs.
+
+    Blobs are zlib-compressed files named by the SHA-256 of their text, so
+    identical outputs are stored once. History keeps a short stub with the
+    handle and the model reads the full text back with the blob tool.
+    """
+
+    def __init__(self, blob_dir: Path = Path("data/blobs")):
+        self.blob_dir = blob_dir
+        self.blob_dir.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, digest: str) -> Path:
+        return self.blob_dir / digest[:2] / digest
+
+    def put(self, text: str) -> str:
+        """Store the text and return its handle (a digest prefix)."""
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        path = self._path(digest)
+        if not path.exists():
+            path.parent.mkdir(exist_ok=True)
+            # The leading dot keeps unfinished writes out of get()'s handle glob
+            fd, temp = tempfile.mkstemp(prefix=".", suffix=".tmp", dir=path.parent)
+            with os.fdopen(fd, "wb") as f:
+                f.write(zlib.compress(text.encode("utf-8")))
+            os.replace(temp, path)
+        return digest[:HANDLE_LENGTH]
+
+    def get(self, handle: str) -> Optional[str]:
+        handle = handle.strip().lower()
+        if len(handle) < HANDLE_LENGTH or not all(c in "0123456789abcdef" for c in handle):
+            return None
+        matches = list((self.blob_dir / handle[:2]).glob(f"{handle}*"))
+        if len(matches) != 1:
+            return None
+        return zlib.decompress(matches[0].read_bytes()).decode("utf-8")
+
+    def stub(self, text: str) -> str:
+        """Store the text and return what history keeps in its place."""
+        handle = self.put(text)
+        preview = text[:BLOB_PREVIEW_CHARS].rstrip()
+        return (f"[Stored output {handle}, {len(text)} chars. Preview:\n{preview}\n...\n"
+                f"Use blob(id='{handle}') to read it in full.]")
+
+    def process(self, blob_id: str, offset: int = 0) -> str:
+        try:
+            offset = max(0, int(offset))
+        except (TypeError, ValueError):
+            return "Error: offset must be a whole number"
+        text = self.get(blob_id)
+        if text is None:
+            return f"Error: Blob {blob_id} not found"
+        part = text[offset:offset + BLOB_READ_CHARS]
+        end = offset + len(part)
+        if end < len(text):
+            part += f"\n[Showing chars {offset}-{end} of {len(text)}; use offset={end} for more]"
+        return part
@@ -0,0 +1,101 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from settings import TOOL_CACHE_SIZE, TOOL_CACHE_TTL
+from utils.tracing import tracer
+
+# Modes that only read, per tool. None means every call of the tool is a read.
+READ_MODES = {
+    "calendar": {"r", "f"},
+    "tasks": {"r"},
+    "notion": {"list_databases", "query_db", "get_page_content"},
+    "url": None,
+}
+
+# Which cached read modes a write mode makes stale, per tool. None means all of the tool's entries.
+INVALIDATES = {
+    "calendar": {"w": None, "d": None},
+    "tasks": {"w": None, "d": None},
+    "notion": {
+        "create_page": {"query_db", "get_page_content"},
+        "update_page_props": {"query_db", "get_page_content"},
+        "add_page_content": {"get_page_content"},
+    },
+}
+
+CacheKey = Tuple[str, str, str]
+
+def is_error_result(result: str) -> bool:
+    return result.startswith(("Error", "An error occurred", "Invalid")) or '"error": true' in result[:200]
+
+class ToolCache:
+    """LRU cache of read-only tool results with per-tool TTLs.
+
+    Hits and misses are counted as tool_cache_requests_total on /metrics.
+    """
+
+    def __init__(self, max_size: int = TOOL_CACHE_SIZE, ttl: Dict[str, float] = TOOL_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries: "OrderedDict[CacheKey, Tuple[float, str]]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    def key(self, name: str, args: Dict[str, Any]) -> Optional[CacheKey]:
+        """The cache key of a read call, None for writes and uncached tools."""
+        if not self.ttl.get(name) or name not in READ_MODES:
+            return None
+        mode = str(args.get("mode", ""))
+        if READ_MODES[name] is not None and mode not in READ_MODES[name]:
+            return None
+        normalized = {key: value for key, value in args.items() if key != "mode" and value not in (None, "")}
+        return name, mode, json.dumps(normalized, sort_keys=True, ensure_ascii=False)
+
+    def peek(self, key: CacheKey) -> Optional[str]:
+        """A fresh cached result without counting a request."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and entry[0] > time.monotonic():
+                self.entries.move_to_end(key)
+                return entry[1]
+            if entry:
+                del self.entries[key]
+            return None
+
+    def get(self, key: CacheKey) -> Optional[str]:
+        result = self.peek(key)
+        tracer.increment("tool_cache_requests_total", tool=key[0], result="hit" if result is not None else "miss")
+        return result
+
+    def put(self, key: CacheKey, result: Any) -> None:
+        if not isinstance(result, str) or is_error_result(result):
+            return
+        evicted = 0
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl[key[0]], result)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                evicted += 1
+        if evicted:
+            tracer.increment("tool_cache_evictions_total", evicted)
+
+    def invalidate(self, name: str, modes: Optional[set] = None) -> None:
+        """Drop a tool's entries, optionally only those of some read modes."""
+        with self.lock:
+            stale = [key for key in self.entries if key[0] == name and (modes is None or key[1] in modes)]
+            for key in stale:
+                del self.entries[key]
+        if stale:
+            tracer.increment("tool_cache_invalidations_total", len(stale), tool=name)
+
+    def after_write(self, name: str, args: Dict[str, Any]) -> bool:
+        """Invalidate the entries a non-read call may have made stale, True if it was a write."""
+        writes = INVALIDATES.get(name, {})
+        mode = str(args.get("mode", ""))
+        if mode in writes:
+            self.invalidate(name, writes[mode])
+            return True
+        return False
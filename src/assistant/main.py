@@ -1,64 +1,232 @@
-from config import ASSISTANT_MODEL, NOTION_API_TOKEN, NOTION_DATABASES
+from settings import (ASSISTANT_MODEL, NOTION_API_TOKEN, NOTION_DATABASES, IMAGE_HISTORY_ATTACH, PREFETCH_ENABLED,
+                      BLOB_THRESHOLD, TASK_PAGE_SIZE, CALENDAR_MAX_RESULTS)
+import docker
 import openai
 import json
+import os
+import socket
+import threading
+import uuid
+from contextlib import nullcontext
 from pathlib import Path
-from typing import List, Dict, Union
+from typing import List, Dict, Optional, Tuple, Union
 
+from assistant.tools.analysis import Analysis
 from assistant.tools.memory import Memory, MemoryMode
 from assistant.tools.tasks import Tasks, TaskMode
 from assistant.tools.calendar import Calendar
 from assistant.tools.url import Url
 from assistant.tools.notion import Notion
+from assistant.blobs import BlobStore
+from assistant.cache import ToolCache
+from assistant.prefetch import Prefetcher
+from assistant.resilience import ResilientCaller
+from assistant.routing import ModelRouter, RouteDecision
+from assistant.state import SharedRecords, SharedState
+from assistant.usage import UsageTracker, tool_shares
 from prompts.assistant import system_prompt, tools
+from utils.images import ImageCache
+from utils.log import get_logger, fields, log_context
+from utils.profiling import profiler
+from utils.tracing import tracer
+
+log = get_logger(__name__)
 
 class Assistant:
-    def __init__(self):
-        self.client = openai.OpenAI()
+    def __init__(self, client=None, calendar: Optional[Calendar] = None,
+                 notion: Optional[Notion] = None, url: Optional[Url] = None,
+                 analysis: Optional[Analysis] = None, state: Optional[SharedState] = None):
+        """Clients and tools can be passed in to run against local fakes.
+
+        With a SharedState (several workers), tasks, memories and the
+        conversation live in the shared database and turns are serialized
+        across processes, as the in-process lock does for threads. Several
+        workers therefore add failover, not parallel turns.
+        """
+        # Retries are handled by ResilientCaller
+        self.client = client or openai.OpenAI(max_retries=0)
+        self.resilience = ResilientCaller()
         self.model = ASSISTANT_MODEL
+        self.state = state
+        self.holder = f"{socket.gethostname()}:{os.getpid()}"
         self.history_file = Path("data/assistant/conversation_history.json")
+        self.blobs = BlobStore()
         self.messages = self._load_conversation_history()
-        self.memory = Memory()
-        self.tasks = Tasks()
-        self.calendar = Calendar()
-        self.url = Url()
-        self.notion = Notion(api_token=NOTION_API_TOKEN, databases=NOTION_DATABASES)
+        self._compact_history()
+        if state:
+            self.memory = Memory(SharedRecords(state, "memories", Path("data/assistant/memories.json")))
+            self.tasks = Tasks(SharedRecords(state, "tasks", Path("data/tasks.json")))
+        else:
+            self.memory = Memory()
+            self.tasks = Tasks()
+        self.calendar = calendar or Calendar()
+        self.url = url or Url()
+        self.notion = notion or Notion(api_token=NOTION_API_TOKEN, databases=NOTION_DATABASES)
+        # Connects to Docker on first use, so the assistant runs without it until code is executed
+        self.analysis = analysis
+        self.images = ImageCache()
+        self.lock = threading.Lock()
+        self.usage = UsageTracker()
+        self.cache = ToolCache()
+        self.cache_generations: Dict[str, int] = {}
+        self.tool_locks: Dict[str, threading.Lock] = {}
+        self.prefetcher = Prefetcher(self) if PREFETCH_ENABLED else None
+        self.router = ModelRouter(main_model=self.model)
+        self.turn_id: Optional[str] = None
+        self.turn_source: Optional[str] = None
 
-        print("Assistant initialized")
+        log.info("Assistant initialized")
 
     def _load_conversation_history(self) -> List[Dict[str, str]]:
         self.history_file.parent.mkdir(parents=True, exist_ok=True)
         
+        if self.state:
+            with self.state.transaction():
+                messages, self.history_id = self.state.history()
+                if not messages and self.history_file.exists():
+                    # First start with shared state: import the single-process history
+                    with open(self.history_file, 'r', encoding='utf-8') as f:
+                        messages = [self._compact_output(item) for item in json.load(f)]
+                    self.history_id = self.state.append_history(messages)
+            self.persisted = len(messages)
+            return messages
+        
         if self.history_file.exists():
             with open(self.history_file, 'r', encoding='utf-8') as f:
                 return json.load(f)
         return []
 
     def _save_conversation_history(self):
-        with open(self.history_file, 'w', encoding='utf-8') as f:
+        if self.state:
+            # The shared history is an append-only log
+            if len(self.messages) > self.persisted:
+                self.history_id = self.state.append_history(self.messages[self.persisted:])
+                self.persisted = len(self.messages)
+            return
+        with tracer.span("persist", target="history"), open(self.history_file, 'w', encoding='utf-8') as f:
             json.dump(self.messages, f, ensure_ascii=False, indent=2)
     
+    def _sync_history(self) -> None:
+        """Pick up turns other workers added to the shared conversation"""
+        if self.state:
+            items, self.history_id = self.state.history(self.history_id)
+            self.messages.extend(items)
+            self.persisted = len(self.messages)
+    
+    def _compact_output(self, item: Dict) -> Dict:
+        """Move a large function_call_output into the blob store, keeping a stub in history"""
+        output = item.get("output")
+        if item.get("type") != "function_call_output" or not isinstance(output, str) or len(output) <= BLOB_THRESHOLD:
+            return item
+        return {**item, "output": self.blobs.stub(output)}
+    
+    def _compact_history(self) -> None:
+        """Compact outputs stored before the blob store existed"""
+        if self.state:
+            # Shared history is compacted as it is written or imported
+            return
+        compacted = [self._compact_output(item) for item in self.messages]
+        if any(new is not old for new, old in zip(compacted, self.messages)):
+            self.messages = compacted
+            self._save_conversation_history()
+    
     def _get_system_prompt(self) -> str:
         return system_prompt
     
     def _get_tools(self) -> List[Dict]:
         return tools
 
+    def _create_response(self, input: List[Dict], instructions: str, tools: Optional[List[Dict]] = None,
+                         route: Optional[RouteDecision] = None):
+        kwargs = {"tools": tools} if tools else {}
+        model = route.model if route else self.model
+        with tracer.span("model_call", model=model, route=route.route if route else "main") as span:
+            response = self.resilience.call(lambda timeout: self.client.responses.create(
+                model=model,
+                instructions=instructions,
+                input=input,
+                timeout=timeout,
+                **kwargs
+            ))
+            usage = getattr(response, "usage", None)
+            if usage:
+                span.set(input_tokens=usage.input_tokens, output_tokens=usage.output_tokens)
+        
+        self.usage.record(self.turn_id, self.turn_source, model, usage, tool_shares(input, instructions))
+        return response
+
+    def prefetch(self) -> None:
+        """Start fetching context for an upcoming turn in the background"""
+        if self.prefetcher:
+            self.prefetcher.warm()
+    
+    def tool_lock(self, name: str) -> threading.Lock:
+        """Serializes calls of one tool across the chat and prefetch threads"""
+        return self.tool_locks.setdefault(name, threading.Lock())
+    
     def _process_tool_call(self, tool_call) -> str:
         args = json.loads(tool_call.arguments)
+        with tracer.span("tool_call", tool=tool_call.name, mode=str(args.get("mode", ""))) as span:
+            result, hit = self._call_tool(tool_call.name, args)
+            if hit is not None:
+                span.set(cache="hit" if hit else "miss")
+            return result
+    
+    def _call_tool(self, name: str, args: Dict) -> Tuple[str, Optional[bool]]:
+        """Run a tool through the result cache. Returns the result and whether it was a cache hit (None if uncacheable)"""
+        key = self.cache.key(name, args)
+        if key and self.state:
+            self._sync_cache(name)
+        if key:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached, True
+        
+        with self.tool_lock(name):
+            # Another thread may have fetched the same read while we waited
+            cached = self.cache.peek(key) if key else None
+            if cached is not None:
+                return cached, True
+            result = self._run_tool(name, dict(args))
         
-        if tool_call.name == "memory":
+        if key:
+            self.cache.put(key, result)
+        elif self.cache.after_write(name, args) and self.state:
+            self.state.bump_cache(name)
+        return result, False if key else None
+
+    def _sync_cache(self, name: str) -> None:
+        """Drop cached reads of a tool another worker has written through since they were cached"""
+        generation = self.state.cache_generation(name)
+        if self.cache_generations.get(name, 0) != generation:
+            self.cache_generations[name] = generation
+            self.cache.invalidate(name)
+        if name == "tasks":
+            # Due tasks also change tasks without a tool call
+            with self.tool_lock("tasks"):
+                if self.tasks.refresh():
+                    self.cache.invalidate("tasks")
+
+    def _run_tool(self, name: str, args: Dict) -> str:
+        if name == "memory":
             mode = MemoryMode(args["mode"])
             memory_id = args["id"]
             content = args.get("content")
-            return self.memory.process(mode, memory_id, content)
-        elif tool_call.name == "tasks":
+            force = args.get("force", False)
+            return self.memory.process(mode, memory_id, content, force)
+        elif name == "tasks":
             mode = TaskMode(args["mode"])
             task_id = args["id"]
             instructions = args.get("instructions")
             task_datetime = args.get("datetime")
             repeat = args.get("repeat")
-            return self.tasks.process(mode, task_id, instructions, task_datetime, repeat)
-        elif tool_call.name == "calendar":
+            start = args.get("start")
+            end = args.get("end")
+            limit = args.get("limit", TASK_PAGE_SIZE)
+            offset = args.get("offset", 0)
+            return self.tasks.process(mode, task_id, instructions, task_datetime, repeat,
+                                      start=start, end=end, limit=limit, offset=offset)
+        elif name == "calendar":
             mode = args["mode"]
             range_val = args.get("range_val", 10)
             event_id = args.get("event_id")
@@ -66,40 +234,104 @@ class Assistant:
             description = args.get("description")
             start_time = args.get("start_time")
             end_time = args.get("end_time")
-            return self.calendar.process(mode, range_val, event_id, title, description, start_time, end_time)
-        elif tool_call.name == "url":
+            calendar_id = args.get("calendar_id")
+            limit = args.get("limit", CALENDAR_MAX_RESULTS)
+            return self.calendar.process(mode, range_val, event_id, title, description, start_time, end_time,
+                                         calendar_id, limit)
+        elif name == "url":
             url = args["url"]
             return self.url.process(url)
-        elif tool_call.name == "notion": 
+        elif name == "notion": 
             mode = args.pop("mode") 
             return self.notion.process(mode=mode, **args)
+        elif name == "blob":
+            return self.blobs.process(args["id"], args.get("offset", 0))
+        elif name == "analysis":
+            if self.analysis is None:
+                try:
+                    self.analysis = Analysis()
+                except docker.errors.DockerException as e:
+                    return f"Error: the analysis sandbox is unavailable: {e}"
+            result = self.analysis.process(args["code"], reset=args.get("reset", False))
+            return json.dumps(result, ensure_ascii=False)
         
         return "Unknown tool"
 
+    def _expand_images(self, messages: List[Dict]) -> List[Dict]:
+        """Replace stored image references with the cached images.
+
+        Only the most recent IMAGE_HISTORY_ATTACH images are attached; the one
+        from the current turn at adaptive detail, earlier ones at low detail.
+        """
+        expanded = []
+        attached = 0
+        for index, message in enumerate(reversed(messages)):
+            content = message.get("content")
+            if not isinstance(content, list):
+                expanded.append(message)
+                continue
+            
+            parts = []
+            for part in content:
+                if part.get("type") != "input_image" or "image_id" not in part:
+                    parts.append(part)
+                    continue
+                image = None
+                if attached < IMAGE_HISTORY_ATTACH:
+                    image = self.images.to_input(part["image_id"], None if index == 0 else "low")
+                if image:
+                    parts.append(image)
+                    attached += 1
+                else:
+                    parts.append({"type": "input_text", "text": "[image no longer attached]"})
+            expanded.append({**message, "content": parts})
+        
+        expanded.reverse()
+        return expanded
+
     def _get_conversation_messages(self) -> List[Dict[str, str]]:
-        return self.messages[-200:] if len(self.messages) > 200 else self.messages
+        messages = self.messages[-200:] if len(self.messages) > 200 else self.messages
+        return self._expand_images(messages)
     
-    def chat(self, message: Union[str, Dict], tool_callback=None) -> str:
+    def chat(self, message: Union[str, Dict], tool_callback=None, source: Optional[str] = None) -> str:
+        """Run one conversation turn. Safe to call from worker threads.
+        
+        Args:
+            message: The user's text, or a dict with "text" and cached "images" ids
+            tool_callback: Optional function called with the tool name when a tool is used
+            source: What triggered the turn, e.g. "chat:<chat_id>" or "task:<task_id>", for usage accounting
+        """
+        conversation = self.state.hold("conversation", self.holder) if self.state else nullcontext()
+        with self.lock, conversation:
+            self._sync_history()
+            self.turn_id = uuid.uuid4().hex[:12]
+            self.turn_source = source
+            label = f"{(source or 'turn').replace(':', '-')}-{self.turn_id}"
+            with log_context(turn_id=self.turn_id), profiler.profile(label):
+                return self._chat(message, tool_callback)
+
+    def _chat(self, message: Union[str, Dict], tool_callback=None) -> str:
         if isinstance(message, str):
             user_message = {"role": "user", "content": message}
-            print("User:", message)
+            log.info("User message", extra=fields(text=message))
         else:
             user_message = {
                 "role": "user",
                 "content": [
-                    {"type": "text", "text": message.get("text", "What's in this image?")},
-                    {
-                        "type": "image_url",
-                        "image_url": {
-                            "url": message["image_url"],
-                            "detail": "high"
-                        }
-                    }
+                    {"type": "input_text", "text": message.get("text") or "What's in this image?"},
+                    *({"type": "input_image", "image_id": image_id} for image_id in message["images"])
                 ]
             }
-            print("User: [Image]", message.get("text", ""))
+            log.info("User message with images", extra=fields(text=message.get("text"), images=len(message["images"])))
         
-        self.messages.append({"role": "user", "content": str(user_message["content"])})
+        text = message if isinstance(message, str) else message.get("text") or ""
+        prefetch = self.prefetcher.start(text) if self.prefetcher else None
+        route = self.router.classify(text, images=0 if isinstance(message, str) else len(message["images"]),
+                                     source=self.turn_source)
+        turn_span = tracer.current_span()
+        if turn_span:
+            turn_span.set(route=route.route, route_reason=route.reason)
+        self.messages.append(user_message)
         
         conversation_messages = self._get_conversation_messages()
         system_prompt = self._get_system_prompt()
@@ -110,12 +342,11 @@ class Assistant:
         current_conversation_input = list(conversation_messages) 
 
         while tool_call_count < max_tool_calls:
-            response = self.client.responses.create(
-                model=self.model,
-                instructions=system_prompt,
-                input=current_conversation_input,
-                tools=self._get_tools()
-            )
+            # Prefetched reads join the input once done, so no model call waits for them
+            context = prefetch.context() if prefetch else None
+            if context:
+                current_conversation_input.append({"role": "developer", "content": context})
+            response = self._create_response(current_conversation_input, system_prompt, self._get_tools(), route)
             
             assistant_response_text = None
             tool_calls_found = []
@@ -133,14 +364,15 @@ class Assistant:
                 assistant_message_for_history = {"role": "assistant", "content": assistant_message_content}
                 self.messages.append(assistant_message_for_history)
                 self._save_conversation_history()
-                print("Assistant:", assistant_message_content)
+                log.info("Assistant reply", extra=fields(text=assistant_message_content))
                 return assistant_message_content
             
             if not tool_calls_found: 
-                print("Assistant: No tool calls or text response from API.")
+                log.warning("No tool calls or text response from API")
                 break 
 
             tool_call_count += len(tool_calls_found) 
+            route = self.router.escalate(route)
             
             if tool_call_count >= max_tool_calls: 
                 current_conversation_input.append({
@@ -149,17 +381,10 @@ class Assistant:
                 })
             
             for tool_call in tool_calls_found:
-                print("Assistant: Using", tool_call.name, tool_call.arguments)
+                log.info("Tool call", extra=fields(tool=tool_call.name, arguments=tool_call.arguments))
                 
                 if tool_callback:
-                    import asyncio
-                    try:
-                        loop = asyncio.get_running_loop()
-                    except RuntimeError:
-                        loop = asyncio.new_event_loop()
-                        asyncio.set_event_loop(loop)
-                    
-                    asyncio.create_task(tool_callback(tool_call.name))
+                    tool_callback(tool_call.name)
                 
                 model_function_call_message = {
                     "type": "function_call", 
@@ -172,23 +397,20 @@ class Assistant:
                 current_conversation_input.append(model_function_call_message)
 
                 result = self._process_tool_call(tool_call) 
-                print("[Tool call result]:", result)
+                log.debug("Tool result", extra=fields(tool=tool_call.name, result=str(result)))
                 
                 function_output_message = {
                     "type": "function_call_output", 
                     "call_id": tool_call.call_id,   
                     "output": str(result)           
                 }
-                self.messages.append(function_output_message)
+                # The model sees the full output now; later turns only get the stub
+                self.messages.append(self._compact_output(function_output_message))
                 current_conversation_input.append(function_output_message)
                 
                 self._save_conversation_history()
         
-        final_response = self.client.responses.create(
-            model=self.model,
-            instructions=system_prompt,
-            input=current_conversation_input 
-        )
+        final_response = self._create_response(current_conversation_input, system_prompt, route=self.router.final(route))
         
         final_message_text = "Sorry, I reached a limit in processing your request. Please try again." 
         if final_response.output and final_response.output[0].type == "message" and final_response.output[0].content[0].type == "output_text":
@@ -196,21 +418,44 @@ class Assistant:
 
         self.messages.append({"role": "assistant", "content": final_message_text})
         self._save_conversation_history()
-        print("Assistant:", final_message_text)
+        log.info("Assistant reply", extra=fields(text=final_message_text))
         return final_message_text
 
+    def compact_memories(self) -> int:
+        """Run one incremental memory deduplication pass"""
+        with self.tool_lock("memory"):
+            return self.memory.compact()
+
+    def close_idle_analysis(self) -> None:
+        """Stop analysis sessions that have been idle past their timeout"""
+        if self.analysis:
+            with self.tool_lock("analysis"):
+                self.analysis.close_idle_sessions()
+
+    def close(self) -> None:
+        """Stop the analysis containers, which would otherwise outlive the process"""
+        if self.analysis:
+            with self.tool_lock("analysis"):
+                self.analysis.close()
+
     def process_due_tasks(self, message_callback=None, tool_callback=None) -> None:
         """Process any tasks that are due for execution
         
         Args:
-            message_callback: Optional async function to call with the assistant's response
-            tool_callback: Optional async function to call when tools are used
+            message_callback: Optional function to call with the assistant's response
+            tool_callback: Optional function to call with the tool name when tools are used
         """
-        due_tasks = self.tasks.get_due_tasks()
+        with self.tool_lock("tasks"):
+            due_tasks = self.tasks.get_due_tasks()
+        if due_tasks:
+            # Due tasks were rescheduled or removed
+            self.cache.invalidate("tasks")
         for task in due_tasks:
             task_message = f"TASK {task['id']}: {task['instructions']}"
-            response = self.chat(task_message, tool_callback)
-            
-            if message_callback:
-                import asyncio
-                asyncio.create_task(message_callback(response))
+            if task.get('late'):
+                task_message += f"\n(This run was scheduled for {task['scheduled']} and is running late.)"
+            with tracer.span("turn", task_id=task['id']), log_context(task_id=task['id']):
+                response = self.chat(task_message, tool_callback, source=f"task:{task['id']}")
+                
+                if message_callback:
+                    message_callback(response)
@@ -0,0 +1,81 @@
+import contextvars
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import TYPE_CHECKING, Callable, Dict, Optional
+
+from settings import PREFETCH_CALENDAR_RANGE, PREFETCH_TASKS, PREFETCH_MEMORIES, PREFETCH_MAX_CHARS
+from assistant.cache import is_error_result
+from utils.tracing import tracer
+
+if TYPE_CHECKING:
+    from assistant.main import Assistant
+
+class Prefetch:
+    """Reads started for one turn, collected into developer messages as they finish."""
+
+    def __init__(self, futures: Dict[str, Future]):
+        self.futures = futures
+
+    def context(self) -> Optional[str]:
+        """The reads that finished since the last call, compactly formatted; never waits
+
+        Model calls go ahead without reads still running, which are picked up
+        by a later call of the turn instead.
+        """
+        sections = []
+        for title, future in list(self.futures.items()):
+            if not future.done():
+                continue
+            del self.futures[title]
+            try:
+                result = future.result()
+            except Exception:
+                continue
+            if result and not is_error_result(result):
+                if len(result) > PREFETCH_MAX_CHARS:
+                    result = result[:PREFETCH_MAX_CHARS] + "\n[...]"
+                sections.append(f"{title}:\n{result}")
+
+        if not sections:
+            return None
+        return ("Context fetched for this turn; use tools for anything not covered here.\n\n"
+                + "\n\n".join(sections))
+
+class Prefetcher:
+    """Starts the reads most turns begin with (calendar, next tasks, memories) in the background."""
+
+    def __init__(self, assistant: "Assistant"):
+        self.assistant = assistant
+        self.executor = ThreadPoolExecutor(max_workers=3, thread_name_prefix="prefetch")
+
+    def _submit(self, name: str, read: Callable[[], str]) -> Future:
+        def run() -> str:
+            with tracer.span("prefetch", target=name):
+                return read()
+        return self.executor.submit(contextvars.copy_context().run, run)
+
+    def _calendar(self) -> str:
+        # Same arguments as the model's usual first call, so it hits the cache too
+        result, _ = self.assistant._call_tool("calendar", {"mode": "r", "range_val": PREFETCH_CALENDAR_RANGE})
+        return result
+
+    def warm(self) -> None:
+        """Fill the tool cache ahead of a turn, e.g. while follow-up messages are awaited"""
+        self._submit("calendar", self._calendar)
+
+    def start(self, text: str) -> Prefetch:
+        assistant = self.assistant
+
+        def tasks() -> str:
+            with assistant.tool_lock("tasks"):
+                return assistant.tasks.next_tasks(PREFETCH_TASKS)
+
+        def memories() -> str:
+            with assistant.tool_lock("memory"):
+                return assistant.memory.relevant_memories(text, PREFETCH_MEMORIES)
+
+        return Prefetch({
+            f"Calendar (next {PREFETCH_CALENDAR_RANGE} days)":
+                self._submit("calendar", self._calendar),
+            "Next tasks": self._submit("tasks", tasks),
+            "Possibly relevant memories": self._submit("memory", memories),
+        })
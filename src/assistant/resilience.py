@@ -0,0 +1,168 @@
+import contextvars
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, List, Optional, TypeVar
+
+import openai
+
+from settings import (MODEL_TIMEOUT, MODEL_RETRIES, MODEL_BACKOFF, MODEL_BACKOFF_MAX, MODEL_HEDGE,
+                      MODEL_HEDGE_QUANTILE, MODEL_HEDGE_MIN_SAMPLES, MODEL_CIRCUIT_FAILURES, MODEL_CIRCUIT_RESET)
+from utils.log import get_logger
+from utils.tracing import LatencyHistogram, tracer
+
+log = get_logger(__name__)
+
+T = TypeVar("T")
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+class ModelTimeoutError(Exception):
+    pass
+
+class CircuitOpenError(Exception):
+    pass
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, (ModelTimeoutError, openai.APIConnectionError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code in RETRYABLE_STATUS
+
+def retry_after(error: Exception) -> Optional[float]:
+    response = getattr(error, "response", None)
+    try:
+        return float(response.headers.get("retry-after")) if response is not None else None
+    except (TypeError, ValueError):
+        return None
+
+class CircuitBreaker:
+    """Opens after consecutive failures and lets a single probe through after a cool-down."""
+
+    def __init__(self, failures: int = MODEL_CIRCUIT_FAILURES, reset_after: float = MODEL_CIRCUIT_RESET):
+        self.threshold = failures
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.probing = False
+        self.lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if not self.probing and time.monotonic() - self.opened_at >= self.reset_after:
+                self.probing = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def record_failure(self) -> None:
+        with self.lock:
+            self.failures += 1
+            if self.probing or self.failures >= self.threshold:
+                if self.opened_at is None:
+                    log.warning("Model API circuit opened after %d failures", self.failures)
+                self.opened_at = time.monotonic()
+                self.probing = False
+
+class ResilientCaller:
+    """Per-attempt deadlines, jittered retries, optional hedging and a circuit breaker for model calls.
+
+    Each attempt runs on a worker thread so the deadline holds even if the
+    client hangs; abandoned requests finish in the background. With hedging on,
+    a second identical request is sent once the first has taken longer than
+    the recent p95 and whichever answers first wins.
+    """
+
+    def __init__(self, timeout: float = MODEL_TIMEOUT, retries: int = MODEL_RETRIES,
+                 backoff: float = MODEL_BACKOFF, backoff_max: float = MODEL_BACKOFF_MAX,
+                 hedge: bool = MODEL_HEDGE, breaker: Optional[CircuitBreaker] = None):
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.hedge = hedge
+        self.breaker = breaker or CircuitBreaker()
+        self.latency = LatencyHistogram()
+        self.executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="model")
+
+    def _hedge_delay(self) -> Optional[float]:
+        if not self.hedge or self.latency.count < MODEL_HEDGE_MIN_SAMPLES:
+            return None
+        return self.latency.quantile(MODEL_HEDGE_QUANTILE)
+
+    def _submit(self, request: Callable[[float], T]) -> Future:
+        return self.executor.submit(contextvars.copy_context().run, request, self.timeout)
+
+    def _attempt(self, request: Callable[[float], T]) -> T:
+        started = time.monotonic()
+        deadline = started + self.timeout
+        hedge_at = self._hedge_delay()
+        futures: List[Future] = [self._submit(request)]
+        primary = futures[0]
+        hedged = False
+        error: Optional[BaseException] = None
+
+        while futures:
+            now = time.monotonic()
+            if now >= deadline:
+                raise ModelTimeoutError(f"Model call exceeded {self.timeout:.0f}s")
+            wait_for = deadline - now
+            if hedge_at is not None:
+                wait_for = min(wait_for, max(0.0, started + hedge_at - now))
+            done, _ = wait(futures, timeout=wait_for, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                futures.remove(future)
+                if future.exception() is None:
+                    self.latency.observe(time.monotonic() - started)
+                    if hedged:
+                        tracer.increment("model_hedges_total", winner="primary" if future is primary else "hedge")
+                    return future.result()
+                error = future.exception()
+
+            if hedge_at is not None and time.monotonic() >= started + hedge_at and futures:
+                futures.append(self._submit(request))
+                hedge_at = None
+                hedged = True
+
+        raise error
+
+    def _sleep_before_retry(self, attempt: int, error: Exception) -> None:
+        delay = random.uniform(0, min(self.backoff_max, self.backoff * 2 ** attempt))
+        server_delay = retry_after(error)
+        if server_delay is not None:
+            delay = max(delay, min(server_delay, self.backoff_max))
+        time.sleep(delay)
+
+    def call(self, request: Callable[[float], T]) -> T:
+        """Run request(timeout) with retries. The timeout is passed on so abandoned requests end too."""
+        for attempt in range(self.retries + 1):
+            if not self.breaker.allow():
+                tracer.increment("model_requests_total", outcome="circuit_open")
+                raise CircuitOpenError("The model API is failing, not sending requests for now")
+            try:
+                result = self._attempt(request)
+            except Exception as e:
+                if not is_retryable(e):
+                    # The API answered, so it is up even if it rejected this request
+                    self.breaker.record_success()
+                    tracer.increment("model_requests_total", outcome="error")
+                    raise
+                self.breaker.record_failure()
+                if attempt == self.retries:
+                    tracer.increment("model_requests_total", outcome="failed")
+                    raise
+                tracer.increment("model_requests_total", outcome="retry")
+                log.warning("Model call failed (%s), retrying", type(e).__name__)
+                self._sleep_before_retry(attempt, e)
+                continue
+            self.breaker.record_success()
+            tracer.increment("model_requests_total", outcome="ok")
+            return result
@@ -0,0 +1,71 @@
+import re
+from typing import Optional
+
+from settings import ASSISTANT_MODEL, FAST_MODEL, ROUTING_SIMPLE_MAX_CHARS
+from utils.tracing import tracer
+
+# Words that usually mean the turn needs tools or careful reasoning
+TOOL_HINTS = {
+    "calendar", "event", "events", "meeting", "meetings", "schedule", "appointment", "today", "tomorrow",
+    "week", "weekend", "month", "monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday",
+    "remind", "reminder", "task", "tasks", "todo", "notion", "page", "database", "note", "notes",
+    "search", "find", "look", "lookup", "url", "link", "http", "https", "www",
+    "add", "create", "delete", "remove", "update", "change", "move", "cancel", "save", "remember",
+    "plan", "summarize", "summary", "analyze", "compare", "explain", "why", "how",
+}
+
+class RouteDecision:
+    def __init__(self, model: str, route: str, reason: str):
+        self.model = model
+        self.route = route
+        self.reason = reason
+
+class ModelRouter:
+    """Picks FAST_MODEL for turns that look simple and ASSISTANT_MODEL otherwise.
+
+    The classification is local (length, images, keywords) so it adds no
+    latency. A fast turn is escalated to the main model as soon as it starts
+    calling tools. Decisions are counted as model_route_total and model call
+    latencies are labelled by route on /metrics.
+    """
+
+    def __init__(self, main_model: str = ASSISTANT_MODEL, fast_model: Optional[str] = FAST_MODEL,
+                 simple_max_chars: int = ROUTING_SIMPLE_MAX_CHARS):
+        self.main_model = main_model
+        self.fast_model = fast_model
+        self.simple_max_chars = simple_max_chars
+
+    def _decide(self, route: str, reason: str) -> RouteDecision:
+        tracer.increment("model_route_total", route=route, reason=reason)
+        return RouteDecision(self.fast_model if route == "fast" else self.main_model, route, reason)
+
+    def classify(self, text: str, images: int = 0, source: Optional[str] = None) -> RouteDecision:
+        is_task = bool(source and source.startswith("task:"))
+        if is_task:
+            # Only the instructions matter, not the "TASK <id>:" prefix
+            text = text.split(":", 1)[-1]
+        if not self.fast_model:
+            return self._decide("main", "routing_disabled")
+        if images:
+            return self._decide("main", "images")
+        if len(text) > self.simple_max_chars:
+            return self._decide("main", "long")
+        if set(re.findall(r"\w+", text.lower())) & TOOL_HINTS:
+            return self._decide("main", "tool_hint")
+        if is_task:
+            return self._decide("fast", "simple_task")
+        return self._decide("fast", "simple")
+
+    def escalate(self, decision: RouteDecision) -> RouteDecision:
+        """The route for the rest of a turn once the model has called tools"""
+        if decision.route != "fast":
+            return decision
+        return self._decide("escalated", "tool_calls")
+
+    def final(self, decision: RouteDecision) -> RouteDecision:
+        """The route for the forced summary after too many tool calls
+
+        That call carries the turn's whole tool context, so it never goes to
+        the fast model.
+        """
+        return self.escalate(decision)
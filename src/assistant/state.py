@@ -0,0 +1,255 @@
+import json
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from settings import STATE_DB, LEADER_LEASE
+from utils.log import get_logger
+from utils.tracing import tracer
+
+log = get_logger(__name__)
+
+class SharedState:
+    """State shared by worker processes in one SQLite database.
+
+    Holds versioned records (tasks, memories), the conversation history as an
+    append-only log, leases for leader election and cross-process locks, and
+    an inbox that spreads incoming messages across workers by chat. Writes
+    run in IMMEDIATE transactions, so a worker that reads, changes and writes
+    back inside one transaction cannot lose another worker's update.
+    """
+
+    def __init__(self, db_file: Path = Path(STATE_DB)):
+        self.db_file = db_file
+        self.db_file.parent.mkdir(parents=True, exist_ok=True)
+        self.local = threading.local()
+        self._connect().executescript("""
+            CREATE TABLE IF NOT EXISTS records (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT,
+                version INTEGER NOT NULL,
+                PRIMARY KEY (namespace, key)
+            );
+            CREATE INDEX IF NOT EXISTS records_version ON records (namespace, version);
+            CREATE TABLE IF NOT EXISTS sequence (id INTEGER PRIMARY KEY CHECK (id = 1), value INTEGER NOT NULL);
+            INSERT OR IGNORE INTO sequence VALUES (1, 0);
+            CREATE TABLE IF NOT EXISTS history (id INTEGER PRIMARY KEY, item TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS leases (name TEXT PRIMARY KEY, holder TEXT NOT NULL, expires REAL NOT NULL);
+            CREATE TABLE IF NOT EXISTS inbox (
+                id INTEGER PRIMARY KEY,
+                shard INTEGER NOT NULL,
+                chat_id INTEGER NOT NULL,
+                payload TEXT NOT NULL,
+                created REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS inbox_shard ON inbox (shard, id);
+            CREATE TABLE IF NOT EXISTS cache_generations (tool TEXT PRIMARY KEY, generation INTEGER NOT NULL);
+        """)
+
+    def _connect(self) -> sqlite3.Connection:
+        """One connection per thread, in autocommit mode with explicit transactions"""
+        db = getattr(self.local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.db_file, timeout=30, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self.local.db = db
+            self.local.depth = 0
+        return db
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """A write transaction; nested uses join the outer one"""
+        db = self._connect()
+        if self.local.depth:
+            self.local.depth += 1
+            try:
+                yield db
+            finally:
+                self.local.depth -= 1
+            return
+
+        db.execute("BEGIN IMMEDIATE")
+        self.local.depth = 1
+        try:
+            yield db
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        else:
+            db.execute("COMMIT")
+        finally:
+            self.local.depth = 0
+
+    # Records
+
+    def records(self, namespace: str, since: int = 0) -> Tuple[Dict[str, Optional[Any]], int]:
+        """Records changed after version since, None for deleted ones, and the latest version"""
+        db = self._connect()
+        rows = db.execute("SELECT key, value, version FROM records WHERE namespace = ? AND version > ?",
+                          (namespace, since)).fetchall()
+        changes = {key: json.loads(value) if value is not None else None for key, value, _ in rows}
+        return changes, max((version for _, _, version in rows), default=since)
+
+    def put(self, namespace: str, values: Dict[str, Optional[Any]]) -> int:
+        """Write records, None deleting them, and return their version"""
+        with tracer.span("persist", target=namespace), self.transaction() as db:
+            version = db.execute("UPDATE sequence SET value = value + 1 WHERE id = 1 RETURNING value").fetchone()[0]
+            db.executemany(
+                "INSERT INTO records VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (namespace, key) DO UPDATE SET value = excluded.value, version = excluded.version",
+                [(namespace, key, json.dumps(value, ensure_ascii=False) if value is not None else None, version)
+                 for key, value in values.items()]
+            )
+        return version
+
+    # Conversation history
+
+    def history(self, since: int = 0) -> Tuple[List[Dict], int]:
+        """History items appended after id since, and the last id"""
+        rows = self._connect().execute("SELECT id, item FROM history WHERE id > ? ORDER BY id", (since,)).fetchall()
+        return [json.loads(item) for _, item in rows], rows[-1][0] if rows else since
+
+    def append_history(self, items: Iterable[Dict]) -> int:
+        with tracer.span("persist", target="history"), self.transaction() as db:
+            db.executemany("INSERT INTO history (item) VALUES (?)",
+                           [(json.dumps(item, ensure_ascii=False),) for item in items])
+            return db.execute("SELECT COALESCE(MAX(id), 0) FROM history").fetchone()[0]
+
+    # Leases
+
+    def acquire(self, name: str, holder: str, ttl: float = LEADER_LEASE) -> bool:
+        """Take or renew a lease; succeeds if it is free, expired or already ours"""
+        now = time.time()
+        with self.transaction() as db:
+            row = db.execute("SELECT holder, expires FROM leases WHERE name = ?", (name,)).fetchone()
+            if row and row[0] != holder and row[1] > now:
+                return False
+            db.execute("INSERT OR REPLACE INTO leases VALUES (?, ?, ?)", (name, holder, now + ttl))
+        if not row or row[0] != holder:
+            log.info("Acquired lease %s", name)
+        return True
+
+    def release(self, name: str, holder: str) -> None:
+        with self.transaction() as db:
+            db.execute("DELETE FROM leases WHERE name = ? AND holder = ?", (name, holder))
+
+    @contextmanager
+    def hold(self, name: str, holder: str, ttl: float = LEADER_LEASE, poll: float = 0.1) -> Iterator[None]:
+        """A cross-process lock: waits for the lease and renews it until the block ends"""
+        while not self.acquire(name, holder, ttl):
+            time.sleep(poll)
+        stop = threading.Event()
+
+        def renew() -> None:
+            while not stop.wait(ttl / 3):
+                if not self.acquire(name, holder, ttl):
+                    log.warning("Lost lease %s while holding it", name)
+
+        renewer = threading.Thread(target=renew, name=f"lease-{name}", daemon=True)
+        renewer.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            renewer.join()
+            self.release(name, holder)
+
+    # Tool cache invalidation
+
+    def bump_cache(self, tool: str) -> None:
+        """Record that a worker wrote through a tool, making every worker's cached reads of it stale"""
+        with self.transaction() as db:
+            db.execute("INSERT INTO cache_generations VALUES (?, 1) "
+                       "ON CONFLICT (tool) DO UPDATE SET generation = generation + 1", (tool,))
+
+    def cache_generation(self, tool: str) -> int:
+        row = self._connect().execute("SELECT generation FROM cache_generations WHERE tool = ?", (tool,)).fetchone()
+        return row[0] if row else 0
+
+    # Inbox
+
+    def enqueue(self, shard: int, chat_id: int, payload: Dict) -> None:
+        with self.transaction() as db:
+            db.execute("INSERT INTO inbox (shard, chat_id, payload, created) VALUES (?, ?, ?, ?)",
+                       (shard, chat_id, json.dumps(payload, ensure_ascii=False), time.time()))
+
+    def claim(self, shard: int, limit: int = 50) -> List[Tuple[int, Dict]]:
+        """Take the oldest messages of a shard off the inbox"""
+        with self.transaction() as db:
+            rows = db.execute("DELETE FROM inbox WHERE id IN (SELECT id FROM inbox WHERE shard = ? ORDER BY id LIMIT ?) "
+                              "RETURNING id, chat_id, payload", (shard, limit)).fetchall()
+        return [(chat_id, json.loads(payload)) for _, chat_id, payload in sorted(rows)]
+
+class JsonRecords:
+    """A dict kept in one JSON file, for a single process."""
+
+    def __init__(self, path: Path, name: str):
+        self.path = path
+        self.name = name
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    def load(self) -> Dict[str, Any]:
+        if self.path.exists():
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        return {}
+
+    def sync(self, data: Dict[str, Any]) -> Set[str]:
+        return set()
+
+    @contextmanager
+    def writing(self) -> Iterator[None]:
+        yield
+
+    def save(self, data: Dict[str, Any], keys: Iterable[str] = ()) -> None:
+        with tracer.span("persist", target=self.name), open(self.path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+
+class SharedRecords:
+    """A dict mirrored from one namespace of SharedState.
+
+    sync() applies what other workers changed since the last call and returns
+    those keys. Changes are read, made and saved inside writing(), one
+    transaction, so concurrent workers cannot overwrite each other. The first
+    load imports the single-process JSON file if the namespace is still empty.
+    """
+
+    def __init__(self, state: SharedState, namespace: str, legacy_file: Optional[Path] = None):
+        self.state = state
+        self.namespace = namespace
+        self.legacy_file = legacy_file
+        self.version = 0
+
+    def load(self) -> Dict[str, Any]:
+        with self.state.transaction():
+            changes, self.version = self.state.records(self.namespace)
+            if not changes and self.legacy_file and self.legacy_file.exists():
+                changes = JsonRecords(self.legacy_file, self.namespace).load()
+                if changes:
+                    log.info("Importing %d %s records from %s", len(changes), self.namespace, self.legacy_file)
+                    self.version = self.state.put(self.namespace, changes)
+        return {key: value for key, value in changes.items() if value is not None}
+
+    def sync(self, data: Dict[str, Any]) -> Set[str]:
+        changes, version = self.state.records(self.namespace, self.version)
+        self.version = version
+        for key, value in changes.items():
+            if value is None:
+                data.pop(key, None)
+            else:
+                data[key] = value
+        return set(changes)
+
+    def writing(self):
+        return self.state.transaction()
+
+    def save(self, data: Dict[str, Any], keys: Iterable[str] = ()) -> None:
+        keys = list(keys)
+        if keys:
+            # Our own write, so the mirror is current up to it (sync ran in the same transaction)
+            self.version = self.state.put(self.namespace, {key: data.get(key) for key in keys})
@@ -1,81 +1,481 @@
 import docker
+import json
+import shutil
 import tempfile
+import time
+import uuid
 from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
+from utils.log import get_logger
+
+log = get_logger(__name__)
+
+KERNEL_SCRIPT = r'''
+import codecs
+import collections
+import json
+import os
+import sys
+import threading
+import time
+import traceback
+
+SESSION_DIR = "/session"
+REQUESTS_DIR = os.path.join(SESSION_DIR, "requests")
+RESULTS_DIR = os.path.join(SESSION_DIR, "results")
+ARTIFACTS_DIR = os.path.join(SESSION_DIR, "artifacts")
+HEAD_LIMIT = int(os.environ.get("ANALYSIS_HEAD_LIMIT", "8192"))
+TAIL_LIMIT = int(os.environ.get("ANALYSIS_TAIL_LIMIT", "8192"))
+IDLE_TIMEOUT = float(os.environ.get("ANALYSIS_IDLE_TIMEOUT", "0"))
+
+namespace = {"__name__": "__main__", "ARTIFACTS_DIR": ARTIFACTS_DIR}
+
+class CappedStream:
+    """Streams the first HEAD_LIMIT characters to disk and keeps only the last TAIL_LIMIT."""
+
+    def __init__(self, path):
+        self.file = open(path, "w", encoding="utf-8")
+        self.head_size = 0
+        self.total_size = 0
+        self.tail = collections.deque()
+        self.tail_size = 0
+        self.lock = threading.Lock()
+
+    def write(self, text):
+        with self.lock:
+            if self.file.closed:
+                return
+            self.total_size += len(text)
+            if self.head_size < HEAD_LIMIT:
+                chunk = text[:HEAD_LIMIT - self.head_size]
+                self.file.write(chunk)
+                self.file.flush()
+                self.head_size += len(chunk)
+                text = text[len(chunk):]
+            if text:
+                self.tail.append(text)
+                self.tail_size += len(text)
+                while self.tail and self.tail_size - len(self.tail[0]) >= TAIL_LIMIT:
+                    self.tail_size -= len(self.tail.popleft())
+
+    def tail_text(self):
+        return "".join(self.tail)[-TAIL_LIMIT:]
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+class CapturedOutput:
+    """Points file descriptors 1 and 2 at a pipe drained into a CappedStream.
+
+    Capturing at the descriptor rather than sys.stdout also caps output from
+    subprocesses (os.system, subprocess) and C extensions writing to fd 1 or 2.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.read_fd, self.write_fd = os.pipe()
+        self.reader = threading.Thread(target=self._drain, daemon=True)
+
+    def _drain(self):
+        decoder = codecs.getincrementaldecoder("utf-8")("replace")
+        while True:
+            data = os.read(self.read_fd, 65536)
+            if not data:
+                break
+            self.stream.write(decoder.decode(data))
+        self.stream.write(decoder.decode(b"", final=True))
+        os.close(self.read_fd)
+
+    def __enter__(self):
+        sys.stdout.flush()
+        sys.stderr.flush()
+        self.saved = [os.dup(1), os.dup(2)]
+        os.dup2(self.write_fd, 1)
+        os.dup2(self.write_fd, 2)
+        os.close(self.write_fd)
+        self.reader.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        sys.stdout.flush()
+        sys.stderr.flush()
+        for fd, saved in zip((1, 2), self.saved):
+            os.dup2(saved, fd)
+            os.close(saved)
+        # Background processes started by the code may keep the pipe open; their
+        # later output is dropped once the stream is closed
+        self.reader.join(timeout=1)
+        return False
+
+def current_memory():
+    for path in ("/sys/fs/cgroup/memory.current", "/sys/fs/cgroup/memory/memory.usage_in_bytes"):
+        try:
+            with open(path) as f:
+                return int(f.read().strip())
+        except (OSError, ValueError):
+            continue
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+class MemorySampler(threading.Thread):
+    """Samples memory use while one request runs; the cgroup peak would cover the whole session."""
+
+    def __init__(self, interval=0.01):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak = current_memory()
+        self.done = threading.Event()
+
+    def run(self):
+        while not self.done.wait(self.interval):
+            self.peak = max(self.peak, current_memory())
+
+    def stop(self):
+        self.done.set()
+        self.join()
+        return max(self.peak, current_memory())
+
+last_request = time.monotonic()
+while True:
+    pending = sorted(name for name in os.listdir(REQUESTS_DIR) if name.endswith(".py"))
+    if not pending:
+        if IDLE_TIMEOUT and time.monotonic() - last_request > IDLE_TIMEOUT:
+            # The host went away without stopping us; exiting lets Docker remove the container
+            break
+        time.sleep(0.05)
+        continue
+    last_request = time.monotonic()
+
+    request_path = os.path.join(REQUESTS_DIR, pending[0])
+    request_id = pending[0][:-3]
+    with open(request_path, "r", encoding="utf-8") as f:
+        code = f.read()
+    os.remove(request_path)
+
+    stream = CappedStream(os.path.join(RESULTS_DIR, request_id + ".log"))
+    error = None
+    exit_code = 0
+    started = time.monotonic()
+    sampler = MemorySampler()
+    sampler.start()
+    with CapturedOutput(stream):
+        try:
+            exec(compile(code, "<analysis>", "exec"), namespace)
+        except SystemExit as e:
+            exit_code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+        except BaseException:
+            error = traceback.format_exc()
+            exit_code = 1
+    stream.close()
+    peak = sampler.stop()
+
+    result_tmp = os.path.join(RESULTS_DIR, request_id + ".tmp")
+    with open(result_tmp, "w", encoding="utf-8") as f:
+        json.dump({
+            "error": error,
+            "exit_code": exit_code,
+            "duration": time.monotonic() - started,
+            "output_size": stream.total_size,
+            "head_size": stream.head_size,
+            "tail": stream.tail_text(),
+            "peak_memory": peak
+        }, f)
+    os.replace(result_tmp, os.path.join(RESULTS_DIR, request_id + ".json"))
+'''
+
+class AnalysisSession:
+    """A long-running kernel container that keeps its globals between calls."""
+
+    def __init__(self, session_id: str, container, work_dir: Path):
+        self.session_id = session_id
+        self.container = container
+        self.work_dir = work_dir
+        self.requests_dir = work_dir / "requests"
+        self.results_dir = work_dir / "results"
+        self.artifacts_dir = work_dir / "artifacts"
+        self.last_used = time.monotonic()
+        self.artifact_mtimes: Dict[str, float] = {}
+
+    def is_alive(self) -> bool:
+        try:
+            self.container.reload()
+            return self.container.status == "running"
+        except Exception:
+            return False
+
+    def close(self) -> None:
+        try:
+            self.container.remove(force=True)
+        except Exception:
+            pass
+        shutil.rmtree(self.work_dir, ignore_errors=True)
 
 class Analysis:
-    def __init__(self):
+    def __init__(self, idle_timeout: float = 900, mem_limit: str = "512m",
+                 timeout: float = 10, max_artifact_bytes: int = 1024 * 1024,
+                 max_output_chars: int = 16000):
         self.client = docker.from_env()
         self.image_name = "python:3.12-slim"
+        self.idle_timeout = idle_timeout
+        self.mem_limit = mem_limit
+        self.timeout = timeout
+        self.max_artifact_bytes = max_artifact_bytes
+        self.max_output_chars = max_output_chars
+        self.artifacts_root = Path("data/analysis/artifacts")
+        self.sessions: Dict[str, AnalysisSession] = {}
         self._ensure_image()
-    
+
     def _ensure_image(self) -> None:
         """Ensure the Python Docker image is available locally."""
         try:
             self.client.images.get(self.image_name)
         except docker.errors.ImageNotFound:
-            print(f"Pulling {self.image_name} image...")
+            log.info("Pulling %s image", self.image_name)
             self.client.images.pull(self.image_name)
-    
-    def process(self, code: str) -> Dict[str, Any]:
-        """Execute Python code safely in a Docker container.
-        
+
+    def _start_session(self, session_id: str) -> AnalysisSession:
+        """Start a kernel container with a shared working directory."""
+        work_dir = Path(tempfile.mkdtemp(prefix="analysis-"))
+        for name in ("requests", "results", "artifacts"):
+            (work_dir / name).mkdir()
+        (work_dir / "kernel.py").write_text(KERNEL_SCRIPT, encoding="utf-8")
+
+        try:
+            container = self.client.containers.run(
+                self.image_name,
+                command=["python", "-u", "/session/kernel.py"],
+                volumes={
+                    str(work_dir): {
+                        "bind": "/session",
+                        "mode": "rw"
+                    }
+                },
+                working_dir="/session/artifacts",
+                environment={
+                    "ANALYSIS_HEAD_LIMIT": str(self.max_output_chars // 2),
+                    "ANALYSIS_TAIL_LIMIT": str(self.max_output_chars // 2),
+                    # Backstop for sessions this process never closed (e.g. it crashed); normally reaped before
+                    "ANALYSIS_IDLE_TIMEOUT": str(self.idle_timeout + 300)
+                },
+                mem_limit=self.mem_limit,
+                memswap_limit=self.mem_limit,
+                cpu_period=100000,
+                cpu_quota=50000,
+                network_mode="none",
+                # Output between requests goes to the container log, so cap that too
+                log_config=docker.types.LogConfig(type=docker.types.LogConfig.types.JSON,
+                                                  config={"max-size": "1m", "max-file": "1"}),
+                remove=True,
+                detach=True
+            )
+        except Exception:
+            shutil.rmtree(work_dir, ignore_errors=True)
+            raise
+
+        log.info("Analysis session %s started", session_id)
+        return AnalysisSession(session_id, container, work_dir)
+
+    def _get_session(self, session_id: str) -> AnalysisSession:
+        session = self.sessions.get(session_id)
+        if session and not session.is_alive():
+            session.close()
+            session = None
+        if not session:
+            session = self._start_session(session_id)
+            self.sessions[session_id] = session
+        return session
+
+    def _collect_artifacts(self, session: AnalysisSession) -> List[Dict[str, Any]]:
+        """Copy new or changed files from the shared artifacts directory."""
+        artifacts = []
+        target_dir = self.artifacts_root / session.session_id
+
+        for path in sorted(session.artifacts_dir.rglob("*")):
+            if not path.is_file():
+                continue
+            name = str(path.relative_to(session.artifacts_dir))
+            stat = path.stat()
+            if session.artifact_mtimes.get(name) == stat.st_mtime:
+                continue
+            session.artifact_mtimes[name] = stat.st_mtime
+
+            if stat.st_size > self.max_artifact_bytes:
+                artifacts.append({"name": name, "size": stat.st_size, "path": None,
+                                  "skipped": "larger than the artifact size limit"})
+                continue
+
+            destination = target_dir / name
+            destination.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copyfile(path, destination)
+            artifacts.append({"name": name, "size": stat.st_size, "path": str(destination)})
+
+        return artifacts
+
+    def close_idle_sessions(self) -> None:
+        """Stop sessions that have not been used within the idle timeout."""
+        now = time.monotonic()
+        for session_id, session in list(self.sessions.items()):
+            if now - session.last_used > self.idle_timeout:
+                log.info("Analysis session %s idle, stopping", session_id)
+                self.reset(session_id)
+
+    def reset(self, session_id: str) -> bool:
+        """Discard a session and all of its interpreter state."""
+        session = self.sessions.pop(session_id, None)
+        if not session:
+            return False
+        session.close()
+        return True
+
+    def close(self) -> None:
+        """Stop all sessions."""
+        for session_id in list(self.sessions):
+            self.reset(session_id)
+
+    def _kill_session(self, session_id: str, timed_out: bool) -> Dict[str, Any]:
+        """Kill a session's worker if still running and report how it ended."""
+        session = self.sessions[session_id]
+        info = {"exit_code": None, "oom_killed": False}
+        try:
+            session.container.reload()
+            info["oom_killed"] = session.container.attrs["State"].get("OOMKilled", False)
+        except Exception:
+            pass
+        if timed_out:
+            try:
+                session.container.kill()
+            except Exception:
+                pass
+        try:
+            info["exit_code"] = session.container.wait(timeout=5).get("StatusCode")
+        except Exception:
+            pass
+        # The container removes itself on exit, possibly before its state could be read;
+        # a SIGKILL we did not send comes from the OOM killer
+        if not timed_out and info["exit_code"] == 137:
+            info["oom_killed"] = True
+        self.reset(session_id)
+        return info
+
+    def process(self, code: str, session_id: str = "default", reset: bool = False,
+                timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Execute Python code in a persistent, sandboxed session.
+
+        Globals defined by earlier calls in the same session stay available.
+        Files written to ``ARTIFACTS_DIR`` (also the working directory) are
+        copied to data/analysis/artifacts/<session_id>/ and returned by path.
+        Output, including that of subprocesses and C extensions, is streamed
+        to disk while the code runs and capped to the first and last
+        ``max_output_chars / 2`` characters. A run that exceeds the
+        wall-clock deadline kills the worker and resets the session.
+
         Args:
             code: The Python code to execute
-            
+            session_id: The session to run in, usually one per conversation
+            reset: Start from a fresh interpreter before running the code
+            timeout: Wall-clock deadline in seconds, defaults to self.timeout
+
         Returns:
             Dict containing execution results with keys:
             - success: bool indicating if execution was successful
-            - output: stdout/stderr from the code execution
+            - output: stdout/stderr from the code execution, head/tail truncated
             - error: error message if execution failed
+            - exit_code: 0 on success, the SystemExit code, or the worker's exit status
+            - duration: wall-clock seconds spent waiting for the result
+            - peak_memory: peak memory of the worker in bytes while this code ran, sampled
+            - truncated: whether output was cut to fit the cap
+            - artifacts: files created or changed by the code
         """
-        with tempfile.TemporaryDirectory() as temp_dir:
-            code_file = Path(temp_dir) / "code.py"
-            code_file.write_text(code)
-            
-            try:
-                container = self.client.containers.run(
-                    self.image_name,
-                    command=["python", "/code/code.py"],
-                    volumes={
-                        temp_dir: {
-                            "bind": "/code",
-                            "mode": "ro"
-                        }
-                    },
-                    mem_limit="512m",
-                    memswap_limit="512m",
-                    cpu_period=100000,
-                    cpu_quota=50000,
-                    network_mode="none",
-                    remove=True,
-                    detach=True 
-                )
-                
-                try:
-                    container.wait(timeout=10)
-                    output = container.logs().decode('utf-8')
-                    return {
-                        "success": True,
-                        "output": output,
-                        "error": None
-                    }
-                    
-                except Exception as e:
-                    try:
-                        container.kill()
-                    except:
-                        pass
-                    return {
-                        "success": False,
-                        "output": None,
-                        "error": f"Execution error: {str(e)}"
-                    }
-                    
-            except Exception as e:
-                return {
-                    "success": False,
-                    "output": None,
-                    "error": f"Container error: {str(e)}"
-                }
-    
\ No newline at end of file
+        self.close_idle_sessions()
+        if reset:
+            self.reset(session_id)
+
+        try:
+            session = self._get_session(session_id)
+        except Exception as e:
+            return {
+                "success": False,
+                "output": None,
+                "error": f"Container error: {str(e)}",
+                "exit_code": None,
+                "duration": 0.0,
+                "peak_memory": None,
+                "truncated": False,
+                "artifacts": []
+            }
+
+        request_id = f"{time.time_ns()}-{uuid.uuid4().hex[:8]}"
+        request_tmp = session.requests_dir / f"{request_id}.tmp"
+        request_tmp.write_text(code, encoding="utf-8")
+        request_tmp.replace(session.requests_dir / f"{request_id}.py")
+
+        log_file = session.results_dir / f"{request_id}.log"
+        result_file = session.results_dir / f"{request_id}.json"
+        started = time.monotonic()
+        deadline = started + (timeout if timeout is not None else self.timeout)
+        head_parts: List[str] = []
+        log_handle = None
+        result: Optional[Dict[str, Any]] = None
+
+        try:
+            while time.monotonic() < deadline:
+                if log_handle is None and log_file.exists():
+                    log_handle = open(log_file, "r", encoding="utf-8", errors="replace")
+                if log_handle is not None:
+                    head_parts.append(log_handle.read())
+                if result_file.exists():
+                    result = json.loads(result_file.read_text(encoding="utf-8"))
+                    result_file.unlink()
+                    if log_handle is not None:
+                        head_parts.append(log_handle.read())
+                    break
+                if not session.is_alive():
+                    break
+                time.sleep(0.05)
+        finally:
+            if log_handle is not None:
+                log_handle.close()
+            log_file.unlink(missing_ok=True)
+
+        duration = time.monotonic() - started
+        session.last_used = time.monotonic()
+        head = "".join(head_parts)
+
+        if result is None:
+            timed_out = session.is_alive()
+            info = self._kill_session(session_id, timed_out)
+            if timed_out:
+                reason = f"deadline of {deadline - started:.0f}s exceeded"
+            elif info["oom_killed"]:
+                reason = f"worker exceeded the {self.mem_limit} memory limit"
+            else:
+                reason = "worker exited unexpectedly"
+            return {
+                "success": False,
+                "output": head or None,
+                "error": f"Execution error: {reason}, session state was reset",
+                "exit_code": info["exit_code"],
+                "duration": duration,
+                "peak_memory": None,
+                "truncated": bool(head) and len(head) >= self.max_output_chars // 2,
+                "artifacts": []
+            }
+
+        tail = result["tail"]
+        dropped = result["output_size"] - result["head_size"] - len(tail)
+        output = head
+        if dropped > 0:
+            output += f"\n... [{dropped} characters truncated] ...\n"
+        output += tail
+
+        return {
+            "success": result["error"] is None and result["exit_code"] == 0,
+            "output": output,
+            "error": result["error"],
+            "exit_code": result["exit_code"],
+            "duration": duration,
+            "peak_memory": result["peak_memory"],
+            "truncated": dropped > 0,
+            "artifacts": self._collect_artifacts(session)
+        }
@@ -1,27 +1,49 @@
+import heapq
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from pathlib import Path
+from typing import Dict, List, Optional, Tuple
 import pytz
-from config import TIME_ZONE
+from settings import TIME_ZONE, CALENDAR_IDS, CALENDAR_MAX_RESULTS, CALENDAR_MAX_PAGES
 
+import httplib2
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
+from google_auth_httplib2 import AuthorizedHttp
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 
+# Only what the tool shows, which keeps responses for busy calendars small
+EVENT_FIELDS = "nextPageToken,items(id,summary,description,start,end)"
+# Largest page the events API returns
+MAX_PAGE_SIZE = 250
+
 class Calendar:    
+    """Google Calendar tool over the calendars in CALENDAR_IDS.
+
+    Reads query every calendar concurrently and merge the events by start
+    time; new events go to the first calendar. The free/busy mode answers
+    availability questions with a single freeBusy query and no event bodies.
+    """
+
     SCOPES = ['https://www.googleapis.com/auth/calendar']
     
-    def __init__(self):
+    def __init__(self, service=None):
         self.creds = None
-        self.service = None
+        self.service = service
         self.token_file = Path("data/calendar/token.json")
         self.credentials_file = Path("data/calendar/credentials.json")
         self.timezone = pytz.timezone(TIME_ZONE)
+        self.calendar_ids = CALENDAR_IDS
+        self.executor = ThreadPoolExecutor(max_workers=max(1, len(CALENDAR_IDS)), thread_name_prefix="calendar")
+        self.local = threading.local()
         
         self.token_file.parent.mkdir(parents=True, exist_ok=True)
         
-        self._authenticate()
+        if not self.service:
+            self._authenticate()
     
     def _local_to_utc(self, dt_str: str) -> str:
         """Convert local datetime string to UTC datetime string"""
@@ -72,46 +94,100 @@ class Calendar:
 
         self.service = build('calendar', 'v3', credentials=self.creds)
     
+    def _execute(self, request) -> Dict:
+        """Execute a request; httplib2 is not thread-safe, so each thread gets its own connection"""
+        if not self.creds:
+            return request.execute()
+        if not hasattr(self.local, "http"):
+            self.local.http = AuthorizedHttp(self.creds, http=httplib2.Http())
+        return request.execute(http=self.local.http)
+    
+    def _parse_time(self, value: str) -> datetime:
+        """An API date or datetime as an aware datetime in TIME_ZONE"""
+        if "T" not in value:
+            return self.timezone.localize(datetime.strptime(value, "%Y-%m-%d"))
+        return datetime.fromisoformat(value).astimezone(self.timezone)
+    
     def process(self, mode: str, range_val: int = 10, event_id: str = None, 
                 title: str = None, description: str = None, 
-                start_time: str = None, end_time: str = None) -> str:
+                start_time: str = None, end_time: str = None, calendar_id: str = None,
+                limit: int = CALENDAR_MAX_RESULTS) -> str:
         """Process calendar operations based on mode"""
+        calendar_id = calendar_id or self.calendar_ids[0]
+        try:
+            range_val, limit = int(range_val), int(limit)
+        except (TypeError, ValueError):
+            return "Error: range_val and limit must be whole numbers"
         try:
             if mode == 'r':
-                return self._read_events(range_val)
+                return self._read_events(range_val, limit)
+            elif mode == 'f':
+                return self._free_busy(range_val, start_time, end_time)
             elif mode == 'w':
-                return self._write_event(event_id, title, description, start_time, end_time)
+                return self._write_event(event_id, title, description, start_time, end_time, calendar_id)
             elif mode == 'd':
-                return self._delete_event(event_id)
+                return self._delete_event(event_id, calendar_id)
             else:
-                return "Invalid mode. Use 'r' for read, 'w' for write, or 'd' for delete."
+                return "Invalid mode. Use 'r' for read, 'f' for free/busy, 'w' for write, or 'd' for delete."
         except HttpError as error:
             return f"An error occurred: {error}"
     
-    def _read_events(self, range_val: int = 10) -> str:
-        """Read calendar events"""
+    def _window(self, range_val: int) -> Tuple[datetime, datetime]:
         now = datetime.now(self.timezone)
-        
         if range_val >= 0:
-            time_min = now.astimezone(pytz.UTC).isoformat()
-            time_max = (now + timedelta(days=abs(range_val))).astimezone(pytz.UTC).isoformat()
-        else:
-            time_min = (now + timedelta(days=range_val)).astimezone(pytz.UTC).isoformat()
-            time_max = now.astimezone(pytz.UTC).isoformat()
-        
-        events_result = self.service.events().list(
-            calendarId='primary',
-            timeMin=time_min,
-            timeMax=time_max,
-            maxResults=abs(range_val),
-            singleEvents=True,
-            orderBy='startTime'
-        ).execute()
-        
-        events = events_result.get('items', [])
+            return now, now + timedelta(days=abs(range_val))
+        return now + timedelta(days=range_val), now
+
+    def _list_events(self, calendar_id: str, time_min: str, time_max: str, limit: int) -> Tuple[List[Dict], bool]:
+        """Up to limit events of one calendar, following pages up to CALENDAR_MAX_PAGES, and whether more exist"""
+        events, page_token = [], None
+        for _ in range(CALENDAR_MAX_PAGES):
+            events_result = self._execute(self.service.events().list(
+                calendarId=calendar_id,
+                timeMin=time_min,
+                timeMax=time_max,
+                maxResults=min(limit - len(events), MAX_PAGE_SIZE),
+                pageToken=page_token,
+                singleEvents=True,
+                orderBy='startTime',
+                timeZone=TIME_ZONE,
+                fields=EVENT_FIELDS
+            ))
+            events.extend(dict(event, calendarId=calendar_id) for event in events_result.get('items', []))
+            page_token = events_result.get('nextPageToken')
+            if not page_token or len(events) >= limit:
+                break
+        return events, page_token is not None
+
+    @staticmethod
+    def _start_key(event: Dict) -> str:
+        # All calendars are listed in TIME_ZONE, so the offsets match and the strings sort by time
+        return event['start'].get('dateTime', event['start'].get('date', ''))
+
+    def _read_events(self, range_val: int = 10, limit: int = CALENDAR_MAX_RESULTS) -> str:
+        """Read up to limit events in the next (or, if negative, past) range_val days from all calendars"""
+        limit = max(1, min(limit, CALENDAR_MAX_RESULTS))
+        window_start, window_end = self._window(range_val)
+        time_min = window_start.astimezone(pytz.UTC).isoformat()
+        time_max = window_end.astimezone(pytz.UTC).isoformat()
+
+        futures = {calendar_id: self.executor.submit(self._list_events, calendar_id, time_min, time_max, limit)
+                   for calendar_id in self.calendar_ids}
+        per_calendar, errors, truncated = [], [], False
+        for calendar_id, future in futures.items():
+            try:
+                events, more = future.result()
+            except HttpError as error:
+                errors.append(f"Could not read calendar {calendar_id}: {error}")
+                continue
+            per_calendar.append(events)
+            truncated = truncated or more
+        events = list(heapq.merge(*per_calendar, key=self._start_key))
+        truncated = truncated or len(events) > limit
+        events = events[:limit]
         
         if not events:
-            return 'No events found.'
+            return "\n".join(errors + ['No events found.'])
         
         result = []
         for event in events:
@@ -126,22 +202,70 @@ class Calendar:
             description = event.get('description', '')
             
             event_details = []
-            event_details.append(f"Event: {event['summary']}")
+            event_details.append(f"Event: {event.get('summary', '(no title)')}")
             if description:
                 event_details.append(f"Description: {description}")
             event_details.append(f"When: {start} to {end} {TIME_ZONE}")
+            if len(self.calendar_ids) > 1:
+                event_details.append(f"Calendar: {event['calendarId']}")
             event_details.append(f"ID: {event['id']}")
             
             result.append(" | ".join(event_details))
         
-        if abs(range_val) == 1:
-            return result[0] if result else 'No events found.'
-        
-        return "\n".join(result)
+        if truncated:
+            result.append(f"[Showing the first {len(events)} events in this range, there are more]")
+        return "\n".join(errors + result)
+
+    def _free_busy(self, range_val: int = 10, start_time: Optional[str] = None,
+                   end_time: Optional[str] = None) -> str:
+        """Busy and free periods across all calendars from one freeBusy query"""
+        if start_time and end_time:
+            try:
+                window_start = self.timezone.localize(datetime.strptime(start_time, "%Y-%m-%d %H:%M:%S"))
+                window_end = self.timezone.localize(datetime.strptime(end_time, "%Y-%m-%d %H:%M:%S"))
+            except ValueError:
+                return "Error: start_time and end_time must be in YYYY-MM-DD HH:MM:SS format"
+        else:
+            window_start, window_end = self._window(range_val)
+
+        response = self._execute(self.service.freebusy().query(body={
+            "timeMin": window_start.astimezone(pytz.UTC).isoformat(),
+            "timeMax": window_end.astimezone(pytz.UTC).isoformat(),
+            "timeZone": TIME_ZONE,
+            "items": [{"id": calendar_id} for calendar_id in self.calendar_ids]
+        }))
+
+        busy, errors = [], []
+        for calendar_id, calendar in response.get("calendars", {}).items():
+            if calendar.get("errors"):
+                errors.append(f"Could not check calendar {calendar_id}: {calendar['errors'][0].get('reason')}")
+            for period in calendar.get("busy", []):
+                start = max(self._parse_time(period["start"]), window_start)
+                end = min(self._parse_time(period["end"]), window_end)
+                if start < end:
+                    busy.append((start, end))
+
+        # Overlapping busy periods from different calendars count once
+        merged: List[List[datetime]] = []
+        for start, end in sorted(busy):
+            if merged and start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+
+        result, cursor = [], window_start
+        for start, end in merged:
+            if cursor < start:
+                result.append(f"Free: {cursor:%Y-%m-%d %H:%M} to {start:%Y-%m-%d %H:%M}")
+            result.append(f"Busy: {start:%Y-%m-%d %H:%M} to {end:%Y-%m-%d %H:%M}")
+            cursor = end
+        if cursor < window_end:
+            result.append(f"Free: {cursor:%Y-%m-%d %H:%M} to {window_end:%Y-%m-%d %H:%M}")
+        return "\n".join(errors + [f"Times in {TIME_ZONE}"] + result)
     
     def _write_event(self, event_id: str = None, title: str = None, 
                      description: str = None, start_time: str = None, 
-                     end_time: str = None) -> str:
+                     end_time: str = None, calendar_id: str = None) -> str:
         """Write or update a calendar event"""
         if not all([title, start_time, end_time]):
             return "Missing required fields: title, start_time, and end_time are required"
@@ -165,14 +289,14 @@ class Calendar:
             
             if event_id:
                 updated_event = self.service.events().update(
-                    calendarId='primary',
+                    calendarId=calendar_id,
                     eventId=event_id,
                     body=event
                 ).execute()
                 return f"Event updated: {updated_event['htmlLink']}"
             else:
                 created_event = self.service.events().insert(
-                    calendarId='primary',
+                    calendarId=calendar_id,
                     body=event
                 ).execute()
                 return f"Event created: {created_event['htmlLink']}"
@@ -181,13 +305,13 @@ class Calendar:
         except HttpError as e:
             return f"Error: Failed to create/update event. Details: {str(e)}"
     
-    def _delete_event(self, event_id: str) -> str:
+    def _delete_event(self, event_id: str, calendar_id: str) -> str:
         """Delete a calendar event"""
         if not event_id:
             return "Event ID is required for deletion"
         
         self.service.events().delete(
-            calendarId='primary',
+            calendarId=calendar_id,
             eventId=event_id
         ).execute()
         
@@ -0,0 +1,90 @@
+import random
+import re
+from functools import lru_cache
+from typing import Dict, FrozenSet, List, Optional, Set, Tuple
+
+from settings import USER_NAME
+
+# Words that appear in most memories and say nothing about which fact they hold
+STOP_WORDS = {"the", "and", "for", "with", "that", "this", "has", "have", "are", "was", "from", "likes",
+              "user", "users", "their", *(word.lower() for word in re.findall(r"\w+", USER_NAME))}
+PRIME = (1 << 61) - 1
+# Shingles whose min-hash inputs are kept; common words and trigrams recur across most texts
+PERMUTATION_CACHE = 4096
+
+def shingles(text: str) -> FrozenSet[str]:
+    """Words and in-word character trigrams, so reordered ids and small spelling changes still overlap"""
+    words = {word.rstrip("s") if len(word) > 4 else word
+             for word in re.findall(r"\w+", text.lower().replace("_", " "))
+             if len(word) > 2 and word not in STOP_WORDS}
+    grams = {word[i:i + 3] for word in words if len(word) > 4 for i in range(len(word) - 2)}
+    return frozenset(words | grams)
+
+def jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+class MinHashIndex:
+    """MinHash signatures bucketed by LSH bands for finding near-duplicate texts.
+
+    Each text is reduced to a set of shingles and a signature of bands * rows
+    min-hashes. Texts that agree on every row of any band share a bucket, so a
+    lookup only compares against those candidates, whose exact Jaccard
+    similarity is then checked. Pairs with similarity s become candidates with
+    probability 1 - (1 - s**rows)**bands.
+    """
+
+    def __init__(self, bands: int = 16, rows: int = 2, seed: int = 1):
+        self.bands = bands
+        self.rows = rows
+        generator = random.Random(seed)
+        self.hashes = [(generator.randrange(1, PRIME), generator.randrange(PRIME)) for _ in range(bands * rows)]
+        self.buckets: List[Dict[Tuple[int, ...], Set[str]]] = [{} for _ in range(bands)]
+        self.entries: Dict[str, Tuple[FrozenSet[str], List[Tuple[int, ...]]]] = {}
+        self._permuted = lru_cache(maxsize=PERMUTATION_CACHE)(self._permute)
+
+    def _permute(self, shingle: str) -> Tuple[int, ...]:
+        """The shingle's value under each of the hash functions"""
+        value = hash(shingle) & PRIME
+        return tuple([(a * value + b) % PRIME for a, b in self.hashes])
+
+    def _band_keys(self, shingle_set: FrozenSet[str]) -> List[Tuple[int, ...]]:
+        signature = list(map(min, zip(*map(self._permuted, shingle_set))))
+        return [tuple(signature[band * self.rows:(band + 1) * self.rows]) for band in range(self.bands)]
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.entries
+
+    def add(self, key: str, text: str) -> None:
+        self.remove(key)
+        shingle_set = shingles(text)
+        if not shingle_set:
+            return
+        band_keys = self._band_keys(shingle_set)
+        self.entries[key] = (shingle_set, band_keys)
+        for band, band_key in enumerate(band_keys):
+            self.buckets[band].setdefault(band_key, set()).add(key)
+
+    def remove(self, key: str) -> None:
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        for band, band_key in enumerate(entry[1]):
+            bucket = self.buckets[band].get(band_key)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self.buckets[band][band_key]
+
+    def similar(self, text: str, threshold: float, exclude: Optional[str] = None) -> List[Tuple[float, str]]:
+        """Indexed keys whose text is at least threshold similar, most similar first"""
+        shingle_set = shingles(text)
+        if not shingle_set:
+            return []
+        candidates = set()
+        for band, band_key in enumerate(self._band_keys(shingle_set)):
+            candidates |= self.buckets[band].get(band_key, set())
+        candidates.discard(exclude)
+        scored = [(jaccard(shingle_set, self.entries[key][0]), key) for key in candidates]
+        return sorted((item for item in scored if item[0] >= threshold), reverse=True)
@@ -1,42 +1,151 @@
 from enum import Enum
 from pathlib import Path
-import json
-from typing import Optional, Dict
+import re
+from typing import Optional, Dict, Set, Union
+
+from settings import (MEMORY_DEDUP, MEMORY_DUPLICATE_THRESHOLD, MEMORY_COMPACT_THRESHOLD, MEMORY_COMPACT_BATCH)
+from assistant.state import JsonRecords, SharedRecords
+from assistant.tools.dedup import MinHashIndex
+from utils.log import fields, get_logger
+from utils.tracing import tracer
+
+log = get_logger(__name__)
 
 class MemoryMode(Enum):
     WRITE = "w"
     DELETE = "d"
 
 class Memory:
-    def __init__(self):
-        self.memory_file = Path("data/assistant/memories.json")
-        self.memories = self._load_memories()
-        
-    def _load_memories(self) -> Dict:
-        self.memory_file.parent.mkdir(parents=True, exist_ok=True)
-        
-        if self.memory_file.exists():
-            with open(self.memory_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        return {}
+    """Memories stored by the model, with near-duplicate detection.
+
+    Writes of a new id are checked against a MinHash index and, depending on
+    MEMORY_DEDUP, added to the existing memory or returned to the model for
+    confirmation. All memories are indexed on load. compact() goes through the
+    loaded ones in batches and merges the clear duplicates stored before, each
+    memory once rather than on every pass. Merging appends the text instead
+    of replacing it, as similar wording can still carry a different fact.
+    """
 
-    def _save_memories(self):
-        with open(self.memory_file, 'w', encoding='utf-8') as f:
-            json.dump(self.memories, f, ensure_ascii=False, indent=2)
+    def __init__(self, store: Union[JsonRecords, SharedRecords, None] = None):
+        self.store = store or JsonRecords(Path("data/assistant/memories.json"), "memories")
+        self.memories: Dict[str, str] = self.store.load()
+        self.dedup = MinHashIndex()
+        for memory_id, content in self.memories.items():
+            self.dedup.add(memory_id, self._text(memory_id, content))
+        # Loaded memories not yet checked for duplicates, in insertion order
+        self.unchecked: Dict[str, None] = dict.fromkeys(self.memories)
+
+    def _save_memories(self, *memory_ids: str):
+        self.store.save(self.memories, memory_ids)
+
+    def refresh(self) -> None:
+        """Apply memory changes made by other workers, which checked them for duplicates already"""
+        for memory_id in self.store.sync(self.memories):
+            self.unchecked.pop(memory_id, None)
+            if memory_id in self.memories:
+                self.dedup.add(memory_id, self._text(memory_id, self.memories[memory_id]))
+            else:
+                self.dedup.remove(memory_id)
 
-    def process(self, mode: MemoryMode, memory_id: str, content: Optional[str] = None) -> str:
+    @staticmethod
+    def _text(memory_id: str, content: str) -> str:
+        return f"{memory_id} {content}"
+
+    @staticmethod
+    def _combine(existing: str, new: str) -> str:
+        """Content keeping both texts, so a merge never drops what either said"""
+        if new.strip() in existing:
+            return existing
+        if existing.strip() in new:
+            return new
+        return f"{existing}\n{new}"
+
+    def process(self, mode: MemoryMode, memory_id: str, content: Optional[str] = None, force: bool = False) -> str:
+        with self.store.writing():
+            self.refresh()
+            return self._process(mode, memory_id, content, force)
+
+    def _process(self, mode: MemoryMode, memory_id: str, content: Optional[str], force: bool) -> str:
         if mode == MemoryMode.WRITE:
-            self.memories[memory_id] = content
-            self._save_memories()
+            if memory_id not in self.memories and not force and MEMORY_DEDUP != "off":
+                matches = self.dedup.similar(self._text(memory_id, content), MEMORY_DUPLICATE_THRESHOLD, memory_id)
+                if matches:
+                    match_id = matches[0][1]
+                    if MEMORY_DEDUP == "merge":
+                        tracer.increment("memory_duplicates_total", action="merged")
+                        combined = self._combine(self.memories[match_id], content)
+                        self._write(match_id, combined)
+                        return (f"Memory {memory_id} looks like existing memory {match_id}, added to it. "
+                                f"{match_id} now reads: {combined}")
+                    tracer.increment("memory_duplicates_total", action="confirm")
+                    return (f"Not saved: {memory_id} looks like existing memory {match_id}: "
+                            f"{self.memories[match_id]}\nUpdate {match_id} instead, or write again with "
+                            f"force=true if it is a different fact.")
+            self._write(memory_id, content)
             return f"Memory {memory_id} saved successfully"
         elif mode == MemoryMode.DELETE:
             if memory_id in self.memories:
                 del self.memories[memory_id]
-                self._save_memories()
+                self.dedup.remove(memory_id)
+                self.unchecked.pop(memory_id, None)
+                self._save_memories(memory_id)
                 return f"Memory {memory_id} deleted successfully"
             return f"Memory {memory_id} not found"
         
+    def _write(self, memory_id: str, content: str) -> None:
+        self.memories[memory_id] = content
+        self.dedup.add(memory_id, self._text(memory_id, content))
+        self.unchecked.pop(memory_id, None)
+        self._save_memories(memory_id)
+
+    def compact(self, batch: int = MEMORY_COMPACT_BATCH) -> int:
+        """Check up to batch loaded memories, merging clear duplicates. Returns how many were merged."""
+        with self.store.writing():
+            self.refresh()
+            return self._compact(batch)
+
+    def _compact(self, batch: int) -> int:
+        changed = []
+        for memory_id in list(self.unchecked)[:batch]:
+            del self.unchecked[memory_id]
+            content = self.memories[memory_id]
+            matches = self.dedup.similar(self._text(memory_id, content), MEMORY_COMPACT_THRESHOLD, memory_id)
+            if not matches:
+                continue
+            # Fold this memory into its match, keeping both texts
+            match_id = matches[0][1]
+            combined = self._combine(self.memories[match_id], content)
+            self.memories[match_id] = combined
+            self.dedup.add(match_id, self._text(match_id, combined))
+            del self.memories[memory_id]
+            self.dedup.remove(memory_id)
+            changed += [memory_id, match_id]
+            log.info("Merged memory %s into %s", memory_id, match_id, extra=fields(similarity=round(matches[0][0], 2)))
+
+        merged = len(changed) // 2
+        if merged:
+            tracer.increment("memory_duplicates_total", merged, action="compacted")
+            self._save_memories(*changed)
+        return merged
+
+    @staticmethod
+    def _words(text: str) -> Set[str]:
+        return {word for word in re.findall(r"\w+", text.lower()) if len(word) > 2}
+    
+    def relevant_memories(self, text: str, limit: int = 5) -> str:
+        """Memories sharing the most words with the text"""
+        self.refresh()
+        words = self._words(text)
+        scored = []
+        for memory_id, content in self.memories.items():
+            score = len(words & self._words(f"{memory_id.replace('_', ' ')} {content}"))
+            if score:
+                scored.append((score, memory_id, content))
+        scored.sort(key=lambda item: item[0], reverse=True)
+        return "\n".join(f"{memory_id}: {content}" for _, memory_id, content in scored[:limit])
+    
     def get_all_memories(self) -> str:
+        self.refresh()
         if not self.memories:
             return "No memories stored"
         
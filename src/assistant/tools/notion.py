@@ -3,13 +3,13 @@ from notion_client import Client
 from notion_client.errors import APIResponseError
 
 class Notion:
-    def __init__(self, api_token: str, databases: dict = None):
+    def __init__(self, api_token: str, databases: dict = None, client=None):
         if not api_token:
             raise ValueError("Notion API token is required and was not provided.")
         self.api_token = api_token
         self.databases = databases or {}
         
-        self.client = Client(auth=self.api_token)
+        self.client = client or Client(auth=self.api_token)
 
     def get_database_id(self, database_name: str) -> str:
         """Get the database ID based on the given database name."""
@@ -0,0 +1,169 @@
+import calendar
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+import pytz
+
+from settings import TIME_ZONE
+
+WEEKDAYS = ["MO", "TU", "WE", "TH", "FR", "SA", "SU"]
+FREQUENCIES = {"HOURLY": timedelta(hours=1), "DAILY": timedelta(days=1), "WEEKLY": timedelta(weeks=1),
+               "MONTHLY": None, "YEARLY": None}
+PRESETS = {
+    "daily": "FREQ=DAILY",
+    "weekly": "FREQ=WEEKLY",
+    "biweekly": "FREQ=WEEKLY;INTERVAL=2",
+    "monthly": "FREQ=MONTHLY",
+    "yearly": "FREQ=YEARLY",
+}
+SUPPORTED_PARTS = {"FREQ", "INTERVAL", "BYDAY", "BYMONTHDAY", "UNTIL", "WKST"}
+# Periods searched for an occurrence before a rule is considered exhausted (e.g. BYMONTHDAY=31 every 2 months)
+MAX_EMPTY_PERIODS = 48
+
+def _parse_until(value: str) -> datetime:
+    utc = value.endswith("Z")
+    value = value.rstrip("Z")
+    if "T" in value:
+        until = datetime.strptime(value, "%Y%m%dT%H%M%S")
+    else:
+        until = datetime.strptime(value, "%Y%m%d").replace(hour=23, minute=59, second=59)
+    if utc:
+        until = pytz.utc.localize(until).astimezone(pytz.timezone(TIME_ZONE)).replace(tzinfo=None)
+    return until
+
+class Recurrence:
+    """A repeat rule: one of the named presets or a subset of RFC 5545 RRULE.
+
+    Supported parts are FREQ (HOURLY, DAILY, WEEKLY, MONTHLY, YEARLY), INTERVAL,
+    BYDAY (weekly), BYMONTHDAY (monthly, negative counts from the month end) and
+    UNTIL. Times are naive wall-clock times in TIME_ZONE, so a daily 09:00 task
+    stays at 09:00 across DST changes. Occurrences are counted from the anchor
+    (the first occurrence): a monthly task anchored on the 31st falls on the last
+    day of shorter months and returns to the 31st afterwards. Finding the next
+    occurrence after any moment takes constant time, however far behind it is.
+    """
+
+    def __init__(self, freq: str, interval: int = 1, by_day: Optional[List[int]] = None,
+                 by_month_day: Optional[List[int]] = None, until: Optional[datetime] = None):
+        self.freq = freq
+        self.interval = interval
+        self.by_day = sorted(set(by_day)) if by_day else None
+        self.by_month_day = by_month_day
+        self.until = until
+
+    @classmethod
+    def parse(cls, repeat: Optional[str]) -> Optional["Recurrence"]:
+        """The rule for a task's repeat value, None if it does not repeat. Raises ValueError if invalid."""
+        if not repeat or repeat == "never":
+            return None
+        rule = PRESETS.get(repeat.lower(), repeat).strip()
+        if rule.upper().startswith("RRULE:"):
+            rule = rule[len("RRULE:"):]
+        if "=" not in rule:
+            raise ValueError(f"repeat must be one of {['never', *PRESETS]} or an RRULE such as FREQ=WEEKLY;BYDAY=MO,WE")
+
+        parts = {}
+        for part in filter(None, rule.split(";")):
+            key, _, value = part.partition("=")
+            parts[key.strip().upper()] = value.strip().upper()
+        unsupported = set(parts) - SUPPORTED_PARTS
+        if unsupported:
+            raise ValueError(f"unsupported RRULE parts {sorted(unsupported)}, use {sorted(SUPPORTED_PARTS - {'WKST'})}")
+
+        freq = parts.get("FREQ")
+        if freq not in FREQUENCIES:
+            raise ValueError(f"FREQ must be one of {list(FREQUENCIES)}")
+        try:
+            interval = int(parts.get("INTERVAL", "1"))
+        except ValueError:
+            raise ValueError("INTERVAL must be a positive number")
+        if interval < 1:
+            raise ValueError("INTERVAL must be a positive number")
+
+        by_day = None
+        if "BYDAY" in parts:
+            if freq != "WEEKLY":
+                raise ValueError("BYDAY is only supported with FREQ=WEEKLY")
+            days = parts["BYDAY"].split(",")
+            if not all(day in WEEKDAYS for day in days):
+                raise ValueError(f"BYDAY must be a list of {WEEKDAYS}")
+            by_day = [WEEKDAYS.index(day) for day in days]
+
+        by_month_day = None
+        if "BYMONTHDAY" in parts:
+            if freq != "MONTHLY":
+                raise ValueError("BYMONTHDAY is only supported with FREQ=MONTHLY")
+            try:
+                by_month_day = [int(day) for day in parts["BYMONTHDAY"].split(",")]
+            except ValueError:
+                by_month_day = []
+            if not by_month_day or not all(1 <= abs(day) <= 31 for day in by_month_day):
+                raise ValueError("BYMONTHDAY must be a list of days between 1 and 31 or -31 and -1")
+
+        until = None
+        if "UNTIL" in parts:
+            try:
+                until = _parse_until(parts["UNTIL"])
+            except ValueError:
+                raise ValueError("UNTIL must be YYYYMMDD or YYYYMMDDTHHMMSS[Z]")
+
+        return cls(freq, interval, by_day, by_month_day, until)
+
+    def _week_start(self, anchor: datetime) -> datetime:
+        return anchor - timedelta(days=anchor.weekday())
+
+    def _index(self, anchor: datetime, moment: datetime) -> int:
+        """The period that contains moment, counted from the anchor's"""
+        if self.freq == "MONTHLY":
+            return ((moment.year - anchor.year) * 12 + moment.month - anchor.month) // self.interval
+        if self.freq == "YEARLY":
+            return (moment.year - anchor.year) // self.interval
+        base = self._week_start(anchor) if self.by_day else anchor
+        return (moment - base) // (FREQUENCIES[self.freq] * self.interval)
+
+    def _period(self, anchor: datetime, index: int) -> List[datetime]:
+        """Candidate occurrences in a period, in order"""
+        step = FREQUENCIES[self.freq]
+        if step is not None:
+            if self.by_day:
+                week = self._week_start(anchor) + step * self.interval * index
+                return [week + timedelta(days=day) for day in self.by_day]
+            return [anchor + step * self.interval * index]
+
+        months = index * self.interval * (12 if self.freq == "YEARLY" else 1)
+        year, month = divmod(anchor.month - 1 + months, 12)
+        year, month = anchor.year + year, month + 1
+        last = calendar.monthrange(year, month)[1]
+        if self.by_month_day:
+            days = sorted({day if day > 0 else last + 1 + day for day in self.by_month_day})
+            days = [day for day in days if 1 <= day <= last]
+        else:
+            days = [min(anchor.day, last)]
+        return [anchor.replace(year=year, month=month, day=day) for day in days]
+
+    def after(self, anchor: datetime, moment: datetime) -> Optional[datetime]:
+        """The first occurrence strictly after moment, None once the rule has ended"""
+        start = max(0, self._index(anchor, moment))
+        for index in range(start, start + MAX_EMPTY_PERIODS):
+            for occurrence in self._period(anchor, index):
+                if occurrence > moment and occurrence >= anchor:
+                    return occurrence if self.until is None or occurrence <= self.until else None
+        return None
+
+    def latest(self, anchor: datetime, moment: datetime) -> Optional[datetime]:
+        """The last occurrence at or before moment"""
+        start = self._index(anchor, moment)
+        for index in range(start, max(-1, start - MAX_EMPTY_PERIODS), -1):
+            for occurrence in reversed(self._period(anchor, index)):
+                if anchor <= occurrence <= moment and (self.until is None or occurrence <= self.until):
+                    return occurrence
+        return None
+
+    def between(self, anchor: datetime, start: datetime, end: datetime, limit: int) -> List[datetime]:
+        """Up to limit occurrences from start to end inclusive"""
+        occurrences = []
+        occurrence = self.after(anchor, start - timedelta(microseconds=1))
+        while occurrence is not None and occurrence <= end and len(occurrences) < limit:
+            occurrences.append(occurrence)
+            occurrence = self.after(anchor, occurrence)
+        return occurrences
@@ -1,8 +1,21 @@
-import json
-from datetime import datetime
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime, timedelta
 from enum import Enum
 from pathlib import Path
-from typing import Dict, List, Optional, Union
+from typing import Dict, List, Optional, Tuple, Union
+
+import pytz
+
+from settings import TIME_ZONE, TASK_CATCH_UP, TASK_CATCH_UP_GRACE, TASK_CATCH_UP_MAX, TASK_PAGE_SIZE
+from assistant.state import JsonRecords, SharedRecords
+from assistant.tools.recurrence import Recurrence
+from utils.log import get_logger
+
+log = get_logger(__name__)
+
+DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+# Sorts after any task id, so (datetime, LAST_ID) bounds every task at that time
+LAST_ID = "\uffff"
 
 class TaskMode(Enum):
     READ = "r"
@@ -18,29 +31,58 @@ class TaskRepeat(Enum):
     YEARLY = "yearly"
 
 class Tasks:
-    def __init__(self):
-        self.tasks_file = Path("data/tasks.json")
-        self.tasks_file.parent.mkdir(parents=True, exist_ok=True)
+    """Scheduled tasks, kept in data/tasks.json or, with several workers, in the shared state.
+
+    An index of (datetime, id) pairs sorted by next run time backs window
+    queries, the next-N listing and the due scan, so none of them has to walk
+    or sort every task. Datetime strings sort chronologically as-is.
+    """
+
+    def __init__(self, store: Union[JsonRecords, SharedRecords, None] = None):
+        self.store = store or JsonRecords(Path("data/tasks.json"), "tasks")
+        self.timezone = pytz.timezone(TIME_ZONE)
         self._load_tasks()
 
     def _load_tasks(self) -> None:
-        if self.tasks_file.exists():
-            with open(self.tasks_file, 'r', encoding='utf-8') as f:
-                self.tasks = json.load(f)
-        else:
-            self.tasks = {}
-            self._save_tasks()
+        self.tasks = self.store.load()
+        self._build_index()
+
+    def _build_index(self) -> None:
+        self.index: List[Tuple[str, str]] = sorted((task['datetime'], task_id) for task_id, task in self.tasks.items())
+
+    def refresh(self) -> bool:
+        """Apply task changes made by other workers, True if there were any"""
+        if not self.store.sync(self.tasks):
+            return False
+        self._build_index()
+        return True
 
-    def _save_tasks(self) -> None:
-        with open(self.tasks_file, 'w', encoding='utf-8') as f:
-            json.dump(self.tasks, f, ensure_ascii=False, indent=2)
+    def _unindex(self, task_id: str) -> None:
+        entry = (self.tasks[task_id]['datetime'], task_id)
+        position = bisect_left(self.index, entry)
+        if position < len(self.index) and self.index[position] == entry:
+            del self.index[position]
+
+    def _reschedule(self, task_id: str, task_datetime: str) -> None:
+        self._unindex(task_id)
+        self.tasks[task_id]['datetime'] = task_datetime
+        insort(self.index, (task_datetime, task_id))
+
+    def _save_tasks(self, *task_ids: str) -> None:
+        self.store.save(self.tasks, task_ids)
 
     def process(self, mode: TaskMode, task_id: str, instructions: Optional[str] = None,
                task_datetime: Optional[str] = None, repeat: Optional[str] = None,
-               agent: str = "assistant") -> str:
+               agent: str = "assistant", start: Optional[str] = None, end: Optional[str] = None,
+               limit: int = TASK_PAGE_SIZE, offset: int = 0) -> str:
         if mode == TaskMode.READ:
+            self.refresh()
             if not task_id:
-                return self._list_all_tasks()
+                try:
+                    limit, offset = int(limit), int(offset)
+                except (TypeError, ValueError):
+                    return "Error: limit and offset must be whole numbers"
+                return self._query_tasks(start, end, repeat, limit, offset)
             return self._read_task(task_id)
         
         elif mode == TaskMode.WRITE:
@@ -48,36 +90,89 @@ class Tasks:
                 return "Error: instructions and datetime are required for write mode"
             
             try:
-                datetime.strptime(task_datetime, "%Y-%m-%d %H:%M:%S")
+                first_time = datetime.strptime(task_datetime, DATETIME_FORMAT)
             except ValueError:
                 return "Error: datetime must be in format YYYY-MM-DD HH:MM:SS"
             
-            if repeat and repeat not in [r.value for r in TaskRepeat]:
-                return f"Error: repeat must be one of {[r.value for r in TaskRepeat]}"
+            try:
+                rule = Recurrence.parse(repeat)
+            except ValueError as e:
+                return f"Error: {e}"
+            if rule is not None:
+                # With BYDAY the first run is the first matching day, not necessarily datetime itself
+                first = rule.after(first_time, first_time - timedelta(seconds=1))
+                if first is None:
+                    return "Error: the repeat rule has no occurrence at or after datetime"
+                task_datetime = first.strftime(DATETIME_FORMAT)
             
             if agent != "assistant":
                 return "Error: only 'assistant' is supported as agent at the moment"
             
-            return self._write_task(task_id, instructions, task_datetime, repeat or "never", agent)
+            with self.store.writing():
+                self.refresh()
+                return self._write_task(task_id, instructions, task_datetime, repeat or "never", agent)
         
         elif mode == TaskMode.DELETE:
-            return self._delete_task(task_id)
+            with self.store.writing():
+                self.refresh()
+                return self._delete_task(task_id)
         
         return "Error: Invalid mode"
 
-    def _list_all_tasks(self) -> str:
-        if not self.tasks:
+    def _format_tasks(self, task_ids: List[str]) -> str:
+        return "\n".join(f"{self.tasks[task_id]['datetime']} {task_id} ({self.tasks[task_id]['repeat']}): "
+                         f"{self.tasks[task_id]['instructions']}" for task_id in task_ids)
+
+    def _window_bound(self, value: Optional[str], is_end: bool) -> str:
+        """A window edge as an index key; a bare date covers that whole day"""
+        if not value:
+            return LAST_ID if is_end else ""
+        try:
+            moment = datetime.strptime(value, DATETIME_FORMAT)
+        except ValueError:
+            moment = datetime.strptime(value, "%Y-%m-%d")
+            if is_end:
+                moment = moment.replace(hour=23, minute=59, second=59)
+        return moment.strftime(DATETIME_FORMAT)
+
+    def _query_tasks(self, start: Optional[str], end: Optional[str], repeat: Optional[str],
+                     limit: int = TASK_PAGE_SIZE, offset: int = 0) -> str:
+        """Tasks from start to end by next run time, optionally only one repeat type, a page at a time"""
+        try:
+            low = bisect_left(self.index, (self._window_bound(start, False), ""))
+            high = bisect_right(self.index, (self._window_bound(end, True), LAST_ID))
+        except ValueError:
+            return "Error: start and end must be in format YYYY-MM-DD HH:MM:SS or YYYY-MM-DD"
+
+        limit, offset = max(1, min(limit, TASK_PAGE_SIZE)), max(0, offset)
+        if repeat:
+            if repeat == "repeating":
+                matches = lambda task: task['repeat'] != TaskRepeat.NEVER.value
+            else:
+                matches = lambda task: task['repeat'].lower() == repeat.lower()
+            window = [task_id for _, task_id in self.index[low:high] if matches(self.tasks[task_id])]
+            total, page = len(window), window[offset:offset + limit]
+        else:
+            # Without a filter the page is a direct slice of the index
+            total = high - low
+            page = [task_id for _, task_id in self.index[low + offset:min(high, low + offset + limit)]]
+        if not total:
             return "No tasks found"
-        
-        result = []
-        for task_id, task in self.tasks.items():
-            result.append(f"Task {task_id}:")
-            result.append(f"  Instructions: {task['instructions']}")
-            result.append(f"  DateTime: {task['datetime']}")
-            result.append(f"  Repeat: {task['repeat']}")
-            result.append(f"  Agent: {task['agent']}\n")
-        
-        return "\n".join(result)
+        if not page:
+            return f"No tasks at offset {offset}, there are {total}"
+
+        result = self._format_tasks(page)
+        end_offset = offset + len(page)
+        if end_offset < total:
+            result += f"\n[Showing {offset + 1}-{end_offset} of {total} tasks; use offset={end_offset} for more]"
+        return result
+
+    def next_tasks(self, limit: int = 5) -> str:
+        """The next tasks by due time, one line each"""
+        self.refresh()
+        if not self.index:
+            return "No tasks found"
+        return self._format_tasks([task_id for _, task_id in self.index[:limit]])
 
     def _read_task(self, task_id: str) -> str:
         if task_id not in self.tasks:
@@ -92,58 +187,86 @@ class Tasks:
 
     def _write_task(self, task_id: str, instructions: str, task_datetime: str,
                     repeat: str, agent: str) -> str:
+        existed = task_id in self.tasks
+        if existed:
+            self._unindex(task_id)
         self.tasks[task_id] = {
             "instructions": instructions,
             "datetime": task_datetime,
+            "anchor": task_datetime,
             "repeat": repeat,
             "agent": agent
         }
-        self._save_tasks()
-        return f"Task {task_id} has been {'updated' if task_id in self.tasks else 'created'}"
+        insort(self.index, (task_datetime, task_id))
+        self._save_tasks(task_id)
+        return f"Task {task_id} has been {'updated' if existed else 'created'}"
 
     def _delete_task(self, task_id: str) -> str:
         if task_id not in self.tasks:
             return f"Error: Task {task_id} not found"
         
+        self._unindex(task_id)
         del self.tasks[task_id]
-        self._save_tasks()
+        self._save_tasks(task_id)
         return f"Task {task_id} has been deleted"
 
+    def _due(self, task_id: str, task: Dict[str, str], scheduled: datetime, now: datetime) -> Dict[str, str]:
+        return {
+            "id": task_id,
+            "instructions": task['instructions'],
+            "agent": task['agent'],
+            "scheduled": scheduled.strftime(DATETIME_FORMAT),
+            "late": (now - scheduled).total_seconds() > TASK_CATCH_UP_GRACE
+        }
+
+    def _catch_up(self, rule: Recurrence, anchor: datetime, task_time: datetime, now: datetime) -> List[datetime]:
+        """The occurrences of a repeating task to run, from its due time up to now"""
+        if TASK_CATCH_UP == "run-all":
+            return rule.between(anchor, task_time, now, TASK_CATCH_UP_MAX) or [task_time]
+        latest = rule.latest(anchor, now) or task_time
+        if TASK_CATCH_UP == "skip" and (now - latest).total_seconds() > TASK_CATCH_UP_GRACE:
+            return []
+        return [latest]
+
     def get_due_tasks(self) -> List[Dict[str, str]]:
-        """Returns a list of tasks that are due for execution"""
-        current_time = datetime.now()
+        """Returns a list of tasks that are due for execution
+
+        Repeating tasks jump straight to their first occurrence after now, and
+        runs missed while the assistant was down are handled per TASK_CATCH_UP.
+        """
+        with self.store.writing():
+            self.refresh()
+            return self._take_due_tasks(datetime.now(self.timezone).replace(tzinfo=None))
+
+    def _take_due_tasks(self, current_time: datetime) -> List[Dict[str, str]]:
         due_tasks = []
-        
-        for task_id, task in list(self.tasks.items()):
-            task_time = datetime.strptime(task['datetime'], "%Y-%m-%d %H:%M:%S")
-            
-            if task_time <= current_time:
-                due_tasks.append({
-                    "id": task_id,
-                    "instructions": task['instructions'],
-                    "agent": task['agent']
-                })
-                
-                if task['repeat'] != TaskRepeat.NEVER.value:
-                    next_time = task_time
-                    if task['repeat'] == TaskRepeat.DAILY.value:
-                        next_time = next_time.replace(day=next_time.day + 1)
-                    elif task['repeat'] == TaskRepeat.WEEKLY.value:
-                        next_time = next_time.replace(day=next_time.day + 7)
-                    elif task['repeat'] == TaskRepeat.BIWEEKLY.value:
-                        next_time = next_time.replace(day=next_time.day + 14)
-                    elif task['repeat'] == TaskRepeat.MONTHLY.value:
-                        if next_time.month == 12:
-                            next_time = next_time.replace(year=next_time.year + 1, month=1)
-                        else:
-                            next_time = next_time.replace(month=next_time.month + 1)
-                    elif task['repeat'] == TaskRepeat.YEARLY.value:
-                        next_time = next_time.replace(year=next_time.year + 1)
-                    
-                    task['datetime'] = next_time.strftime("%Y-%m-%d %H:%M:%S")
-                    self._save_tasks()
-                else:
-                    del self.tasks[task_id]
-                    self._save_tasks()
-        
+        due = bisect_right(self.index, (current_time.strftime(DATETIME_FORMAT), LAST_ID))
+        due_ids = [task_id for _, task_id in self.index[:due]]
+        for task_id in due_ids:
+            task = self.tasks[task_id]
+            task_time = datetime.strptime(task['datetime'], DATETIME_FORMAT)
+
+            try:
+                rule = Recurrence.parse(task['repeat'])
+            except ValueError as e:
+                log.warning("Task %s has an invalid repeat rule, running it once: %s", task_id, e)
+                rule = None
+            if rule is None:
+                due_tasks.append(self._due(task_id, task, task_time, current_time))
+                self._unindex(task_id)
+                del self.tasks[task_id]
+                continue
+
+            anchor = datetime.strptime(task.setdefault('anchor', task['datetime']), DATETIME_FORMAT)
+            for scheduled in self._catch_up(rule, anchor, task_time, current_time):
+                due_tasks.append(self._due(task_id, task, scheduled, current_time))
+            next_time = rule.after(anchor, current_time)
+            if next_time is None:
+                self._unindex(task_id)
+                del self.tasks[task_id]
+            else:
+                self._reschedule(task_id, next_time.strftime(DATETIME_FORMAT))
+
+        if due_ids:
+            self._save_tasks(*due_ids)
         return due_tasks
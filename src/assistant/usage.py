@@ -0,0 +1,156 @@
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+from utils.log import get_logger
+
+log = get_logger(__name__)
+
+# USD per 1M tokens: (input, cached input, output)
+MODEL_PRICING = {
+    "gpt-4.1": (2.00, 0.50, 8.00),
+    "gpt-4.1-mini": (0.40, 0.10, 1.60),
+    "gpt-4.1-nano": (0.10, 0.025, 0.40),
+    "gpt-4o": (2.50, 1.25, 10.00),
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+    "o4-mini": (1.10, 0.275, 4.40),
+}
+
+# Models without a price, logged once each
+_unpriced: Set[str] = set()
+
+def model_prices(model: str) -> Optional[Tuple[float, float, float]]:
+    """Prices of a model, also for dated snapshots like gpt-4.1-2025-04-14."""
+    if model in MODEL_PRICING:
+        return MODEL_PRICING[model]
+    # The longest name wins, so gpt-4.1-mini-2025-04-14 is not priced as gpt-4.1
+    for name in sorted(MODEL_PRICING, key=len, reverse=True):
+        if model.startswith(name + "-"):
+            return MODEL_PRICING[name]
+    if model not in _unpriced:
+        _unpriced.add(model)
+        log.warning("No price known for model %s, its cost is not counted", model)
+    return None
+
+def _item_chars(item: Dict) -> int:
+    content = item.get("content")
+    if isinstance(content, list):
+        return sum(len(part.get("text", "")) for part in content)
+    return len(json.dumps(item, ensure_ascii=False))
+
+def tool_shares(input: List[Dict], instructions: str) -> Dict[str, float]:
+    """Estimate which fraction of a request's input each tool's outputs make up.
+
+    Shares are by character count, which is close enough to attribute input
+    tokens to the tools whose results were re-sent to the model.
+    """
+    tool_names = {item["call_id"]: item["name"] for item in input if item.get("type") == "function_call"}
+    total = len(instructions)
+    tool_chars: Dict[str, int] = {}
+    for item in input:
+        chars = _item_chars(item)
+        total += chars
+        if item.get("type") == "function_call_output":
+            name = tool_names.get(item["call_id"], "unknown")
+            tool_chars[name] = tool_chars.get(name, 0) + chars
+    return {name: chars / total for name, chars in tool_chars.items()} if total else {}
+
+class UsageTracker:
+    """Token and cost accounting per model call, stored in a local SQLite table."""
+
+    def __init__(self, db_file: Path = Path("data/assistant/usage.db")):
+        db_file.parent.mkdir(parents=True, exist_ok=True)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(db_file, check_same_thread=False)
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS model_calls (
+                id INTEGER PRIMARY KEY,
+                ts REAL NOT NULL,
+                turn_id TEXT,
+                source TEXT,
+                model TEXT,
+                input_tokens INTEGER,
+                cached_tokens INTEGER,
+                output_tokens INTEGER,
+                reasoning_tokens INTEGER,
+                cost REAL
+            );
+            CREATE INDEX IF NOT EXISTS model_calls_ts ON model_calls (ts);
+            CREATE TABLE IF NOT EXISTS tool_tokens (
+                call_id INTEGER NOT NULL,
+                tool TEXT NOT NULL,
+                tokens INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS tool_tokens_call_id ON tool_tokens (call_id);
+        """)
+
+    @staticmethod
+    def cost(model: str, input_tokens: int, cached_tokens: int, output_tokens: int) -> Optional[float]:
+        prices = model_prices(model)
+        if not prices:
+            return None
+        input_price, cached_price, output_price = prices
+        return ((input_tokens - cached_tokens) * input_price + cached_tokens * cached_price
+                + output_tokens * output_price) / 1_000_000
+
+    def record(self, turn_id: str, source: Optional[str], model: str, usage,
+               shares: Dict[str, float]) -> None:
+        """Store the usage object of a Responses API call."""
+        if usage is None:
+            return
+        input_tokens = getattr(usage, "input_tokens", 0) or 0
+        output_tokens = getattr(usage, "output_tokens", 0) or 0
+        input_details = getattr(usage, "input_tokens_details", None)
+        output_details = getattr(usage, "output_tokens_details", None)
+        cached_tokens = getattr(input_details, "cached_tokens", 0) or 0
+        reasoning_tokens = getattr(output_details, "reasoning_tokens", 0) or 0
+
+        with self.lock, self.db:
+            cursor = self.db.execute(
+                "INSERT INTO model_calls (ts, turn_id, source, model, input_tokens, cached_tokens, "
+                "output_tokens, reasoning_tokens, cost) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (time.time(), turn_id, source, model, input_tokens, cached_tokens, output_tokens,
+                 reasoning_tokens, self.cost(model, input_tokens, cached_tokens, output_tokens))
+            )
+            self.db.executemany(
+                "INSERT INTO tool_tokens (call_id, tool, tokens) VALUES (?, ?, ?)",
+                [(cursor.lastrowid, tool, round(input_tokens * share)) for tool, share in shares.items()]
+            )
+
+    def _totals(self, since: float) -> str:
+        with self.lock:
+            calls, turns, input_tokens, cached, output, reasoning, cost = self.db.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT turn_id), COALESCE(SUM(input_tokens), 0), "
+                "COALESCE(SUM(cached_tokens), 0), COALESCE(SUM(output_tokens), 0), "
+                "COALESCE(SUM(reasoning_tokens), 0), COALESCE(SUM(cost), 0) FROM model_calls WHERE ts >= ?",
+                (since,)
+            ).fetchone()
+        cached_pct = 100 * cached / input_tokens if input_tokens else 0
+        return (f"{turns} turns, {calls} calls\n"
+                f"  in {input_tokens:,} ({cached_pct:.0f}% cached), out {output:,} ({reasoning:,} reasoning)\n"
+                f"  ~${cost:.3f}")
+
+    def summary(self, top: int = 5) -> str:
+        """Rolling totals and the top token consumers, formatted for chat."""
+        now = time.time()
+        week = now - 7 * 86400
+        with self.lock:
+            sources = self.db.execute(
+                "SELECT COALESCE(source, 'unknown'), SUM(input_tokens + output_tokens) AS tokens, SUM(cost) "
+                "FROM model_calls WHERE ts >= ? GROUP BY 1 ORDER BY tokens DESC LIMIT ?",
+                (week, top)
+            ).fetchall()
+            tools = self.db.execute(
+                "SELECT t.tool, SUM(t.tokens) AS tokens FROM tool_tokens t JOIN model_calls c ON c.id = t.call_id "
+                "WHERE c.ts >= ? GROUP BY 1 ORDER BY tokens DESC LIMIT ?",
+                (week, top)
+            ).fetchall()
+
+        lines = ["Last 24h: " + self._totals(now - 86400), "Last 7d: " + self._totals(week), "", "Top sources (7d):"]
+        lines += [f"  {source}: {tokens:,} tokens" + (f", ~${cost:.3f}" if cost else "") for source, tokens, cost in sources] or ["  none"]
+        lines += ["", "Top tool outputs in context (7d):"]
+        lines += [f"  {tool}: {tokens:,} input tokens" for tool, tokens in tools] or ["  none"]
+        return "\n".join(lines)
@@ -0,0 +1,33 @@
+"""Offline benchmarks. Run from src/, e.g. ``python -m benchmarks.e2e``.
+
+The benchmarks never talk to OpenAI, Telegram, Notion or Google. When no
+config.py has been set up yet, config-example.py is used so they can run on
+a fresh checkout.
+"""
+import importlib.util
+import sys
+import types
+from pathlib import Path
+
+def _ensure_module(name: str, fallback) -> None:
+    if name in sys.modules:
+        return
+    try:
+        importlib.import_module(name)
+    except ImportError:
+        sys.modules[name] = fallback()
+
+def _example_config():
+    path = Path(__file__).resolve().parent.parent / "config-example.py"
+    spec = importlib.util.spec_from_file_location("config", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def _empty_chatid():
+    module = types.ModuleType("interfaces.telegram.chatid")
+    module.USER_CHAT_ID = None
+    return module
+
+_ensure_module("config", _example_config)
+_ensure_module("interfaces.telegram.chatid", _empty_chatid)
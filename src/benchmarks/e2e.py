@@ -0,0 +1,207 @@
+"""End-to-end throughput and latency benchmark against local fakes.
+
+Usage (from src/):
+    python -m benchmarks.e2e --workload all --model-latency 0.2 --output results.json
+    python -m benchmarks.e2e --baseline results.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+from benchmarks.fakes import FakeBot, FakeCalendarService, FakeNotionClient, FakeOpenAI, FakeResponses, FakeUrl, Step
+import interfaces.telegram.bot as bot_module
+from assistant.main import Assistant
+from assistant.tools.calendar import Calendar
+from assistant.tools.notion import Notion
+from assistant.tools.tasks import TaskMode
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+def script(text: str) -> List[Step]:
+    """The fake model's plan for a turn, chosen by the message prefix."""
+    if text.startswith("multi:"):
+        return [
+            [("calendar", {"mode": "r", "range_val": 7}), ("tasks", {"mode": "r", "id": ""})],
+            [("notion", {"mode": "query_db", "database_id": "db"})],
+            [("memory", {"mode": "w", "id": "last_overview", "content": text})],
+            "Here is your overview for the week."
+        ]
+    if text.startswith("TASK "):
+        return [[("calendar", {"mode": "r", "range_val": 1})], "Reminder: " + text]
+    return ["Sure, noted!"]
+
+class Harness:
+    def __init__(self, args):
+        self.workdir = tempfile.TemporaryDirectory(prefix="pi-bench-")
+        os.chdir(self.workdir.name)
+        os.environ.setdefault("TELEGRAM_TOKEN", "0:benchmark")
+
+        bot_module.TELEGRAM_COALESCE_WINDOW = args.coalesce
+        now = datetime.now(timezone.utc)
+        events = [{
+            "id": f"evt{i}",
+            "summary": f"Event {i}",
+            "start": {"dateTime": now.replace(hour=i % 24).strftime("%Y-%m-%dT%H:%M:%SZ")},
+            "end": {"dateTime": now.replace(hour=i % 24).strftime("%Y-%m-%dT%H:%M:%SZ")}
+        } for i in range(24)]
+
+        self.responses = FakeResponses(script, latency=args.model_latency)
+        self.notion_client = FakeNotionClient(latency=args.tool_latency)
+        self.fake_bot = FakeBot(latency=args.telegram_latency)
+        self.assistant = Assistant(
+            client=FakeOpenAI(self.responses),
+            calendar=Calendar(service=FakeCalendarService({"primary": events}, latency=args.tool_latency)),
+            notion=Notion(api_token="benchmark", databases={"db": "db"}, client=self.notion_client),
+            url=FakeUrl(latency=args.tool_latency)
+        )
+        self.bot = bot_module.TelegramBot(self.assistant)
+        self.bot.bot = self.fake_bot
+        self.bot.sender.bot = self.fake_bot
+
+        self.waiting: Dict[int, List[float]] = {}
+        self.latencies: List[float] = []
+        send = self.bot.sender.send
+
+        async def recording_send(chat_id: int, text: str) -> bool:
+            result = await send(chat_id, text)
+            started = self.waiting.pop(chat_id, None)
+            if started:
+                self.latencies.append(time.perf_counter() - started[0])
+            return result
+
+        self.bot.sender.send = recording_send
+
+    async def send(self, chat_id: int, text: str, photo: Optional[str] = None) -> None:
+        """Send a text, or a photo with the text as its caption."""
+        self.waiting.setdefault(chat_id, []).append(time.perf_counter())
+        if photo:
+            sizes = [SimpleNamespace(file_id=photo, file_unique_id=photo, width=1280, height=960)]
+            message = SimpleNamespace(chat_id=chat_id, text=None, photo=sizes, caption=text)
+        else:
+            message = SimpleNamespace(chat_id=chat_id, text=text, photo=None, caption=None)
+        await self.bot.handle_message(SimpleNamespace(message=message), SimpleNamespace(bot=self.fake_bot))
+
+    async def wait_idle(self) -> None:
+        while self.bot.pending or self.bot.turns:
+            await asyncio.sleep(0.005)
+
+    async def multi_tool(self, turns: int) -> int:
+        """One chat, sequential turns with three tool rounds each."""
+        for i in range(turns):
+            await self.send(1, f"multi: what does my week look like? #{i}")
+            await self.wait_idle()
+        return turns
+
+    async def bursty(self, chats: int, burst: int = 3) -> int:
+        """Many chats, each sending a quick burst of messages at once."""
+        async def chat(chat_id: int):
+            for i in range(burst):
+                await self.send(chat_id, f"quick thought {i}")
+                await asyncio.sleep(0.01)
+        await asyncio.gather(*(chat(100 + i) for i in range(chats)))
+        await self.wait_idle()
+        return chats
+
+    async def photos(self, chats: int) -> int:
+        """Many chats each sending a photo to download, downscale and pass to the model."""
+        await asyncio.gather(*(self.send(200 + i, "what is in this picture?", photo=f"photo{i}")
+                               for i in range(chats)))
+        await self.wait_idle()
+        return chats
+
+    async def task_storm(self, tasks: int) -> int:
+        """Many tasks falling due at the same time."""
+        due = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        for i in range(tasks):
+            self.assistant.tasks.process(TaskMode.WRITE, f"storm_{i}", f"remind about item {i}", due)
+        self.bot.chat_ids.add(1)
+        started = time.perf_counter()
+        await self.bot.process_due_tasks()
+        self.latencies.append(time.perf_counter() - started)
+        return tasks
+
+    async def run(self, name: str, size: int) -> Dict:
+        self.latencies = []
+        model_calls = self.responses.calls
+        bot_calls = sum(self.fake_bot.calls.values())
+        tracemalloc.start()
+        started = time.perf_counter()
+        turns = await getattr(self, name)(size)
+        duration = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return {
+            "turns": turns,
+            "duration_s": duration,
+            "turns_per_s": turns / duration if duration else 0.0,
+            "p50_latency_s": percentile(self.latencies, 0.5),
+            "p95_latency_s": percentile(self.latencies, 0.95),
+            "max_latency_s": max(self.latencies, default=0.0),
+            "model_calls": self.responses.calls - model_calls,
+            "telegram_calls": sum(self.fake_bot.calls.values()) - bot_calls,
+            "peak_memory_mb": peak / 1024 / 1024
+        }
+
+def compare(results: Dict, baseline: Dict) -> None:
+    for workload, metrics in results.items():
+        if workload not in baseline:
+            continue
+        print(f"{workload} vs baseline:")
+        for key, value in metrics.items():
+            before = baseline[workload].get(key)
+            if isinstance(value, (int, float)) and before:
+                print(f"  {key}: {before:.4g} -> {value:.4g} ({(value - before) / before:+.1%})")
+
+async def main_async(args) -> Dict:
+    harness = Harness(args)
+    workloads = {
+        "multi_tool": args.turns,
+        "bursty": args.chats,
+        "photos": args.chats,
+        "task_storm": args.tasks,
+    }
+    selected = workloads if args.workload == "all" else {args.workload: workloads[args.workload]}
+    results = {}
+    for name, size in selected.items():
+        results[name] = await harness.run(name, size)
+        print(name, json.dumps(results[name], indent=2))
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark")
+    parser.add_argument("--workload", choices=["all", "multi_tool", "bursty", "photos", "task_storm"], default="all")
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--chats", type=int, default=20)
+    parser.add_argument("--tasks", type=int, default=20)
+    parser.add_argument("--model-latency", type=float, default=0.05)
+    parser.add_argument("--tool-latency", type=float, default=0.02)
+    parser.add_argument("--telegram-latency", type=float, default=0.01)
+    parser.add_argument("--coalesce", type=float, default=0.2, help="Coalesce window in seconds")
+    parser.add_argument("--output", help="Write results as JSON")
+    parser.add_argument("--baseline", help="Compare against an earlier --output file")
+    args = parser.parse_args()
+
+    cwd = os.getcwd()
+    results = asyncio.run(main_async(args))
+    os.chdir(cwd)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            compare(results, json.load(f))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""Local HTTP stand-in for the OpenAI Responses API with failure injection.
+
+Point the real SDK at it to exercise timeouts, retries, hedging and the
+circuit breaker end to end:
+
+    python -m benchmarks.fake_openai --port 8090 --error-rate 0.2 --stall-rate 0.05
+    OPENAI_BASE_URL=http://127.0.0.1:8090/v1 OPENAI_API_KEY=test uv run src/main.py
+
+Or run a quick load against it through ResilientCaller:
+
+    python -m benchmarks.fake_openai --calls 200 --error-rate 0.2 --stall-rate 0.05
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import time
+from typing import Dict
+
+from benchmarks.e2e import percentile
+from utils.http import HttpRequest, HttpResponse, HttpServer
+
+class FakeOpenAIServer:
+    def __init__(self, latency: float = 0.05, error_rate: float = 0.0, rate_limit_rate: float = 0.0,
+                 stall_rate: float = 0.0, stall: float = 30.0, seed: int = 0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.stall_rate = stall_rate
+        self.stall = stall
+        self.random = random.Random(seed)
+        self.ids = itertools.count(1)
+        self.counts: Dict[str, int] = {}
+
+    def _count(self, outcome: str) -> None:
+        self.counts[outcome] = self.counts.get(outcome, 0) + 1
+
+    async def responses(self, request: HttpRequest) -> HttpResponse:
+        body = json.loads(request.body or b"{}")
+        roll = self.random.random()
+        if roll < self.error_rate:
+            self._count("error")
+            return 500, "application/json", json.dumps({"error": {"message": "injected failure", "type": "server_error"}}).encode()
+        roll -= self.error_rate
+        if roll < self.rate_limit_rate:
+            self._count("rate_limited")
+            return 429, "application/json", json.dumps({"error": {"message": "slow down", "type": "rate_limit"}}).encode()
+        roll -= self.rate_limit_rate
+        if roll < self.stall_rate:
+            self._count("stalled")
+            await asyncio.sleep(self.stall)
+        else:
+            self._count("ok")
+            await asyncio.sleep(self.latency)
+
+        text = "Sure, noted!"
+        response = {
+            "id": f"resp_{next(self.ids)}",
+            "object": "response",
+            "created_at": int(time.time()),
+            "model": body.get("model", "fake"),
+            "status": "completed",
+            "output": [{
+                "type": "message",
+                "id": "msg_1",
+                "role": "assistant",
+                "status": "completed",
+                "content": [{"type": "output_text", "text": text, "annotations": []}]
+            }],
+            "parallel_tool_calls": True,
+            "tool_choice": "auto",
+            "tools": [],
+            "usage": {
+                "input_tokens": len(json.dumps(body)) // 4,
+                "input_tokens_details": {"cached_tokens": 0},
+                "output_tokens": len(text) // 4,
+                "output_tokens_details": {"reasoning_tokens": 0},
+                "total_tokens": len(json.dumps(body)) // 4 + len(text) // 4
+            }
+        }
+        return 200, "application/json", json.dumps(response).encode()
+
+def run_load(port: int, calls: int, timeout: float, hedge: bool) -> Dict:
+    import openai
+    from assistant.resilience import ResilientCaller
+
+    client = openai.OpenAI(base_url=f"http://127.0.0.1:{port}/v1", api_key="test", max_retries=0)
+    caller = ResilientCaller(timeout=timeout, hedge=hedge)
+    latencies, failures = [], {}
+    for i in range(calls):
+        started = time.perf_counter()
+        try:
+            caller.call(lambda timeout: client.responses.create(model="fake", input=f"ping {i}", timeout=timeout))
+            latencies.append(time.perf_counter() - started)
+        except Exception as e:
+            failures[type(e).__name__] = failures.get(type(e).__name__, 0) + 1
+    return {
+        "calls": calls,
+        "succeeded": len(latencies),
+        "failures": failures,
+        "p50_latency_s": percentile(latencies, 0.5),
+        "p95_latency_s": percentile(latencies, 0.95),
+        "max_latency_s": max(latencies, default=0.0)
+    }
+
+async def main_async(args) -> None:
+    fake = FakeOpenAIServer(args.latency, args.error_rate, args.rate_limit_rate, args.stall_rate, args.stall)
+    server = HttpServer("127.0.0.1", args.port)
+    server.route("POST", "/v1/responses", fake.responses)
+    await server.start()
+    try:
+        if args.calls:
+            result = await asyncio.to_thread(run_load, server.port, args.calls, args.timeout, args.hedge)
+            print(json.dumps({**result, "server": fake.counts}, indent=2))
+        else:
+            print(f"Fake Responses API at http://127.0.0.1:{server.port}/v1")
+            await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake OpenAI Responses API server")
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction answered with 429")
+    parser.add_argument("--stall-rate", type=float, default=0.0, help="Fraction that hang for --stall seconds")
+    parser.add_argument("--stall", type=float, default=30.0)
+    parser.add_argument("--calls", type=int, default=0, help="Send this many calls through ResilientCaller and exit")
+    parser.add_argument("--timeout", type=float, default=2.0, help="Per-attempt deadline for --calls")
+    parser.add_argument("--hedge", action="store_true", help="Enable hedged requests for --calls")
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+"""In-process stand-ins for the external services the assistant talks to."""
+import asyncio
+import io
+import itertools
+import json
+import threading
+import time
+from types import SimpleNamespace
+from typing import Callable, Dict, List, Optional, Union
+
+from PIL import Image
+
+# A scripted turn is a list of steps. Each step is either the final text
+# reply or a list of tool calls as (name, arguments) pairs.
+Step = Union[str, List[tuple]]
+
+def last_user_text(input: List[Dict]) -> str:
+    for item in reversed(input):
+        if item.get("role") == "user":
+            content = item["content"]
+            if isinstance(content, list):
+                return " ".join(part.get("text", "") for part in content)
+            return content
+    return ""
+
+def completed_steps(input: List[Dict]) -> int:
+    """Number of tool-call rounds (model responses) since the last user message."""
+    rounds = set()
+    for item in input:
+        if item.get("role") == "user":
+            rounds = set()
+        elif item.get("type") == "function_call":
+            rounds.add(item["id"].rsplit("_", 1)[0])
+    return len(rounds)
+
+class FakeResponses:
+    """Scripted replacement for client.responses with configurable latency."""
+
+    def __init__(self, script: Callable[[str], List[Step]], latency: float = 0.0,
+                 tokens_per_char: float = 0.25):
+        self.script = script
+        self.latency = latency
+        self.tokens_per_char = tokens_per_char
+        self.calls = 0
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+
+    def _usage(self, request_chars: int, output_chars: int):
+        return SimpleNamespace(
+            input_tokens=int(request_chars * self.tokens_per_char),
+            output_tokens=int(output_chars * self.tokens_per_char),
+            input_tokens_details=SimpleNamespace(cached_tokens=0),
+            output_tokens_details=SimpleNamespace(reasoning_tokens=0)
+        )
+
+    def _step(self, input: List[Dict], tools: Optional[List[Dict]]) -> Step:
+        steps = self.script(last_user_text(input))
+        index = completed_steps(input)
+        if not tools or index >= len(steps):
+            final = [step for step in steps if isinstance(step, str)]
+            return final[-1] if final else "Done."
+        return steps[index]
+
+    def create(self, model: str, instructions: str, input: List[Dict], tools: Optional[List[Dict]] = None, **kwargs):
+        with self.lock:
+            self.calls += 1
+            call_number = next(self.ids)
+        if self.latency:
+            time.sleep(self.latency)
+
+        step = self._step(input, tools)
+        request_chars = len(instructions) + len(json.dumps(input, ensure_ascii=False, default=str))
+        if isinstance(step, str):
+            content = [SimpleNamespace(type="output_text", text=step)]
+            return SimpleNamespace(
+                output=[SimpleNamespace(type="message", content=content)],
+                output_text=step,
+                usage=self._usage(request_chars, len(step)),
+                model=model
+            )
+
+        output = [
+            SimpleNamespace(type="function_call", id=f"fc_{call_number}_{i}", call_id=f"call_{call_number}_{i}",
+                            name=name, arguments=json.dumps(arguments))
+            for i, (name, arguments) in enumerate(step)
+        ]
+        return SimpleNamespace(output=output, output_text="", usage=self._usage(request_chars, 50), model=model)
+
+class FakeOpenAI:
+    def __init__(self, responses: FakeResponses):
+        self.responses = responses
+
+class _Request:
+    def __init__(self, result: Callable[[], Dict], latency: float):
+        self.result = result
+        self.latency = latency
+
+    def execute(self, **kwargs) -> Dict:
+        if self.latency:
+            time.sleep(self.latency)
+        return self.result()
+
+class _FakeEvents:
+    def __init__(self, service: "FakeCalendarService"):
+        self.service = service
+
+    def list(self, calendarId: str = "primary", timeMin: str = None, timeMax: str = None,
+             maxResults: int = 250, pageToken: str = None, **kwargs) -> _Request:
+        def result():
+            events = [event for event in self.service.calendars.get(calendarId, [])
+                      if (not timeMin or event["end"]["dateTime"] >= timeMin[:19])
+                      and (not timeMax or event["start"]["dateTime"] <= timeMax[:19])]
+            start = int(pageToken or 0)
+            page = events[start:start + maxResults]
+            response = {"items": page}
+            if start + maxResults < len(events):
+                response["nextPageToken"] = str(start + maxResults)
+            return response
+        return _Request(result, self.service.latency)
+
+    def insert(self, calendarId: str, body: Dict, **kwargs) -> _Request:
+        def result():
+            event = dict(body, id=f"evt{next(self.service.ids)}", htmlLink="https://calendar.local/event")
+            self.service.calendars.setdefault(calendarId, []).append(event)
+            return event
+        return _Request(result, self.service.latency)
+
+    def update(self, calendarId: str, eventId: str, body: Dict, **kwargs) -> _Request:
+        def result():
+            return dict(body, id=eventId, htmlLink="https://calendar.local/event")
+        return _Request(result, self.service.latency)
+
+    def delete(self, calendarId: str, eventId: str, **kwargs) -> _Request:
+        def result():
+            events = self.service.calendars.get(calendarId, [])
+            self.service.calendars[calendarId] = [event for event in events if event["id"] != eventId]
+            return {}
+        return _Request(result, self.service.latency)
+
+class _FakeFreeBusy:
+    def __init__(self, service: "FakeCalendarService"):
+        self.service = service
+
+    def query(self, body: Dict, **kwargs) -> _Request:
+        def result():
+            calendars = {}
+            for item in body.get("items", []):
+                events = self.service.calendars.get(item["id"], [])
+                calendars[item["id"]] = {"busy": [{"start": event["start"]["dateTime"], "end": event["end"]["dateTime"]}
+                                                  for event in events
+                                                  if event["end"]["dateTime"] >= body["timeMin"][:19]
+                                                  and event["start"]["dateTime"] <= body["timeMax"][:19]]}
+            return {"calendars": calendars}
+        return _Request(result, self.service.latency)
+
+class FakeCalendarService:
+    """Mimics the parts of the googleapiclient Calendar service the tool uses."""
+
+    def __init__(self, calendars: Optional[Dict[str, List[Dict]]] = None, latency: float = 0.0):
+        self.calendars = calendars or {"primary": []}
+        self.latency = latency
+        self.ids = itertools.count(1)
+
+    def events(self) -> _FakeEvents:
+        return _FakeEvents(self)
+
+    def freebusy(self) -> _FakeFreeBusy:
+        return _FakeFreeBusy(self)
+
+class _FakeEndpoint:
+    def __init__(self, client: "FakeNotionClient", **methods: Callable):
+        self.client = client
+        for name, method in methods.items():
+            setattr(self, name, self._delayed(method))
+
+    def _delayed(self, method: Callable) -> Callable:
+        def call(**kwargs):
+            self.client.calls += 1
+            if self.client.latency:
+                time.sleep(self.client.latency)
+            return method(**kwargs)
+        return call
+
+class FakeNotionClient:
+    """Mimics notion_client.Client with canned pages."""
+
+    def __init__(self, pages_per_query: int = 20, latency: float = 0.0):
+        self.latency = latency
+        self.calls = 0
+        page = {"object": "page", "id": "page", "properties": {"Name": {"title": [{"plain_text": "Page"}]}}}
+        self.query_result = {"object": "list", "results": [dict(page, id=f"page{i}") for i in range(pages_per_query)]}
+        self.databases = _FakeEndpoint(self, query=lambda **kwargs: self.query_result)
+        self.pages = _FakeEndpoint(self, create=lambda **kwargs: {"object": "page", "id": "new_page"},
+                                   update=lambda **kwargs: {"object": "page", "id": kwargs.get("page_id")})
+        self.blocks = SimpleNamespace(children=_FakeEndpoint(
+            self,
+            append=lambda **kwargs: {"object": "list", "results": []},
+            list=lambda **kwargs: {"object": "list", "results": [{"type": "paragraph"}]}
+        ))
+
+    def close(self) -> None:
+        pass
+
+class FakeUrl:
+    def __init__(self, text: str = "Example page content. " * 200, latency: float = 0.0):
+        self.text = text
+        self.latency = latency
+
+    def process(self, url: str) -> str:
+        if self.latency:
+            time.sleep(self.latency)
+        return self.text[:10000]
+
+class FakeMessage:
+    def __init__(self, bot: "FakeBot", chat_id: int, message_id: int, text: str):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.text = text
+
+    async def edit_text(self, text: str, **kwargs) -> "FakeMessage":
+        await self.bot._call("edit_message_text")
+        self.text = text
+        return self
+
+    async def delete(self, **kwargs) -> bool:
+        await self.bot._call("delete_message")
+        return True
+
+def fixture_photo(width: int = 1280, height: int = 960) -> bytes:
+    """A JPEG standing in for a user's photo, generated so no fixture file is needed."""
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), (90, 140, 200)).save(buffer, "JPEG")
+    return buffer.getvalue()
+
+class FakeFile:
+    """Mimics telegram.File, serving the same fixture photo for every file id."""
+
+    def __init__(self, bot: "FakeBot", file_id: str, data: bytes):
+        self.bot = bot
+        self.file_id = file_id
+        self.data = data
+
+    async def download_as_bytearray(self, **kwargs) -> bytearray:
+        await self.bot._call("download_file")
+        return bytearray(self.data)
+
+class FakeBot:
+    """Records Bot API calls in place of telegram.Bot."""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls: Dict[str, int] = {}
+        self.sent: List[FakeMessage] = []
+        self.message_ids = itertools.count(1)
+        self.photo: Optional[bytes] = None
+
+    async def _call(self, method: str) -> None:
+        self.calls[method] = self.calls.get(method, 0) + 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    async def send_message(self, chat_id: int, text: str, **kwargs) -> FakeMessage:
+        await self._call("send_message")
+        message = FakeMessage(self, chat_id, next(self.message_ids), text)
+        self.sent.append(message)
+        return message
+
+    async def get_file(self, file_id: str, **kwargs) -> FakeFile:
+        await self._call("get_file")
+        if self.photo is None:
+            self.photo = fixture_photo()
+        return FakeFile(self, file_id, self.photo)
@@ -0,0 +1,213 @@
+"""Replay a recorded conversation history as a deterministic workload.
+
+Each user message in the recording becomes a turn. The model is replaced by
+a stand-in that answers with the recorded tool calls and the recorded reply,
+and tools either return their recorded outputs or run against the local
+fakes. Per-turn latency, request payload size and (estimated) token counts
+are reported so a new build can be compared against last week's traffic.
+
+Usage (from src/):
+    python -m benchmarks.replay --history ../data/assistant/conversation_history.json --output replay.json
+    python -m benchmarks.replay --history ../data/assistant/conversation_history.json --baseline replay.json
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+from collections import deque
+from pathlib import Path
+from typing import Deque, Dict, List, Optional, Tuple
+
+from benchmarks.e2e import percentile
+from benchmarks.fakes import FakeCalendarService, FakeNotionClient, FakeOpenAI, FakeResponses, FakeUrl, Step
+from assistant.main import Assistant
+from assistant.tools.calendar import Calendar
+from assistant.tools.notion import Notion
+
+class RecordedTurn:
+    """One user message with the tool rounds and reply that followed it."""
+
+    def __init__(self, message: str):
+        self.message = message
+        self.rounds: List[List[Dict]] = []
+        self.reply = ""
+
+    @property
+    def steps(self) -> List[Step]:
+        rounds = [[(call["name"], json.loads(call["arguments"] or "{}")) for call in calls] for calls in self.rounds]
+        return rounds + [self.reply]
+
+def user_text(content) -> str:
+    if isinstance(content, list):
+        text = " ".join(part.get("text", "") for part in content if part.get("type") == "input_text")
+        return "[image] " + text
+    return content
+
+def parse_history(messages: List[Dict]) -> List[RecordedTurn]:
+    """Split a history into turns.
+
+    The recording does not say which tool calls came from the same model
+    response, so each uninterrupted run of calls is treated as one round.
+    """
+    turns: List[RecordedTurn] = []
+    calls: Dict[str, Dict] = {}
+    previous = None
+    for item in messages:
+        if item.get("role") == "user":
+            turns.append(RecordedTurn(user_text(item["content"])))
+        elif not turns:
+            continue
+        elif item.get("type") == "function_call":
+            if previous not in ("function_call", "function_call_output"):
+                turns[-1].rounds.append([])
+            call = {"name": item["name"], "arguments": item.get("arguments", ""), "output": None}
+            calls[item["call_id"]] = call
+            turns[-1].rounds[-1].append(call)
+        elif item.get("type") == "function_call_output":
+            if item["call_id"] in calls:
+                calls[item["call_id"]]["output"] = item["output"]
+        elif item.get("role") == "assistant":
+            turns[-1].reply = item["content"] if isinstance(item["content"], str) else user_text(item["content"])
+        previous = item.get("type") or item.get("role")
+    return turns
+
+def tool_key(name: str, args: Dict) -> Tuple[str, str]:
+    return name, json.dumps(args, sort_keys=True)
+
+class ReplayResponses(FakeResponses):
+    """Serves the current recorded turn and measures each request."""
+
+    def __init__(self, latency: float = 0.0, tokens_per_char: float = 0.25):
+        super().__init__(lambda text: self.turn.steps, latency, tokens_per_char)
+        self.turn: Optional[RecordedTurn] = None
+        self.request_bytes = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+
+    def create(self, model: str, instructions: str, input: List[Dict], tools: Optional[List[Dict]] = None, **kwargs):
+        self.request_bytes += len(instructions.encode()) + len(json.dumps(input, ensure_ascii=False, default=str).encode())
+        response = super().create(model, instructions, input, tools, **kwargs)
+        self.input_tokens += response.usage.input_tokens
+        self.output_tokens += response.usage.output_tokens
+        return response
+
+class Replay:
+    def __init__(self, turns: List[RecordedTurn], seed: List[Dict], data_dir: Optional[Path], args):
+        self.workdir = tempfile.TemporaryDirectory(prefix="pi-replay-")
+        os.chdir(self.workdir.name)
+        Path("data/assistant").mkdir(parents=True)
+        # Start from the recorded state so prompts have realistic sizes
+        if data_dir:
+            for name in ("tasks.json", "assistant/memories.json"):
+                if (data_dir / name).exists():
+                    shutil.copy(data_dir / name, Path("data") / name)
+        with open("data/assistant/conversation_history.json", "w", encoding="utf-8") as f:
+            json.dump(seed, f, ensure_ascii=False)
+
+        self.turns = turns
+        self.tool_latency = args.tool_latency
+        self.responses = ReplayResponses(latency=args.model_latency)
+        self.assistant = Assistant(
+            client=FakeOpenAI(self.responses),
+            calendar=Calendar(service=FakeCalendarService(latency=args.tool_latency)),
+            notion=Notion(api_token="replay", databases={}, client=FakeNotionClient(latency=args.tool_latency)),
+            url=FakeUrl(latency=args.tool_latency)
+        )
+        if args.tools == "recorded":
+            self.outputs: Dict[Tuple[str, str], Deque[str]] = {}
+            for turn in turns:
+                for calls in turn.rounds:
+                    for call in calls:
+                        key = tool_key(call["name"], json.loads(call["arguments"] or "{}"))
+                        self.outputs.setdefault(key, deque()).append(call["output"] or "")
+            self.assistant._run_tool = self._recorded_tool
+
+    def _recorded_tool(self, name: str, args: Dict) -> str:
+        if self.tool_latency:
+            time.sleep(self.tool_latency)
+        outputs = self.outputs.get(tool_key(name, args))
+        return outputs.popleft() if outputs else "No recorded output"
+
+    def run_turn(self, index: int, turn: RecordedTurn) -> Dict:
+        self.responses.turn = turn
+        calls, request_bytes = self.responses.calls, self.responses.request_bytes
+        input_tokens, output_tokens = self.responses.input_tokens, self.responses.output_tokens
+        source = "task" if turn.message.startswith("TASK ") else "chat"
+        started = time.perf_counter()
+        reply = self.assistant.chat(turn.message, source=f"replay:{source}")
+        return {
+            "turn": index,
+            "source": source,
+            "latency_s": time.perf_counter() - started,
+            "model_calls": self.responses.calls - calls,
+            "tool_calls": sum(len(calls) for calls in turn.rounds),
+            "request_bytes": self.responses.request_bytes - request_bytes,
+            "reply_bytes": len(reply.encode()),
+            "input_tokens": self.responses.input_tokens - input_tokens,
+            "output_tokens": self.responses.output_tokens - output_tokens
+        }
+
+    def run(self) -> Dict:
+        results = [self.run_turn(index, turn) for index, turn in enumerate(self.turns)]
+        latencies = [result["latency_s"] for result in results]
+        summary = {
+            "turns": len(results),
+            "p50_latency_s": percentile(latencies, 0.5),
+            "p95_latency_s": percentile(latencies, 0.95),
+            "max_latency_s": max(latencies, default=0.0),
+            "model_calls": sum(result["model_calls"] for result in results),
+            "request_bytes": sum(result["request_bytes"] for result in results),
+            "input_tokens": sum(result["input_tokens"] for result in results),
+            "output_tokens": sum(result["output_tokens"] for result in results)
+        }
+        return {"summary": summary, "turns": results}
+
+def compare(results: Dict, baseline: Dict) -> None:
+    print("replay vs baseline:")
+    for key, value in results["summary"].items():
+        before = baseline["summary"].get(key)
+        if isinstance(value, (int, float)) and before:
+            print(f"  {key}: {before:.4g} -> {value:.4g} ({(value - before) / before:+.1%})")
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a recorded conversation offline")
+    parser.add_argument("--history", default="data/assistant/conversation_history.json")
+    parser.add_argument("--turns", type=int, default=0, help="Replay only the last N turns (0 = all)")
+    parser.add_argument("--tools", choices=["recorded", "fakes"], default="recorded",
+                        help="Return recorded tool outputs or run the tools against local fakes")
+    parser.add_argument("--model-latency", type=float, default=0.0)
+    parser.add_argument("--tool-latency", type=float, default=0.0)
+    parser.add_argument("--output", help="Write results as JSON")
+    parser.add_argument("--baseline", help="Compare against an earlier --output file")
+    args = parser.parse_args()
+
+    history_file = Path(args.history).resolve()
+    with open(history_file, "r", encoding="utf-8") as f:
+        messages = json.load(f)
+    turns = parse_history(messages)
+    replayed = turns[-args.turns:] if args.turns else turns
+
+    # Everything before the replayed window is loaded as existing history
+    seed = []
+    if len(replayed) < len(turns):
+        user_indexes = [i for i, item in enumerate(messages) if item.get("role") == "user"]
+        seed = messages[:user_indexes[len(turns) - len(replayed)]]
+
+    cwd = os.getcwd()
+    try:
+        results = Replay(replayed, seed, history_file.parent.parent, args).run()
+    finally:
+        os.chdir(cwd)
+    print(json.dumps(results["summary"], indent=2))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            compare(results, json.load(f))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""Storage micro-benchmarks for tasks, memories and conversation history.
+
+Generates synthetic data files of increasing size and times the operations
+the assistant runs on them. Results are JSON records that can be compared
+across commits.
+
+Usage (from src/):
+    python -m benchmarks.storage --sizes 10000 100000 1000000 --output storage.json
+    python -m benchmarks.storage --baseline storage.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from assistant.main import Assistant
+from assistant.tools.memory import Memory, MemoryMode
+from assistant.tools.tasks import Tasks, TaskRepeat
+
+REPEATS = ["never", "daily", "weekly", "biweekly", "monthly", "yearly"]
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=Path(__file__).parent, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def timed(operation: Callable[[], object], repeat: int) -> Dict[str, float]:
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        operation()
+        durations.append(time.perf_counter() - started)
+    return {"min_s": min(durations), "median_s": statistics.median(durations)}
+
+def generate_tasks(size: int, due: int) -> Dict[str, Dict]:
+    now = datetime.now()
+    tasks = {}
+    for i in range(size):
+        offset = timedelta(minutes=-1 - i) if i < due else timedelta(minutes=random.randint(60, 525600))
+        tasks[f"task_{i}"] = {
+            "instructions": f"Synthetic task number {i} with a short instruction text",
+            "datetime": (now + offset).strftime("%Y-%m-%d %H:%M:%S"),
+            "repeat": random.choice(REPEATS) if i >= due else TaskRepeat.NEVER.value,
+            "agent": "assistant"
+        }
+    return tasks
+
+def generate_memories(size: int) -> Dict[str, str]:
+    return {f"memory_{i}": f"Synthetic memory {i}: the user likes item {random.randint(0, size)}" for i in range(size)}
+
+def generate_history(size: int) -> List[Dict]:
+    history = []
+    for i in range(size):
+        kind = i % 4
+        if kind == 0:
+            history.append({"role": "user", "content": f"Message {i} from the user"})
+        elif kind == 1:
+            history.append({"type": "function_call", "id": f"fc_{i}", "call_id": f"call_{i}",
+                            "name": "calendar", "arguments": "{\"mode\": \"r\", \"range_val\": 10}"})
+        elif kind == 2:
+            history.append({"type": "function_call_output", "call_id": f"call_{i - 1}", "output": "Event: x | " * 40})
+        else:
+            history.append({"role": "assistant", "content": f"Reply {i} from the assistant"})
+    return history
+
+def bench_tasks(size: int, repeat: int, due: int) -> List[Dict]:
+    Path("data").mkdir(exist_ok=True)
+    data = generate_tasks(size, due)
+    Path("data/tasks.json").write_text(json.dumps(data), encoding="utf-8")
+    ids = random.sample(list(data), min(1000, size))
+
+    tasks = Tasks()
+    results = {
+        "load": timed(Tasks, repeat),
+        "save": timed(tasks._save_tasks, repeat),
+        "lookup_1000": timed(lambda: [tasks._read_task(task_id) for task_id in ids], repeat),
+        "list_page": timed(lambda: tasks._query_tasks(None, None, None), repeat),
+        "list_day": timed(lambda: tasks._query_tasks(*[(datetime.now() + timedelta(days=30)).strftime("%Y-%m-%d")] * 2, None), repeat),
+    }
+    # The due scan advances and persists due tasks, so it runs once on fresh data
+    results["due_scan"] = timed(tasks.get_due_tasks, 1)
+    return [{"suite": "tasks", "operation": name, **timing} for name, timing in results.items()]
+
+def bench_memories(size: int, repeat: int) -> List[Dict]:
+    Path("data/assistant").mkdir(parents=True, exist_ok=True)
+    Path("data/assistant/memories.json").write_text(json.dumps(generate_memories(size)), encoding="utf-8")
+
+    memory = Memory()
+    results = {
+        "load": timed(Memory, repeat),
+        "write_one": timed(lambda: memory.process(MemoryMode.WRITE, "bench", "benchmark memory"), repeat),
+        "delete_one": timed(lambda: (memory.process(MemoryMode.WRITE, "bench", "x"),
+                                     memory.process(MemoryMode.DELETE, "bench")), repeat),
+        "list_all": timed(memory.get_all_memories, repeat),
+    }
+    return [{"suite": "memories", "operation": name, **timing} for name, timing in results.items()]
+
+def bench_history(size: int, repeat: int) -> List[Dict]:
+    Path("data/assistant").mkdir(parents=True, exist_ok=True)
+    history_file = Path("data/assistant/conversation_history.json")
+    history_file.write_text(json.dumps(generate_history(size)), encoding="utf-8")
+
+    # Only the persistence methods are exercised, so skip the full constructor
+    assistant = Assistant.__new__(Assistant)
+    assistant.state = None
+    assistant.history_file = history_file
+    assistant.messages = assistant._load_conversation_history()
+    results = {
+        "load": timed(assistant._load_conversation_history, repeat),
+        "save": timed(assistant._save_conversation_history, repeat),
+        "window": timed(assistant._get_conversation_messages, repeat),
+    }
+    return [{"suite": "history", "operation": name, **timing} for name, timing in results.items()]
+
+def compare(results: List[Dict], baseline: List[Dict]) -> None:
+    key = lambda record: (record["suite"], record["operation"], record["size"], record["backend"])
+    before = {key(record): record for record in baseline}
+    for record in results:
+        previous = before.get(key(record))
+        if previous:
+            change = (record["median_s"] - previous["median_s"]) / previous["median_s"] if previous["median_s"] else 0
+            print(f"{record['suite']}.{record['operation']}[{record['size']}]: "
+                  f"{previous['median_s'] * 1000:.2f}ms -> {record['median_s'] * 1000:.2f}ms ({change:+.1%})")
+
+def main():
+    parser = argparse.ArgumentParser(description="Storage micro-benchmarks")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--suites", nargs="+", choices=["tasks", "memories", "history"],
+                        default=["tasks", "memories", "history"])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--due", type=int, default=10, help="Tasks due during the due scan")
+    parser.add_argument("--output", help="Write results as JSON")
+    parser.add_argument("--baseline", help="Compare against an earlier --output file")
+    args = parser.parse_args()
+
+    random.seed(0)
+    cwd = os.getcwd()
+    meta = {"backend": "json", "commit": git_commit(), "python": platform.python_version()}
+    results = []
+    with tempfile.TemporaryDirectory(prefix="pi-storage-") as workdir:
+        os.chdir(workdir)
+        try:
+            for size in args.sizes:
+                for suite in args.suites:
+                    if suite == "tasks":
+                        records = bench_tasks(size, args.repeat, args.due)
+                    elif suite == "memories":
+                        records = bench_memories(size, args.repeat)
+                    else:
+                        records = bench_history(size, args.repeat)
+                    for record in records:
+                        record.update(meta, size=size)
+                        print(json.dumps(record))
+                    results.extend(records)
+        finally:
+            os.chdir(cwd)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            compare(results, json.load(f))
+
+if __name__ == "__main__":
+    main()
@@ -22,11 +22,101 @@ How you want the assistant to respond to you
 # Time
 TIME_ZONE = "UTC" # e.g. CET, EST, etc.
 
+# Calendar
+CALENDAR_IDS = ["primary"] # Google calendars to read and check for free/busy, new events go to the first
+CALENDAR_MAX_RESULTS = 50 # Most events returned per read
+CALENDAR_MAX_PAGES = 5 # Result pages followed per calendar and read
+
+# Tasks
+TASK_CATCH_UP = "run-once" # Runs of repeating tasks missed while the assistant was down: "skip", "run-once" or "run-all"
+TASK_CATCH_UP_GRACE = 300 # Seconds a run may be late and still count as on time
+TASK_CATCH_UP_MAX = 10 # Most missed runs of one task replayed with "run-all"
+TASK_PAGE_SIZE = 20 # Most tasks listed per read, the rest are paged with offset
+
 # Models
 ASSISTANT_MODEL = "gpt-4.1" # Must be an OpenAI model
+FAST_MODEL = "gpt-4.1-mini" # Used for short turns that look like they need no tools, None to always use ASSISTANT_MODEL
+ROUTING_SIMPLE_MAX_CHARS = 160 # Longer messages always go to ASSISTANT_MODEL
+
+# Model call resilience
+MODEL_TIMEOUT = 60 # Seconds per attempt before it is abandoned and retried
+MODEL_RETRIES = 2 # Retries for timeouts, connection errors, 429 and 5xx
+MODEL_BACKOFF = 0.5 # Base of the exponential backoff in seconds, with full jitter
+MODEL_BACKOFF_MAX = 8
+MODEL_HEDGE = False # Send a second identical request when the first is slower than the recent p95
+MODEL_HEDGE_QUANTILE = 0.95
+MODEL_HEDGE_MIN_SAMPLES = 20 # Calls observed before hedging starts
+MODEL_CIRCUIT_FAILURES = 5 # Consecutive failures before requests are stopped
+MODEL_CIRCUIT_RESET = 30 # Seconds before a single probe request is let through
+
+# Images
+IMAGE_MAX_SIDE = 1024 # Photos are downscaled so their longest side is at most this many pixels
+IMAGE_JPEG_QUALITY = 85
+IMAGE_HISTORY_ATTACH = 2 # How many of the most recent images stay attached in follow-up turns
+
+# Observability
+TRACE_EXPORT = True # Append finished traces to data/traces/traces.jsonl
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = 9464 # Serves Prometheus metrics at /metrics, None to disable
+
+# Logging
+LOG_LEVEL = "INFO" # DEBUG also logs tool results and model replies
+LOG_FORMAT = "text" # Console output, "text" or "json". The log file is always JSON lines
+LOG_FILE = "data/logs/assistant.log" # None to log to the console only
+LOG_MAX_BYTES = 10 * 1024 * 1024 # Rotate the log file at this size
+LOG_BACKUP_COUNT = 5
+LOG_FIELD_LIMIT = 1000 # Longer strings in log fields are truncated
+
+# Profiling
+PROFILE_TURNS = int(os.getenv("PROFILE_TURNS", "0")) # Profile this many turns after startup; the admin can also send /profile N
+PROFILE_SAMPLE_INTERVAL = 0.005 # Seconds between CPU stack samples while profiling
+PROFILE_MEMORY = True # Also record allocation sites with tracemalloc (slows profiled turns down noticeably)
+
+# Tool result cache
+TOOL_CACHE_SIZE = 256 # Most recently used read results kept in memory
+TOOL_CACHE_TTL = { # Seconds a read result is reused, 0 to disable caching for a tool
+    "calendar": 60,
+    "tasks": 300,
+    "notion": 120,
+    "url": 900,
+}
+
+# Prefetch
+PREFETCH_ENABLED = True # Fetch calendar, next tasks and matching memories alongside the first model call of a turn
+PREFETCH_CALENDAR_RANGE = 10 # Days of upcoming events
+PREFETCH_TASKS = 5
+PREFETCH_MEMORIES = 5
+PREFETCH_MAX_CHARS = 2000 # Per section
+
+# Memory deduplication
+MEMORY_DEDUP = "confirm" # New memories close to an existing one: "confirm" asks the model first, "merge" adds it to the existing one, "off"
+MEMORY_DUPLICATE_THRESHOLD = 0.6 # Similarity (0-1) from which a new memory counts as a near-duplicate
+MEMORY_COMPACT_THRESHOLD = 0.85 # Background compaction merges without asking, so only clear duplicates
+MEMORY_COMPACT_INTERVAL = 600 # Seconds between compaction passes
+MEMORY_COMPACT_BATCH = 500 # Memories checked per pass
+
+# Large tool outputs
+BLOB_THRESHOLD = 2000 # Tool outputs longer than this many characters are kept in data/blobs instead of the history
+BLOB_PREVIEW_CHARS = 300 # Characters of a stored output kept in the history as a preview
+BLOB_READ_CHARS = 10000 # Characters returned per blob tool call
 
 # Notion
 NOTION_API_TOKEN = os.getenv("NOTION_API_TOKEN") # Get this from https://www.notion.so/profile/integrations
 NOTION_DATABASES = {
     "database-name": "database_id",
 }
+
+# Telegram
+TELEGRAM_UPDATE_MODE = "polling" # "polling" or "webhook"
+TELEGRAM_COALESCE_WINDOW = 1.5 # Seconds to wait for follow-up messages before answering, 0 to disable
+TELEGRAM_WEBHOOK_HOST = "127.0.0.1" # Local address the webhook server listens on
+TELEGRAM_WEBHOOK_PORT = 8443
+TELEGRAM_WEBHOOK_PATH = "/telegram"
+TELEGRAM_WEBHOOK_URL = os.getenv("TELEGRAM_WEBHOOK_URL") # Public HTTPS URL Telegram pushes to, leave unset for local testing
+TELEGRAM_WEBHOOK_SECRET = os.getenv("TELEGRAM_WEBHOOK_SECRET") # Checked against the X-Telegram-Bot-Api-Secret-Token header
+
+# Deployment
+WORKERS = 1 # Processes to run, for failover only: turns on the one shared conversation still run one at a time. Above 1 they share state in STATE_DB and an elected leader receives updates and runs due tasks
+STATE_DB = "data/state.db"
+LEADER_LEASE = 15 # Seconds before a leader that stopped renewing is replaced
+INBOX_POLL_INTERVAL = 0.2 # Seconds an idle worker waits between inbox checks
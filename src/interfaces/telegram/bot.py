@@ -1,22 +1,62 @@
 import os
-from config import ASSISTANT_NAME
-from telegram import Update
+import asyncio
+import hmac
+import json
+from settings import (ASSISTANT_NAME, TELEGRAM_UPDATE_MODE, TELEGRAM_COALESCE_WINDOW, TELEGRAM_WEBHOOK_HOST,
+                      TELEGRAM_WEBHOOK_PORT, TELEGRAM_WEBHOOK_PATH, TELEGRAM_WEBHOOK_URL, TELEGRAM_WEBHOOK_SECRET,
+                      WORKERS, INBOX_POLL_INTERVAL)
+from telegram import PhotoSize, Update
 from telegram.ext import Application, CommandHandler, MessageHandler, ContextTypes, filters
-from typing import Optional, Set
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Union
 from assistant.main import Assistant
+from assistant.state import SharedState
 from interfaces.telegram.chatid import USER_CHAT_ID
+from interfaces.telegram.sender import MessageSender
+from interfaces.telegram.status import ToolStatus
+from utils.http import HttpServer, HttpRequest, HttpResponse
+from utils.log import get_logger, log_context
+from utils.profiling import profiler
+from utils.tracing import Span, tracer
+
+log = get_logger(__name__)
+
+class PendingTurn:
+    """Messages from one chat waiting to be answered together."""
+    
+    def __init__(self):
+        self.texts: List[str] = []
+        self.images: List[str] = []
+        self.timer: Optional[asyncio.Task] = None
+    
+    def to_message(self) -> Union[str, Dict]:
+        text = "\n".join(self.texts)
+        if self.images:
+            return {"images": self.images, "text": text or None}
+        return text
 
 class TelegramBot:
-    def __init__(self, assistant: Assistant):
+    """Telegram front end.
+
+    With a SharedState, the worker holding leadership runs ingress (polling or
+    the webhook) and puts each message in the inbox shard of its chat; every
+    worker answers the chats of its own shard from there.
+    """
+    
+    def __init__(self, assistant: Assistant, state: Optional[SharedState] = None):
         self.assistant = assistant
+        self.state = state
         self.token = os.getenv('TELEGRAM_TOKEN')
         if not self.token:
             raise ValueError("TELEGRAM_TOKEN not found in environment variables")
         
         self.app = Application.builder().token(self.token).build()
-        self.current_update: Optional[Update] = None
+        self.bot = self.app.bot
         self.chat_ids: Set[int] = {USER_CHAT_ID} if USER_CHAT_ID else set()
-        
+        self.webhook_server: Optional[HttpServer] = None
+        self.sender = MessageSender(self.bot)
+        self.pending: Dict[int, PendingTurn] = {}
+        self.turns: Set[asyncio.Task] = set()
+
     async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         if update.message.chat_id not in self.chat_ids:
             self.chat_ids.add(update.message.chat_id)
@@ -33,23 +73,34 @@ class TelegramBot:
             f"3. Restart the assistant"
         )
     
-    async def send_tool_notification(self, tool_name: str):
-        """Send a tool usage notification to users"""
-        tool_emojis = {
-            "memory": "🧠",
-            "tasks": "📝",
-            "calendar": "📅",
-            "url": "🔗",
-            "analysis": "💻",
-            "notion": "📚"
-        }
-        emoji = tool_emojis.get(tool_name, "🛠️")
-        message = f"{emoji} Using {tool_name.capitalize()}"
-        
-        if self.current_update:
-            await self.current_update.message.reply_text(message)
+    async def stats_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Admin command to show token usage and cost"""
+        if not USER_CHAT_ID or update.message.chat_id != USER_CHAT_ID:
+            await update.message.reply_text("Usage stats are only available to the admin chat.")
+            return
+        summary = await asyncio.to_thread(self.assistant.usage.summary)
+        await self.sender.send(update.message.chat_id, summary)
+    
+    async def profile_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Admin command to profile the next N turns, e.g. /profile 3, /profile 3 cpu (CPU only), /profile 0"""
+        if not USER_CHAT_ID or update.message.chat_id != USER_CHAT_ID:
+            await update.message.reply_text("Profiling is only available to the admin chat.")
+            return
+        try:
+            turns = int(context.args[0]) if context.args else 1
+        except ValueError:
+            await update.message.reply_text("Usage: /profile [number of turns] [cpu]")
+            return
+        memory = "cpu" not in context.args[1:]
+        profiler.arm(turns, memory=memory)
+        if turns > 0:
+            await update.message.reply_text(f"Profiling the next {turns} turn(s), results go to data/profiles/")
         else:
-            await self.broadcast_message(message)
+            await update.message.reply_text("Profiling disabled")
+    
+    def tool_status(self, chat_ids: Iterable[int], loop: Optional[asyncio.AbstractEventLoop] = None) -> ToolStatus:
+        """Create the status message tracker for one turn"""
+        return ToolStatus(self.bot, chat_ids, loop or asyncio.get_running_loop())
     
     async def broadcast_message(self, message: str):
         """Send a message to all known users"""
@@ -57,77 +108,223 @@ class TelegramBot:
             self.chat_ids.add(USER_CHAT_ID)
             
         if not self.chat_ids:
-            print("Warning: No chat IDs available to send message to")
+            log.warning("No chat IDs available to send message to")
             return
             
-        for chat_id in self.chat_ids:
-            if chat_id is None:
-                continue
-            try:
-                await self.app.bot.send_message(chat_id=chat_id, text=message)
-            except Exception as e:
-                print(f"Error sending message to chat {chat_id}: {e}")
+        await self.sender.broadcast(self.chat_ids, message)
+        
+    async def cache_photo(self, sizes: Sequence[PhotoSize], context: ContextTypes.DEFAULT_TYPE) -> str:
+        """Download a photo once, downscaled, and return its cache id"""
+        images = self.assistant.images
+        # Telegram offers several sizes; the smallest one covering the target resolution is enough
+        photo = next((size for size in sizes if max(size.width, size.height) >= images.max_side), sizes[-1])
+        
+        if not images.has(photo.file_unique_id):
+            with tracer.span("telegram_api", method="get_file"):
+                file = await context.bot.get_file(photo.file_id)
+            with tracer.span("telegram_api", method="download_file"):
+                data = await file.download_as_bytearray()
+            await asyncio.to_thread(images.store, photo.file_unique_id, bytes(data))
         
+        return photo.file_unique_id
+    
     async def handle_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        if update.message.chat_id not in self.chat_ids:
-            self.chat_ids.add(update.message.chat_id)
-            
-        self.current_update = update
+        """Take in a message, through the inbox of the worker owning the chat when there are several"""
+        chat_id = update.message.chat_id
+        if chat_id not in self.chat_ids:
+            self.chat_ids.add(chat_id)
         
+        payload = {}
         try:
             if update.message.photo:
-                photo = update.message.photo[-1]
-                file = await context.bot.get_file(photo.file_id)
-                file_url = file.file_path
-                
-                message = {
-                    "image_url": file_url,
-                    "text": update.message.caption if update.message.caption else None
-                }
-                
-                response = self.assistant.chat(message, self.send_tool_notification)
-            else:
-                message_text = update.message.text
-                response = self.assistant.chat(message_text, self.send_tool_notification)
-                
-            await update.message.reply_text(response)
+                payload = {"image": await self.cache_photo(update.message.photo, context),
+                           "text": update.message.caption}
+            elif update.message.text:
+                payload = {"text": update.message.text}
         except Exception as e:
-            error_message = f"Sorry, an error occurred: {str(e)}"
-            await update.message.reply_text(error_message)
-            print(f"Error handling message: {e}")
+            log.exception("Error handling message")
+            await update.message.reply_text(f"Sorry, an error occurred: {str(e)}")
+        if not payload:
+            return
+        
+        if self.state:
+            await asyncio.to_thread(self.state.enqueue, chat_id % WORKERS, chat_id, payload)
+        else:
+            self.receive(chat_id, payload)
+    
+    def receive(self, chat_id: int, payload: Dict):
+        """Queue a message, answering once no follow-up arrived within the coalesce window"""
+        self.chat_ids.add(chat_id)
+        if chat_id not in self.pending:
+            # Overlap context reads with the coalesce window
+            self.assistant.prefetch()
+        pending = self.pending.setdefault(chat_id, PendingTurn())
+        if pending.timer:
+            pending.timer.cancel()
+        
+        if payload.get("image"):
+            pending.images.append(payload["image"])
+        if payload.get("text"):
+            pending.texts.append(payload["text"])
+        pending.timer = asyncio.create_task(self._start_turn_later(chat_id, pending))
+    
+    async def consume_inbox(self, shard: int):
+        """Answer the messages queued for this worker's shard of chats"""
+        while True:
+            try:
+                messages = await asyncio.to_thread(self.state.claim, shard)
+            except Exception:
+                log.exception("Error reading the inbox")
+                messages = []
+            for chat_id, payload in messages:
+                self.receive(chat_id, payload)
+            if not messages:
+                await asyncio.sleep(INBOX_POLL_INTERVAL)
+    
+    async def _start_turn_later(self, chat_id: int, pending: PendingTurn):
+        await asyncio.sleep(TELEGRAM_COALESCE_WINDOW)
+        if self.pending.get(chat_id) is not pending:
+            return
+        del self.pending[chat_id]
+        
+        turn = asyncio.create_task(self.run_turn(chat_id, pending.to_message()))
+        self.turns.add(turn)
+        turn.add_done_callback(self.turns.discard)
+    
+    async def run_turn(self, chat_id: int, message: Union[str, Dict]):
+        """Answer one (possibly merged) user turn"""
+        status = self.tool_status([chat_id])
+        with tracer.span("turn", chat_id=chat_id), log_context(chat_id=chat_id):
+            try:
+                response = await asyncio.to_thread(self.assistant.chat, message, status.notify, f"chat:{chat_id}")
+                await status.finalize()
+                await self.sender.send(chat_id, response)
+            except Exception as e:
+                await status.finalize()
+                await self.sender.send(chat_id, f"Sorry, an error occurred: {str(e)}")
+                log.exception("Error handling message")
+    
+    async def process_due_tasks(self):
+        """Run due tasks in a worker thread and broadcast their results"""
+        loop = asyncio.get_running_loop()
+        status = self.tool_status(self.chat_ids)
+        
+        def tool_callback(tool_name: str):
+            status.notify(tool_name)
+        
+        def message_callback(response: str):
+            nonlocal status
+            finished, status = status, self.tool_status(self.chat_ids, loop)
+            delivery = self._deliver_task_response(finished, response, tracer.current_span())
+            asyncio.run_coroutine_threadsafe(delivery, loop).result()
+        
+        try:
+            await asyncio.to_thread(self.assistant.process_due_tasks,
+                                    message_callback=message_callback, tool_callback=tool_callback)
         finally:
-            self.current_update = None
+            await status.finalize()
+    
+    async def _deliver_task_response(self, status: ToolStatus, response: str, span: Optional[Span]):
+        with tracer.attach(span):
+            await status.finalize()
+            await self.broadcast_message(response)
         
     async def error(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        print(f'Update {update} caused error {context.error}')
+        log.error("Update caused error: %s", context.error, exc_info=context.error)
         if update:
             await update.message.reply_text("Sorry, an error occurred while processing your message.")
     
     async def setup(self):
         """Set up the bot handlers"""
-        print('Setting up bot handlers...')
+        log.info("Setting up bot handlers")
         self.app.add_handler(CommandHandler('start', self.start_command))
         self.app.add_handler(CommandHandler('chatid', self.chatid_command))
+        self.app.add_handler(CommandHandler('stats', self.stats_command))
+        self.app.add_handler(CommandHandler('profile', self.profile_command))
         self.app.add_handler(MessageHandler(filters.PHOTO | filters.TEXT, self.handle_message))
         self.app.add_error_handler(self.error)
         
+    async def handle_webhook(self, request: HttpRequest) -> HttpResponse:
+        """Receive an update pushed by Telegram and queue it for processing"""
+        secret = request.headers.get("x-telegram-bot-api-secret-token", "")
+        if not hmac.compare_digest(secret.encode(), TELEGRAM_WEBHOOK_SECRET.encode()):
+            return 403, "text/plain", b"forbidden"
+        
+        try:
+            update = Update.de_json(json.loads(request.body), self.app.bot)
+        except (ValueError, TypeError):
+            return 400, "text/plain", b"invalid update"
+        
+        await self.app.update_queue.put(update)
+        return 200, "text/plain", b"ok"
+    
+    async def start_webhook(self):
+        """Receive updates through a local webhook server instead of polling
+
+        This uses utils.http rather than PTB's Updater.start_webhook. PTB's
+        server needs the python-telegram-bot[webhooks] extra (tornado) next to
+        the server /metrics already runs on, and it always calls set_webhook,
+        with a URL made up from the listen address if none is given. Without
+        TELEGRAM_WEBHOOK_URL this server only listens locally, which is what
+        fake_sender drives, and registers nothing with Telegram.
+        """
+        if not TELEGRAM_WEBHOOK_SECRET:
+            raise ValueError("TELEGRAM_WEBHOOK_SECRET is required for webhook mode")
+        
+        self.webhook_server = HttpServer(TELEGRAM_WEBHOOK_HOST, TELEGRAM_WEBHOOK_PORT)
+        self.webhook_server.route("POST", TELEGRAM_WEBHOOK_PATH, self.handle_webhook)
+        await self.webhook_server.start()
+        
+        if TELEGRAM_WEBHOOK_URL:
+            await self.app.bot.set_webhook(url=TELEGRAM_WEBHOOK_URL, secret_token=TELEGRAM_WEBHOOK_SECRET)
+            log.info("Webhook registered at %s", TELEGRAM_WEBHOOK_URL)
+        else:
+            log.warning("TELEGRAM_WEBHOOK_URL not set, webhook only reachable locally")
+    
     async def start(self):
-        """Start the bot"""
-        print('Starting bot...')
+        """Start the bot; with shared state, ingress waits until this worker leads"""
+        log.info("Starting bot")
         await self.setup()
         await self.app.initialize()
         await self.app.start()
-        await self.app.updater.start_polling(poll_interval=3.0)
+        if not self.state:
+            await self.start_ingress()
+    
+    async def start_ingress(self):
+        """Start receiving updates, by webhook or polling"""
+        if TELEGRAM_UPDATE_MODE == "webhook":
+            try:
+                await self.start_webhook()
+                return
+            except Exception as e:
+                log.error("Error starting webhook, falling back to polling: %s", e)
+                if self.webhook_server:
+                    await self.webhook_server.stop()
+                    self.webhook_server = None
+        
+        await self.app.updater.start_polling(timeout=30)
+    
+    async def stop_ingress(self):
+        """Stop receiving updates, leaving the application running"""
+        if self.webhook_server:
+            log.info("Stopping webhook server")
+            await self.webhook_server.stop()
+            self.webhook_server = None
+        if self.app.updater and self.app.updater.running:
+            log.info("Stopping updater")
+            await self.app.updater.stop()
         
     async def stop(self):
         """Stop the bot gracefully"""
-        print('Stopping bot...')
+        log.info("Stopping bot")
+        for pending in self.pending.values():
+            if pending.timer:
+                pending.timer.cancel()
+        self.pending.clear()
         try:
-            if self.app.updater:
-                print('Stopping updater...')
-                await self.app.updater.stop()
-            print('Stopping application...')
+            await self.stop_ingress()
+            log.info("Stopping application")
             await self.app.stop()
             await self.app.shutdown()
         except Exception as e:
-            print(f"Error during bot shutdown: {e}")
+            log.error("Error during bot shutdown: %s", e)
@@ -0,0 +1,75 @@
+"""Push synthetic Telegram updates to the local webhook.
+
+Usage (from src/):
+    python -m interfaces.telegram.fake_sender --secret <secret> --count 100
+"""
+import argparse
+import itertools
+import statistics
+import time
+from typing import Dict, List, Optional
+
+import requests
+
+class FakeTelegramSender:
+    """Acts like Telegram's servers pushing updates to the bot's webhook."""
+
+    def __init__(self, url: str, secret: Optional[str], chat_id: int = 1, user_id: int = 1):
+        self.url = url
+        self.chat_id = chat_id
+        self.user_id = user_id
+        self.session = requests.Session()
+        if secret:
+            self.session.headers["X-Telegram-Bot-Api-Secret-Token"] = secret
+        self.update_ids = itertools.count(1)
+        self.message_ids = itertools.count(1)
+
+    def build_update(self, text: str, chat_id: Optional[int] = None) -> Dict:
+        chat_id = chat_id if chat_id is not None else self.chat_id
+        return {
+            "update_id": next(self.update_ids),
+            "message": {
+                "message_id": next(self.message_ids),
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "from": {"id": self.user_id, "is_bot": False, "first_name": "Test"},
+                "text": text
+            }
+        }
+
+    def send_update(self, update: Dict) -> float:
+        """POST an update and return the time until the webhook acknowledged it."""
+        started = time.perf_counter()
+        response = self.session.post(self.url, json=update, timeout=10)
+        response.raise_for_status()
+        return time.perf_counter() - started
+
+    def send_text(self, text: str, chat_id: Optional[int] = None) -> float:
+        return self.send_update(self.build_update(text, chat_id))
+
+def summarize(latencies: List[float]) -> Dict[str, float]:
+    ordered = sorted(latencies)
+    return {
+        "count": len(ordered),
+        "p50_ms": ordered[len(ordered) // 2] * 1000,
+        "p95_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000,
+        "max_ms": ordered[-1] * 1000,
+        "mean_ms": statistics.fmean(ordered) * 1000,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Send fake Telegram updates to the local webhook")
+    parser.add_argument("--url", default="http://127.0.0.1:8443/telegram")
+    parser.add_argument("--secret", default=None)
+    parser.add_argument("--chat-id", type=int, default=1)
+    parser.add_argument("--count", type=int, default=20)
+    parser.add_argument("--text", default="ping")
+    args = parser.parse_args()
+
+    sender = FakeTelegramSender(args.url, args.secret, chat_id=args.chat_id)
+    latencies = [sender.send_text(f"{args.text} {i}") for i in range(args.count)]
+    for key, value in summarize(latencies).items():
+        print(f"{key}: {value:.2f}" if isinstance(value, float) else f"{key}: {value}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+import asyncio
+import time
+from datetime import timedelta
+from typing import Dict, Iterable, List
+
+from telegram import Bot
+from telegram.error import RetryAfter
+from utils.log import get_logger
+from utils.tracing import tracer
+
+log = get_logger(__name__)
+
+MAX_MESSAGE_LENGTH = 4096  # in UTF-16 code units
+GLOBAL_RATE = 30  # messages per second across all chats
+CHAT_RATE = 1  # messages per second to a single chat
+CHAT_BURST = 3
+MAX_RETRIES = 3
+
+class TokenBucket:
+    """Async token bucket; acquire() waits until a token is available."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self) -> None:
+        while True:
+            now = time.monotonic()
+            if now < self.blocked_until:
+                await asyncio.sleep(self.blocked_until - now)
+                continue
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def block(self, seconds: float) -> None:
+        """Hold back all acquires for the given time, e.g. after a RetryAfter."""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+        self.tokens = 0
+
+def utf16_length(text: str) -> int:
+    """Length as Telegram counts it, in UTF-16 code units; emoji and other astral characters take two."""
+    return len(text.encode("utf-16-le")) // 2
+
+def _fitting_prefix(text: str, limit: int) -> int:
+    """How many characters of text fit in limit UTF-16 code units."""
+    units = 0
+    for index, char in enumerate(text):
+        units += 2 if ord(char) > 0xFFFF else 1
+        if units > limit:
+            return index
+    return len(text)
+
+def split_message(text: str, limit: int = MAX_MESSAGE_LENGTH) -> List[str]:
+    """Split text into chunks Telegram accepts, preferring line and word breaks."""
+    chunks = []
+    while utf16_length(text) > limit:
+        end = _fitting_prefix(text, limit)
+        cut = text.rfind("\n", 0, end)
+        if cut <= 0:
+            cut = text.rfind(" ", 0, end)
+        if cut <= 0:
+            cut = end
+        chunks.append(text[:cut])
+        # Drop only the break itself, so indentation on the next line (e.g. in code) survives
+        text = text[cut + 1:] if text[cut] in "\n " else text[cut:]
+    if text or not chunks:
+        chunks.append(text)
+    return chunks
+
+class MessageSender:
+    """Rate-limited message delivery respecting Telegram's flood limits.
+
+    Messages to the same chat are sent in order; different chats are served
+    concurrently, limited by a global and a per-chat token bucket.
+    """
+
+    def __init__(self, bot: Bot):
+        self.bot = bot
+        self.global_bucket = TokenBucket(GLOBAL_RATE, GLOBAL_RATE)
+        self.chat_buckets: Dict[int, TokenBucket] = {}
+        self.chat_locks: Dict[int, asyncio.Lock] = {}
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        if chat_id not in self.chat_buckets:
+            self.chat_buckets[chat_id] = TokenBucket(CHAT_RATE, CHAT_BURST)
+        return self.chat_buckets[chat_id]
+
+    def _chat_lock(self, chat_id: int) -> asyncio.Lock:
+        if chat_id not in self.chat_locks:
+            self.chat_locks[chat_id] = asyncio.Lock()
+        return self.chat_locks[chat_id]
+
+    async def _send_chunk(self, chat_id: int, text: str) -> None:
+        chat_bucket = self._chat_bucket(chat_id)
+        for attempt in range(MAX_RETRIES + 1):
+            await chat_bucket.acquire()
+            await self.global_bucket.acquire()
+            try:
+                with tracer.span("telegram_api", method="send_message"):
+                    await self.bot.send_message(chat_id=chat_id, text=text)
+                return
+            except RetryAfter as e:
+                if attempt == MAX_RETRIES:
+                    raise
+                retry_after = e.retry_after
+                if isinstance(retry_after, timedelta):
+                    retry_after = retry_after.total_seconds()
+                log.warning("Flood limit hit for chat %s, retrying in %ss", chat_id, retry_after)
+                # The flood wait applies to the bot as a whole, so other chats have to hold off too
+                chat_bucket.block(retry_after)
+                self.global_bucket.block(retry_after)
+
+    async def send(self, chat_id: int, text: str) -> bool:
+        """Send a message to one chat, split into chunks if needed."""
+        async with self._chat_lock(chat_id):
+            try:
+                for chunk in split_message(text):
+                    await self._send_chunk(chat_id, chunk)
+                return True
+            except Exception as e:
+                log.error("Error sending message to chat %s: %s", chat_id, e)
+                return False
+
+    async def broadcast(self, chat_ids: Iterable[int], text: str) -> Dict[int, bool]:
+        """Send a message to several chats concurrently."""
+        chat_ids = [chat_id for chat_id in chat_ids if chat_id is not None]
+        results = await asyncio.gather(*(self.send(chat_id, text) for chat_id in chat_ids))
+        return dict(zip(chat_ids, results))
@@ -0,0 +1,93 @@
+import asyncio
+from typing import Dict, Iterable, List, Optional
+
+from telegram import Bot, Message
+from utils.log import get_logger
+from utils.tracing import tracer
+
+log = get_logger(__name__)
+
+TOOL_EMOJIS = {
+    "memory": "🧠",
+    "tasks": "📝",
+    "calendar": "📅",
+    "url": "🔗",
+    "analysis": "💻",
+    "notion": "📚",
+    "blob": "📦"
+}
+
+class ToolStatus:
+    """A single status message per turn listing the tools in use.
+
+    The message is sent when the first tool is used and edited in place when
+    a new tool shows up, at most once per debounce interval, so a turn costs
+    at most one send, one edit per distinct tool and one delete. notify() may
+    be called from any thread.
+    """
+
+    def __init__(self, bot: Bot, chat_ids: Iterable[int], loop: asyncio.AbstractEventLoop,
+                 debounce: float = 1.0):
+        self.bot = bot
+        self.chat_ids = [chat_id for chat_id in chat_ids if chat_id is not None]
+        self.loop = loop
+        self.debounce = debounce
+        self.tools: List[str] = []
+        self.messages: Dict[int, Message] = {}
+        self.rendered: Optional[str] = None
+        self.flush_task: Optional[asyncio.Task] = None
+        self.render_lock = asyncio.Lock()
+        self.closed = False
+
+    def notify(self, tool_name: str) -> None:
+        """Record that a tool is being used."""
+        self.loop.call_soon_threadsafe(self._add_tool, tool_name)
+
+    def _add_tool(self, tool_name: str) -> None:
+        if self.closed or tool_name in self.tools:
+            return
+        self.tools.append(tool_name)
+        if not self.flush_task or self.flush_task.done():
+            self.flush_task = self.loop.create_task(self._flush())
+
+    def _text(self) -> str:
+        return "Using " + " · ".join(f"{TOOL_EMOJIS.get(tool, '🛠️')} {tool.capitalize()}" for tool in self.tools)
+
+    async def _flush(self) -> None:
+        while not self.closed:
+            if self.messages:
+                await asyncio.sleep(self.debounce)
+            await asyncio.shield(self._render())
+            if self._text() == self.rendered:
+                return
+
+    async def _render(self) -> None:
+        async with self.render_lock:
+            text = self._text()
+            if self.closed or text == self.rendered:
+                return
+            self.rendered = text
+            for chat_id in self.chat_ids:
+                try:
+                    if chat_id in self.messages:
+                        with tracer.span("telegram_api", method="edit_message_text"):
+                            await self.messages[chat_id].edit_text(text)
+                    else:
+                        with tracer.span("telegram_api", method="send_message"):
+                            self.messages[chat_id] = await self.bot.send_message(chat_id=chat_id, text=text)
+                except Exception as e:
+                    log.warning("Error updating tool status in chat %s: %s", chat_id, e)
+
+    async def finalize(self) -> None:
+        """Remove the status message once the turn's reply is ready."""
+        if self.flush_task and not self.flush_task.done():
+            self.flush_task.cancel()
+        async with self.render_lock:
+            self.closed = True
+            for chat_id, message in self.messages.items():
+                try:
+                    with tracer.span("telegram_api", method="delete_message"):
+                        await message.delete()
+                except Exception as e:
+                    log.warning("Error removing tool status in chat %s: %s", chat_id, e)
+            self.messages.clear()
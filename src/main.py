@@ -1,41 +1,123 @@
 import sys
 import asyncio
+import multiprocessing
+import time
+from pathlib import Path
+from typing import List, Optional
 from dotenv import load_dotenv
+import settings
+from settings import METRICS_HOST, METRICS_PORT, MEMORY_COMPACT_INTERVAL, WORKERS, LEADER_LEASE, LOG_FILE
 from assistant.main import Assistant
+from assistant.state import SharedState
 from interfaces.telegram.bot import TelegramBot
+from utils.http import HttpServer, HttpRequest, HttpResponse
+from utils.log import get_logger, log_context, setup_logging, stop_logging
+from utils.tracing import tracer
+
+log = get_logger(__name__)
 
 async def check_tasks(assistant: Assistant, bot: TelegramBot):
     """Background task to check for due tasks periodically"""
     try:
         while True:
             try:
-                assistant.process_due_tasks(
-                    message_callback=bot.broadcast_message,
-                    tool_callback=bot.send_tool_notification
-                )
-            except Exception as e:
-                print(f"Error processing tasks: {e}")
+                await bot.process_due_tasks()
+            except Exception:
+                log.exception("Error processing tasks")
             await asyncio.sleep(60)
     except asyncio.CancelledError:
-        print("Task checker cancelled")
+        log.info("Task checker cancelled")
+
+async def compact_memories(assistant: Assistant):
+    """Background task to deduplicate memories a batch at a time"""
+    try:
+        while True:
+            try:
+                merged = await asyncio.to_thread(assistant.compact_memories)
+                if merged:
+                    log.info("Memory compaction merged %d duplicates", merged)
+            except Exception:
+                log.exception("Error compacting memories")
+            await asyncio.sleep(MEMORY_COMPACT_INTERVAL)
+    except asyncio.CancelledError:
+        log.info("Memory compaction cancelled")
+
+async def close_idle_analysis(assistant: Assistant):
+    """Background task to stop idle analysis sessions"""
+    try:
+        while True:
+            await asyncio.sleep(60)
+            try:
+                await asyncio.to_thread(assistant.close_idle_analysis)
+            except Exception:
+                log.exception("Error closing idle analysis sessions")
+    except asyncio.CancelledError:
+        log.info("Analysis reaper cancelled")
+
+async def stop_tasks(tasks: List[asyncio.Task]):
+    for task in tasks:
+        if not task.cancelled():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+async def lead(state: SharedState, assistant: Assistant, bot: TelegramBot):
+    """Background task keeping one worker, the holder of the leader lease, on ingress and the scheduler"""
+    jobs: List[asyncio.Task] = []
+    try:
+        while True:
+            try:
+                leading = await asyncio.to_thread(state.acquire, "leader", assistant.holder)
+            except Exception:
+                log.exception("Error renewing the leader lease")
+                leading = False
+            
+            if leading and not jobs:
+                try:
+                    await bot.start_ingress()
+                except Exception:
+                    # Without ingress this worker is no use as leader; free the lease so the next round,
+                    # here or in another worker, tries again
+                    log.exception("Error starting ingress, releasing the leader lease")
+                    await asyncio.to_thread(state.release, "leader", assistant.holder)
+                else:
+                    log.info("Leading: receiving updates and running due tasks")
+                    jobs = [asyncio.create_task(check_tasks(assistant, bot)),
+                            asyncio.create_task(compact_memories(assistant))]
+            elif not leading and jobs:
+                log.warning("Lost the leader lease, stopping ingress and due tasks")
+                await stop_tasks(jobs)
+                jobs = []
+                await bot.stop_ingress()
+            await asyncio.sleep(LEADER_LEASE / 3)
+    except asyncio.CancelledError:
+        log.info("Leader election cancelled")
+    finally:
+        await stop_tasks(jobs)
+        if jobs:
+            await asyncio.to_thread(state.release, "leader", assistant.holder)
 
-async def shutdown(bot, task_checker):
+async def metrics(request: HttpRequest) -> HttpResponse:
+    """Prometheus scrape endpoint"""
+    return 200, "text/plain; version=0.0.4", tracer.metrics_text().encode()
+
+async def shutdown(bot, background_tasks, metrics_server=None):
     """Cleanup tasks tied to the service's shutdown."""
-    print("Shutting down...")
-    
-    if not task_checker.cancelled():
-        task_checker.cancel()
-        try:
-            await task_checker
-        except asyncio.CancelledError:
-            pass
+    log.info("Shutting down")
     
+    await stop_tasks(background_tasks)
     await bot.stop()
+    await asyncio.to_thread(bot.assistant.close)
+    
+    if metrics_server:
+        await metrics_server.stop()
     
     remaining_tasks = [t for t in asyncio.all_tasks() 
                       if t is not asyncio.current_task() and not t.cancelled()]
     if remaining_tasks:
-        print(f"Cancelling {len(remaining_tasks)} remaining tasks")
+        log.info("Cancelling %d remaining tasks", len(remaining_tasks))
         for task in remaining_tasks:
             task.cancel()
         await asyncio.gather(*remaining_tasks, return_exceptions=True)
@@ -43,45 +125,111 @@ async def shutdown(bot, task_checker):
 def handle_exception(loop, context):
     """Handle exceptions in the event loop."""
     msg = context.get("exception", context["message"])
-    print(f"Error in async loop: {msg}")
+    log.error("Error in async loop: %s", msg)
 
-async def main():
+async def main(worker: Optional[int] = None):
+    """Run the assistant, as one of WORKERS processes sharing state when worker is set"""
     load_dotenv()
     
-    assistant = Assistant()
-    bot = TelegramBot(assistant)
+    state = SharedState() if worker is not None else None
+    assistant = Assistant(state=state)
+    bot = TelegramBot(assistant, state)
     
     loop = asyncio.get_running_loop()
     loop.set_exception_handler(handle_exception)
     
-    task_checker = asyncio.create_task(check_tasks(assistant, bot))
+    background_tasks: List[asyncio.Task] = []
+    metrics_server = None
+    if METRICS_PORT:
+        metrics_server = HttpServer(METRICS_HOST, METRICS_PORT + (worker or 0))
+        metrics_server.route("GET", "/metrics", metrics)
+        await metrics_server.start()
     
     try:
         await bot.start()
         
+        # Only now is the application initialized, which ingress and sending messages need
+        if state:
+            background_tasks += [asyncio.create_task(lead(state, assistant, bot)),
+                                 asyncio.create_task(bot.consume_inbox(worker))]
+        else:
+            background_tasks += [asyncio.create_task(check_tasks(assistant, bot)),
+                                 asyncio.create_task(compact_memories(assistant))]
+        # Analysis sessions belong to the process that started them
+        background_tasks.append(asyncio.create_task(close_idle_analysis(assistant)))
+        
         while True:
             await asyncio.sleep(1)
             
     except asyncio.CancelledError:
-        print("Main task cancelled")
+        log.info("Main task cancelled")
     except KeyboardInterrupt:
-        print("Received keyboard interrupt...")
+        log.info("Received keyboard interrupt")
+    finally:
+        await shutdown(bot, background_tasks, metrics_server)
+
+def run_worker(worker: int):
+    """Entry point of one worker process, logging to its own file"""
+    if sys.platform == "win32":
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+    
+    setup_logging(str(Path(LOG_FILE).with_suffix(f".worker{worker}.log")) if LOG_FILE else None)
+    try:
+        with log_context(worker=worker):
+            asyncio.run(main(worker))
+    except KeyboardInterrupt:
+        pass
+    except Exception:
+        log.exception("Fatal error in worker %d", worker)
+    finally:
+        stop_logging()
+
+def supervise():
+    """Start WORKERS processes and restart any that die"""
+    # Fresh interpreters rather than forks of a process already running logging and client threads
+    context = multiprocessing.get_context("spawn")
+    processes = {}
+    for worker in range(WORKERS):
+        processes[worker] = context.Process(target=run_worker, args=(worker,), name=f"worker-{worker}")
+        processes[worker].start()
+    log.info("Started %d workers", WORKERS)
+    
+    try:
+        while True:
+            time.sleep(1)
+            for worker, process in processes.items():
+                if not process.is_alive():
+                    log.error("Worker %d exited with code %s, restarting it", worker, process.exitcode)
+                    processes[worker] = context.Process(target=run_worker, args=(worker,), name=f"worker-{worker}")
+                    processes[worker].start()
     finally:
-        await shutdown(bot, task_checker)
+        # Ctrl+C reaches the workers too; give them time to shut down cleanly
+        for process in processes.values():
+            process.join(timeout=LEADER_LEASE)
+            if process.is_alive():
+                process.terminate()
 
 def run():
     """Run the application with proper setup and error handling"""
     if sys.platform == "win32":
         asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
     
+    setup_logging()
+    if settings.defaulted:
+        log.warning("config.py is missing %s, using the values from config-example.py; copy them over to change them",
+                    ", ".join(sorted(settings.defaulted)))
     try:
-        asyncio.run(main())
+        if WORKERS > 1:
+            supervise()
+        else:
+            asyncio.run(main())
     except KeyboardInterrupt:
-        print("Shutting down...")
-    except Exception as e:
-        print(f"Fatal error: {e}")
+        log.info("Shutting down")
+    except Exception:
+        log.exception("Fatal error")
     finally:
-        print("Cleanup complete, exiting...")
+        log.info("Cleanup complete, exiting")
+        stop_logging()
 
 if __name__ == "__main__":
     run()
@@ -1,4 +1,4 @@
-from config import NOTION_DATABASES, USER_CITY, USER_COUNTRY, USER_NAME, USER_REGION, USER_ROLE, USER_BIO, ASSISTANT_NAME, ASSISTANT_RESPONSE_STYLE, TIME_ZONE
+from settings import NOTION_DATABASES, USER_CITY, USER_COUNTRY, USER_NAME, USER_REGION, USER_ROLE, USER_BIO, ASSISTANT_NAME, ASSISTANT_RESPONSE_STYLE, TIME_ZONE, TASK_PAGE_SIZE, CALENDAR_MAX_RESULTS
 from utils.datetime import get_current_date, get_current_time
 
 system_prompt = f"""
@@ -14,7 +14,7 @@ You are {ASSISTANT_NAME}, the proactive and highly capable personal assistant fo
 
 ## Agentic Reminders
 - Persistence: You are an agent. Continue interactions until {USER_NAME}'s request is fully addressed. Only terminate your response once you're certain the user's query is fully resolved.
-- Tool-calling: Actively use your provided tools. Never guess or fabricate answers. When uncertain about content or user-related context, always use tools (memory, calendar, tasks, notion, web_search, url) to retrieve accurate information.
+- Tool-calling: Actively use your provided tools. Never guess or fabricate answers. When uncertain about content or user-related context, always use tools (memory, calendar, tasks, notion, web_search, url, analysis) to retrieve accurate information.
 - Planning: Explicitly plan your actions before executing tool calls. Reflect thoroughly on outcomes after each tool call. Avoid silent chains of tool calls—clearly articulate your thought process.
 
 # Tools Overview
@@ -22,16 +22,22 @@ You are {ASSISTANT_NAME}, the proactive and highly capable personal assistant fo
 ## Memory
 - Store/update: memory(mode='w', id='descriptive_id e.g "user_birthday"', content='relevant information')
 - Delete: memory(mode='d', id='descriptive_id')
+- If a write is refused as a near-duplicate, update the existing memory instead, or repeat the write with force=true only if it really is a different fact.
 
 ## Tasks
 - Write: tasks(mode='w', id='task_id e.g. "buy_groceries"', instructions='what to do', datetime='YYYY-MM-DD HH:MM:SS', repeat='optional frequency')
+- repeat is never, daily, weekly, biweekly, monthly, yearly or an RRULE, e.g. 'FREQ=WEEKLY;BYDAY=MO,WE,FR', 'FREQ=MONTHLY;BYMONTHDAY=-1', 'FREQ=DAILY;INTERVAL=2;UNTIL=20250630'
+- Task times are in the {TIME_ZONE} timezone.
 - Read: tasks(mode='r', id='task_id')
+- List by next run time: tasks(mode='r', id='', start='YYYY-MM-DD', end='YYYY-MM-DD', repeat='optional filter', limit={TASK_PAGE_SIZE}, offset=0). Leave start and end empty for the next tasks.
 - Delete: tasks(mode='d', id='task_id')
 
 ## Calendar
-- Read: calendar(mode='r', range_val=10 or -10 for past events)
+- Read: calendar(mode='r', range_val=10 days ahead or -10 for the past 10 days, limit={CALENDAR_MAX_RESULTS} most events)
+- Check availability: calendar(mode='f', start_time='', end_time='') returns busy and free periods across all calendars without event details; prefer it for "am I free" questions
 - Write/Update: calendar(mode='w', title='', start_time='', end_time='', description='', event_id='optional for updates')
 - Delete: calendar(mode='d', event_id='')
+- Events from a calendar other than the main one show their Calendar; pass it as calendar_id when updating or deleting them
 - All calendar operations are in the {TIME_ZONE} timezone.
 
 ## Web Search
@@ -40,6 +46,15 @@ You are {ASSISTANT_NAME}, the proactive and highly capable personal assistant fo
 ## URL Tool
 - Fetch URL content: url(url='https://example.com')
 
+## Analysis
+- Run Python in a sandbox without network access: analysis(code='print(1 + 1)')
+- Variables and imports persist between calls; pass reset=true to start from a fresh interpreter
+- Use it for calculations and data processing instead of working them out yourself
+- Files written to the working directory are returned as artifacts
+
+## Stored Outputs
+- Large tool outputs from earlier turns are kept as stubs with an id. Read one in full: blob(id='', offset=0)
+
 ## Notion
 Available databases: {", ".join(NOTION_DATABASES)}
 - List databases: notion(mode='list_databases')
@@ -113,6 +128,10 @@ tools = [
                         "content": {
                             "type": "string",
                             "description": "The content to store (only required for write mode)"
+                        },
+                        "force": {
+                            "type": "boolean",
+                            "description": "Save even if a similar memory already exists (only after a write was refused as a near-duplicate)"
                         }
                     },
                     "required": ["mode", "id"]
@@ -159,8 +178,23 @@ tools = [
                         },
                         "repeat": {
                             "type": "string",
-                            "enum": ["never", "daily", "weekly", "biweekly", "monthly", "yearly"],
-                            "description": "How often the task should repeat (optional, defaults to never)"
+                            "description": "How often the task should repeat (optional, defaults to never): never, daily, weekly, biweekly, monthly, yearly, or an RRULE using FREQ, INTERVAL, BYDAY, BYMONTHDAY and UNTIL. When listing, only tasks with this repeat ('repeating' for any)"
+                        },
+                        "start": {
+                            "type": "string",
+                            "description": "When listing (read mode without id), only tasks whose next run is at or after this time, YYYY-MM-DD or YYYY-MM-DD HH:MM:SS"
+                        },
+                        "end": {
+                            "type": "string",
+                            "description": "When listing, only tasks whose next run is at or before this time; a bare date includes the whole day"
+                        },
+                        "limit": {
+                            "type": "integer",
+                            "description": f"When listing, the most tasks to return (default and maximum {TASK_PAGE_SIZE})"
+                        },
+                        "offset": {
+                            "type": "integer",
+                            "description": "When listing, how many matching tasks to skip, for the next page"
                         }
                     },
                     "required": ["mode", "id"]
@@ -169,18 +203,22 @@ tools = [
             {
                 "type": "function",
                 "name": "calendar",
-                "description": "Interact with the user's Google Calendar to read, write, or delete events",
+                "description": "Interact with the user's Google Calendar to read events, check free/busy times, or write and delete events",
                 "parameters": {
                     "type": "object",
                     "properties": {
                         "mode": {
                             "type": "string",
-                            "enum": ["r", "w", "d"],
-                            "description": "The mode of operation - 'r' for read, 'w' for write, 'd' for delete"
+                            "enum": ["r", "f", "w", "d"],
+                            "description": "The mode of operation - 'r' for read, 'f' for free/busy, 'w' for write, 'd' for delete"
                         },
                         "range_val": {
                             "type": "integer",
-                            "description": "For read mode: number of events to show (positive for future, negative for past, default 10)"
+                            "description": "For read and free/busy mode: number of days to cover from now (positive for future, negative for past, default 10)"
+                        },
+                        "limit": {
+                            "type": "integer",
+                            "description": f"For read mode: the most events to return (default and maximum {CALENDAR_MAX_RESULTS})"
                         },
                         "event_id": {
                             "type": "string",
@@ -196,11 +234,15 @@ tools = [
                         },
                         "start_time": {
                             "type": "string",
-                            "description": "Start time of the event in YYYY-MM-DD HH:MM:SS format (required for write mode)"
+                            "description": "Start time of the event in YYYY-MM-DD HH:MM:SS format (required for write mode, start of the period for free/busy mode)"
                         },
                         "end_time": {
                             "type": "string",
-                            "description": "End time of the event in YYYY-MM-DD HH:MM:SS format (required for write mode)"
+                            "description": "End time of the event in YYYY-MM-DD HH:MM:SS format (required for write mode, end of the period for free/busy mode)"
+                        },
+                        "calendar_id": {
+                            "type": "string",
+                            "description": "The calendar of the event to update or delete, as shown in read results (defaults to the main calendar)"
                         }
                     },
                     "required": ["mode"]
@@ -231,5 +273,43 @@ tools = [
                     },
                     "required": ["mode"] 
                 }
+            },
+            {
+                "type": "function",
+                "name": "analysis",
+                "description": "Execute Python code in a sandboxed interpreter that keeps its state between calls",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "code": {
+                            "type": "string",
+                            "description": "The Python code to run; print what you need to see"
+                        },
+                        "reset": {
+                            "type": "boolean",
+                            "description": "Discard earlier variables and start from a fresh interpreter"
+                        }
+                    },
+                    "required": ["code"]
+                }
+            },
+            {
+                "type": "function",
+                "name": "blob",
+                "description": "Read a large tool output from an earlier turn that was stored by id",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "id": {
+                            "type": "string",
+                            "description": "The id shown in the stored output stub"
+                        },
+                        "offset": {
+                            "type": "integer",
+                            "description": "Character offset to continue reading from"
+                        }
+                    },
+                    "required": ["id"]
+                }
             }
         ]
\ No newline at end of file
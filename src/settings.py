@@ -0,0 +1,25 @@
+"""Settings from config.py, with config-example.py supplying any that are missing.
+
+config.py is a copy of config-example.py made during setup, so settings added
+since then are not in it. Rather than failing with an ImportError at startup,
+those take their values from config-example.py; main logs which ones once
+logging is set up. Modules import settings from here, e.g.
+from settings import TIME_ZONE.
+"""
+import runpy
+from pathlib import Path
+from typing import Any, Set
+
+import config
+
+example = runpy.run_path(str(Path(__file__).with_name("config-example.py")))
+# Settings that came from config-example.py because config.py lacks them
+defaulted: Set[str] = set()
+
+def __getattr__(name: str) -> Any:
+    if hasattr(config, name):
+        return getattr(config, name)
+    if name.isupper() and name in example:
+        defaulted.add(name)
+        return example[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,142 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Optional, Set, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+log = logging.getLogger(__name__)
+
+MAX_BODY_SIZE = 1024 * 1024
+
+STATUS_TEXT = {
+    200: "OK",
+    400: "Bad Request",
+    403: "Forbidden",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    429: "Too Many Requests",
+    500: "Internal Server Error",
+    502: "Bad Gateway",
+    503: "Service Unavailable",
+}
+
+class HttpRequest:
+    def __init__(self, method: str, target: str, headers: Dict[str, str], body: bytes):
+        parts = urlsplit(target)
+        self.method = method
+        self.path = parts.path
+        self.query = {key: values[-1] for key, values in parse_qs(parts.query).items()}
+        self.headers = headers
+        self.body = body
+
+class HttpError(Exception):
+    def __init__(self, status: int):
+        super().__init__(STATUS_TEXT.get(status, ""))
+        self.status = status
+
+HttpResponse = Tuple[int, str, bytes]
+HttpHandler = Callable[[HttpRequest], Awaitable[HttpResponse]]
+
+class HttpServer:
+    """Minimal asyncio HTTP/1.1 server for a handful of local endpoints.
+
+    Handlers receive an HttpRequest and return (status, content_type, body).
+    Connections are kept alive so a single client can push many requests.
+    It serves /metrics, the Telegram webhook and the fake OpenAI API of the
+    benchmarks, so none of them pulls in a web framework.
+    """
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.routes: Dict[Tuple[str, str], HttpHandler] = {}
+        self.server: Optional[asyncio.base_events.Server] = None
+        self.connections: Set[asyncio.StreamWriter] = set()
+
+    def route(self, method: str, path: str, handler: HttpHandler) -> None:
+        self.routes[(method.upper(), path)] = handler
+
+    async def start(self) -> None:
+        self.server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        if self.port == 0:
+            self.port = self.server.sockets[0].getsockname()[1]
+        log.info("HTTP server listening on %s:%s", self.host, self.port)
+
+    async def stop(self) -> None:
+        if self.server:
+            self.server.close()
+            # wait_closed() also waits for open connections, so end idle keep-alives
+            for writer in list(self.connections):
+                writer.close()
+            await self.server.wait_closed()
+            self.server = None
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Optional[HttpRequest]:
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+        try:
+            method, target, _ = request_line.decode("latin-1").split(" ", 2)
+        except ValueError:
+            raise HttpError(400)
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        try:
+            length = int(headers.get("content-length", "0"))
+        except ValueError:
+            raise HttpError(400)
+        if length > MAX_BODY_SIZE:
+            raise HttpError(413)
+        body = await reader.readexactly(length) if length else b""
+        return HttpRequest(method.upper(), target, headers, body)
+
+    async def _dispatch(self, request: HttpRequest) -> HttpResponse:
+        handler = self.routes.get((request.method, request.path))
+        if handler:
+            try:
+                return await handler(request)
+            except HttpError as e:
+                return e.status, "text/plain", str(e).encode()
+            except Exception:
+                log.exception("Error handling %s %s", request.method, request.path)
+                return 500, "text/plain", b"internal error"
+        if any(path == request.path for _, path in self.routes):
+            return 405, "text/plain", b"method not allowed"
+        return 404, "text/plain", b"not found"
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections.add(writer)
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader)
+                except HttpError as e:
+                    status, content_type, body = e.status, "text/plain", str(e).encode()
+                    keep_alive = False
+                else:
+                    if request is None:
+                        break
+                    status, content_type, body = await self._dispatch(request)
+                    keep_alive = request.headers.get("connection", "").lower() != "close"
+
+                writer.write(
+                    f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\n"
+                    f"Content-Type: {content_type}\r\n"
+                    f"Content-Length: {len(body)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1") + body
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.connections.discard(writer)
+            writer.close()
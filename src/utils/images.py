@@ -0,0 +1,57 @@
+import base64
+import io
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from PIL import Image, ImageOps
+from settings import IMAGE_MAX_SIDE, IMAGE_JPEG_QUALITY
+
+LOW_DETAIL_SIDE = 512  # the model sees low detail images at this size anyway
+
+class ImageCache:
+    """Downscaled, re-encoded copies of user images keyed by Telegram's file_unique_id."""
+
+    def __init__(self, max_side: int = IMAGE_MAX_SIDE, quality: int = IMAGE_JPEG_QUALITY):
+        self.cache_dir = Path("data/images")
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_side = max_side
+        self.quality = quality
+        self.sizes: Dict[str, Tuple[int, int]] = {}
+
+    def _path(self, image_id: str) -> Path:
+        return self.cache_dir / f"{image_id}.jpg"
+
+    def has(self, image_id: str) -> bool:
+        return self._path(image_id).exists()
+
+    def store(self, image_id: str, data: bytes) -> Tuple[int, int]:
+        """Downscale and re-encode an image, returning its new size."""
+        with Image.open(io.BytesIO(data)) as image:
+            image = ImageOps.exif_transpose(image).convert("RGB")
+            image.thumbnail((self.max_side, self.max_side), Image.LANCZOS)
+            image.save(self._path(image_id), "JPEG", quality=self.quality, optimize=True)
+            self.sizes[image_id] = image.size
+        return self.sizes[image_id]
+
+    def size(self, image_id: str) -> Tuple[int, int]:
+        if image_id not in self.sizes:
+            with Image.open(self._path(image_id)) as image:
+                self.sizes[image_id] = image.size
+        return self.sizes[image_id]
+
+    def detail(self, image_id: str) -> str:
+        """Use low detail when high detail would not reveal anything more."""
+        width, height = self.size(image_id)
+        return "low" if max(width, height) <= LOW_DETAIL_SIDE else "high"
+
+    def to_input(self, image_id: str, detail: Optional[str] = None) -> Optional[Dict]:
+        """Build a Responses API input_image part, or None if the image is gone."""
+        path = self._path(image_id)
+        if not path.exists():
+            return None
+        encoded = base64.b64encode(path.read_bytes()).decode("ascii")
+        return {
+            "type": "input_image",
+            "image_url": f"data:image/jpeg;base64,{encoded}",
+            "detail": detail or self.detail(image_id)
+        }
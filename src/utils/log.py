@@ -0,0 +1,116 @@
+"""Structured, non-blocking logging.
+
+Callers log through standard ``logging`` loggers. Records are put on a queue
+by the calling thread and formatted and written by a background listener, so
+logging on the hot path costs little more than a queue put. Large payloads
+go into ``fields`` and are truncated before they are queued.
+
+    log = get_logger(__name__)
+    log.info("Tool result", extra=fields(tool=name, result=result))
+"""
+import contextvars
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional
+
+from settings import LOG_LEVEL, LOG_FORMAT, LOG_FILE, LOG_MAX_BYTES, LOG_BACKUP_COUNT, LOG_FIELD_LIMIT
+from utils.tracing import tracer
+
+_context: contextvars.ContextVar[Dict[str, Any]] = contextvars.ContextVar("log_context", default={})
+_listener: Optional[logging.handlers.QueueListener] = None
+
+def get_logger(name: str) -> logging.Logger:
+    return logging.getLogger(name)
+
+def fields(**values: Any) -> Dict[str, Dict[str, Any]]:
+    """Structured fields for the ``extra`` argument of a log call."""
+    return {"fields": values}
+
+@contextmanager
+def log_context(**values: Any) -> Iterator[None]:
+    """Attach ids such as chat_id or turn_id to every record logged inside the block."""
+    token = _context.set({**_context.get(), **values})
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+def truncate(value: Any, limit: int = LOG_FIELD_LIMIT) -> Any:
+    if isinstance(value, str) and len(value) > limit:
+        return f"{value[:limit]}... ({len(value)} chars)"
+    return value
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Captures context and truncates fields in the caller, before queueing."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.fields = {key: truncate(value) for key, value in getattr(record, "fields", {}).items()}
+        record.context = dict(_context.get())
+        span = tracer.current_span()
+        if span:
+            record.context["trace_id"] = span.trace_id
+        return super().prepare(record)
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            **getattr(record, "context", {}),
+            **getattr(record, "fields", {})
+        }
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        extra = {**getattr(record, "context", {}), **getattr(record, "fields", {})}
+        if extra:
+            text += " " + " ".join(f"{key}={value}" for key, value in extra.items())
+        return text
+
+def setup_logging(log_file: Optional[str] = LOG_FILE) -> None:
+    """Route all loggers through a queue to the console and a rotating JSON file."""
+    global _listener
+    if _listener:
+        return
+
+    console = logging.StreamHandler(sys.stdout)
+    console.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else TextFormatter())
+    handlers = [console]
+    if log_file:
+        Path(log_file).parent.mkdir(parents=True, exist_ok=True)
+        file_handler = logging.handlers.RotatingFileHandler(
+            log_file, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding="utf-8"
+        )
+        file_handler.setFormatter(JsonFormatter())
+        handlers.append(file_handler)
+
+    log_queue: queue.Queue = queue.Queue(-1)
+    root = logging.getLogger()
+    root.setLevel(LOG_LEVEL)
+    root.handlers = [_QueueHandler(log_queue)]
+    # Third-party clients log every request at INFO
+    for name in ("httpx", "httpcore", "telegram", "apscheduler", "googleapiclient"):
+        logging.getLogger(name).setLevel(logging.WARNING)
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+def stop_logging() -> None:
+    """Flush queued records and stop the background listener."""
+    global _listener
+    if _listener:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,157 @@
+"""Opt-in CPU sampling and allocation profiling for individual turns.
+
+Armed for the next N turns by the /profile command or PROFILE_TURNS. While
+disarmed, ``profile()`` costs a single integer check. Stack sampling is
+cheap; tracemalloc slows allocation-heavy code severalfold, so memory
+profiling can be left out.
+"""
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Iterator, List, Optional
+
+from settings import PROFILE_TURNS, PROFILE_SAMPLE_INTERVAL, PROFILE_MEMORY
+from utils.log import get_logger
+
+log = get_logger(__name__)
+
+TOP_FUNCTIONS = 30
+TOP_ALLOCATIONS = 25
+
+class StackSampler:
+    """Samples one thread's stack on a background thread via sys._current_frames()."""
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def _run(self) -> None:
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def start(self) -> None:
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.stopped.set()
+        self.thread.join()
+
+    def top_functions(self, limit: int = TOP_FUNCTIONS) -> List[str]:
+        """Functions by samples on top of the stack (self) and anywhere in it (total)."""
+        own: Counter = Counter()
+        total: Counter = Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")
+            own[frames[-1]] += count
+            for frame in set(frames):
+                total[frame] += count
+        samples = sum(self.stacks.values()) or 1
+        return [f"{100 * own[name] / samples:5.1f}% self {100 * total[name] / samples:5.1f}% total  {name}"
+                for name, _ in own.most_common(limit)]
+
+class Profiler:
+    def __init__(self, output_dir: Path = Path("data/profiles"), interval: float = PROFILE_SAMPLE_INTERVAL):
+        self.output_dir = output_dir
+        self.interval = interval
+        self.remaining = PROFILE_TURNS
+        self.memory = PROFILE_MEMORY
+        self.lock = threading.Lock()
+        self.tracing = 0
+
+    def arm(self, turns: int, memory: bool = PROFILE_MEMORY) -> None:
+        """Profile the next `turns` turns, 0 to disarm."""
+        with self.lock:
+            self.remaining = max(0, turns)
+            self.memory = memory
+
+    def _claim(self) -> Optional[bool]:
+        """Take one armed turn. Returns whether to trace memory, None if disarmed."""
+        with self.lock:
+            if self.remaining <= 0:
+                return None
+            self.remaining -= 1
+            if self.memory:
+                self.tracing += 1
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start()
+            return self.memory
+
+    def _release(self) -> None:
+        with self.lock:
+            self.tracing -= 1
+            if not self.tracing:
+                tracemalloc.stop()
+
+    @contextmanager
+    def profile(self, label: str) -> Iterator[None]:
+        """Profile the block on the current thread if armed."""
+        memory = self._claim() if self.remaining else None
+        if memory is None:
+            yield
+            return
+
+        sampler = StackSampler(threading.get_ident(), self.interval)
+        if memory:
+            tracemalloc.reset_peak()
+            before = tracemalloc.take_snapshot()
+        started = time.perf_counter()
+        sampler.start()
+        try:
+            yield
+        finally:
+            sampler.stop()
+            duration = time.perf_counter() - started
+            allocations, peak = None, None
+            if memory:
+                allocations = tracemalloc.take_snapshot().compare_to(before, "lineno")
+                _, peak = tracemalloc.get_traced_memory()
+                self._release()
+            self._write(label, sampler, duration, peak, allocations)
+
+    def _write(self, label: str, sampler: StackSampler, duration: float,
+               peak: Optional[int], allocations: Optional[List[tracemalloc.StatisticDiff]]) -> Optional[Path]:
+        name = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{label}"
+        try:
+            self.output_dir.mkdir(parents=True, exist_ok=True)
+            with open(self.output_dir / f"{name}.collapsed", "w", encoding="utf-8") as f:
+                f.writelines(f"{stack} {count}\n" for stack, count in sampler.stacks.most_common())
+
+            lines = [
+                f"{label}: {duration:.3f}s, {sum(sampler.stacks.values())} samples every {self.interval * 1000:.0f}ms",
+                "",
+                "Top functions:",
+                *sampler.top_functions()
+            ]
+            if allocations is not None:
+                lines += [
+                    "",
+                    f"Peak traced memory: {peak / 1024 / 1024:.2f} MB",
+                    "Top allocation sites (growth during the turn):",
+                    *(str(stat) for stat in allocations[:TOP_ALLOCATIONS])
+                ]
+            summary = self.output_dir / f"{name}.txt"
+            summary.write_text("\n".join(lines) + "\n", encoding="utf-8")
+        except OSError as e:
+            log.error("Error writing profile %s: %s", name, e)
+            return None
+
+        log.info("Profile written to %s", summary)
+        return summary
+
+profiler = Profiler()
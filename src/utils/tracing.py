@@ -0,0 +1,181 @@
+import bisect
+import contextvars
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+
+from settings import TRACE_EXPORT
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+QUANTILES = (0.5, 0.95, 0.99)
+LABEL_ATTRIBUTES = ("tool", "mode", "method", "model", "route", "target")
+RESERVOIR_SIZE = 1024
+
+log = logging.getLogger(__name__)
+
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("current_span", default=None)
+
+class Span:
+    def __init__(self, name: str, parent: Optional["Span"], attributes: Dict[str, Any]):
+        self.name = name
+        self.span_id = uuid.uuid4().hex[:16]
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        self.parent_id = parent.span_id if parent else None
+        self.root = parent.root if parent else self
+        self.attributes = attributes
+        self.start = time.time()
+        self.started = time.perf_counter()
+        self.duration: Optional[float] = None
+        self.children: List["Span"] = []
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start,
+            "duration": self.duration,
+            "attributes": self.attributes
+        }
+
+class LatencyHistogram:
+    """Cumulative buckets plus a reservoir of recent samples for quantiles."""
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.total = 0.0
+        self.samples: Deque[float] = deque(maxlen=RESERVOIR_SIZE)
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(BUCKETS, value)
+        if index < len(BUCKETS):
+            self.counts[index] += 1
+        self.count += 1
+        self.total += value
+        self.samples.append(value)
+
+    def quantile(self, q: float) -> float:
+        ordered = sorted(self.samples)
+        if not ordered:
+            return 0.0
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...], **extra: str) -> str:
+    pairs = list(labels) + list(extra.items())
+    return "{" + ",".join(f'{key}="{str(value)}"' for key, value in pairs) + "}"
+
+class Tracer:
+    """Spans per turn with child spans, exported as JSONL and Prometheus metrics."""
+
+    def __init__(self, export_file: Path = Path("data/traces/traces.jsonl"), export: bool = TRACE_EXPORT):
+        self.export_file = export_file
+        self.export = export
+        self.lock = threading.Lock()
+        self.histograms: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], LatencyHistogram] = {}
+        self.counters: Dict[str, Dict[Tuple[Tuple[str, str], ...], float]] = {}
+
+    def current_span(self) -> Optional[Span]:
+        return _current_span.get()
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[Span]:
+        """Time a block as a child of the current span (or a new trace)."""
+        parent = _current_span.get()
+        span = Span(name, parent, attributes)
+        if parent:
+            parent.children.append(span)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.attributes["error"] = type(e).__name__
+            raise
+        finally:
+            _current_span.reset(token)
+            span.duration = time.perf_counter() - span.started
+            self._finish(span)
+
+    @contextmanager
+    def attach(self, span: Optional[Span]) -> Iterator[None]:
+        """Continue an existing span in another thread or task."""
+        token = _current_span.set(span)
+        try:
+            yield
+        finally:
+            _current_span.reset(token)
+
+    def increment(self, name: str, amount: float = 1.0, **labels: Any) -> None:
+        """Add to a Prometheus counter, e.g. cache hits per tool."""
+        key = tuple(sorted((label, str(value)) for label, value in labels.items()))
+        with self.lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + amount
+
+    def _finish(self, span: Span) -> None:
+        labels = tuple((key, str(span.attributes[key])) for key in LABEL_ATTRIBUTES if key in span.attributes)
+        with self.lock:
+            key = (span.name, labels)
+            if key not in self.histograms:
+                self.histograms[key] = LatencyHistogram()
+            self.histograms[key].observe(span.duration)
+
+        if span.root is span and self.export:
+            self._export(span)
+
+    def _export(self, root: Span) -> None:
+        lines = []
+        pending = [root]
+        while pending:
+            span = pending.pop()
+            lines.append(json.dumps(span.to_dict(), ensure_ascii=False, default=str))
+            pending.extend(span.children)
+        try:
+            self.export_file.parent.mkdir(parents=True, exist_ok=True)
+            with self.lock, open(self.export_file, "a", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+        except OSError as e:
+            log.error("Error exporting trace: %s", e)
+
+    def metrics_text(self) -> str:
+        """Render latency histograms, p50/p95/p99 and counters in Prometheus text format."""
+        with self.lock:
+            items = sorted(self.histograms.items())
+            lines = [
+                "# HELP span_duration_seconds Duration of traced operations.",
+                "# TYPE span_duration_seconds histogram"
+            ]
+            for (name, labels), histogram in items:
+                cumulative = 0
+                for bound, count in zip(BUCKETS, histogram.counts):
+                    cumulative += count
+                    lines.append(f"span_duration_seconds_bucket{_format_labels(labels, span=name, le=str(bound))} {cumulative}")
+                lines.append(f"span_duration_seconds_bucket{_format_labels(labels, span=name, le='+Inf')} {histogram.count}")
+                lines.append(f"span_duration_seconds_sum{_format_labels(labels, span=name)} {histogram.total}")
+                lines.append(f"span_duration_seconds_count{_format_labels(labels, span=name)} {histogram.count}")
+
+            lines.append("# HELP span_latency_seconds Recent latency quantiles of traced operations.")
+            lines.append("# TYPE span_latency_seconds summary")
+            for (name, labels), histogram in items:
+                for q in QUANTILES:
+                    lines.append(f"span_latency_seconds{_format_labels(labels, span=name, quantile=str(q))} {histogram.quantile(q)}")
+                lines.append(f"span_latency_seconds_sum{_format_labels(labels, span=name)} {histogram.total}")
+                lines.append(f"span_latency_seconds_count{_format_labels(labels, span=name)} {histogram.count}")
+
+            for name, series in sorted(self.counters.items()):
+                lines.append(f"# TYPE {name} counter")
+                for labels, value in sorted(series.items()):
+                    lines.append(f"{name}{_format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+tracer = Tracer()
@@ -0,0 +1,28 @@
+"""Tests run from the repository root with ``uv run pytest``.
+
+They fall back to config-example.py when no config.py has been set up. Every
+test runs in a temporary directory, so tools that write under data/ leave the
+checkout alone.
+"""
+import importlib.util
+import sys
+from pathlib import Path
+
+import pytest
+
+def _example_config():
+    path = Path(__file__).resolve().parent.parent / "src" / "config-example.py"
+    spec = importlib.util.spec_from_file_location("config", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+try:
+    import config  # noqa: F401
+except ImportError:
+    sys.modules["config"] = _example_config()
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
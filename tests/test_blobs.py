@@ -0,0 +1,55 @@
+import pytest
+
+import assistant.blobs as blobs_module
+from assistant.blobs import HANDLE_LENGTH, BlobStore
+
+@pytest.fixture
+def store(tmp_path):
+    return BlobStore(tmp_path / "blobs")
+
+def test_identical_texts_are_stored_once(store, tmp_path):
+    handle = store.put("some long output")
+    assert len(handle) == HANDLE_LENGTH
+    assert store.put("some long output") == handle
+    assert store.put("another output") != handle
+    assert len([path for path in (tmp_path / "blobs").rglob("*") if path.is_file()]) == 2
+
+def test_get_accepts_handles_and_rejects_bad_ids(store):
+    handle = store.put("text")
+    assert store.get(handle) == "text"
+    assert store.get(f"  {handle.upper()} ") == "text"
+    assert store.get(handle[:HANDLE_LENGTH - 1]) is None
+    assert store.get("../../etc/passwd") is None
+    assert store.get("0" * HANDLE_LENGTH) is None
+
+def test_stub_keeps_a_preview_and_the_handle(store, monkeypatch):
+    monkeypatch.setattr(blobs_module, "BLOB_PREVIEW_CHARS", 5)
+    stub = store.stub("abcdefghij")
+    handle = store.put("abcdefghij")
+    assert stub.startswith(f"[Stored output {handle}, 10 chars. Preview:\nabcde\n")
+    assert "fghij" not in stub
+    assert f"blob(id='{handle}')" in stub
+
+def test_process_pages_through_the_text(store, monkeypatch):
+    monkeypatch.setattr(blobs_module, "BLOB_READ_CHARS", 4)
+    handle = store.put("0123456789")
+    assert store.process(handle) == "0123\n[Showing chars 0-4 of 10; use offset=4 for more]"
+    assert store.process(handle, 8) == "89"
+    assert store.process(handle, -3).startswith("0123")
+    assert store.process("f" * HANDLE_LENGTH) == f"Error: Blob {'f' * HANDLE_LENGTH} not found"
+
+def test_offset_from_the_model_is_coerced(store, monkeypatch):
+    monkeypatch.setattr(blobs_module, "BLOB_READ_CHARS", 4)
+    handle = store.put("0123456789")
+    assert store.process(handle, "8") == "89"
+    assert store.process(handle, 8.0) == "89"
+    assert store.process(handle, "eight") == "Error: offset must be a whole number"
+    assert store.process(handle, None) == "Error: offset must be a whole number"
+
+def test_unfinished_writes_do_not_match_handles(store, tmp_path):
+    handle = store.put("text")
+    blob_dir = tmp_path / "blobs" / handle[:2]
+    assert len(list(blob_dir.iterdir())) == 1
+    # Another worker part way through writing a blob with the same digest prefix
+    (blob_dir / f".{handle}0123.tmp").write_bytes(b"partial")
+    assert store.get(handle) == "text"
@@ -0,0 +1,63 @@
+import time
+
+from assistant.cache import ToolCache
+
+TTL = {"calendar": 60, "tasks": 60, "notion": 60, "url": 60}
+
+def test_only_reads_of_cached_tools_have_keys():
+    cache = ToolCache(ttl=TTL)
+    assert cache.key("tasks", {"mode": "r"}) is not None
+    assert cache.key("tasks", {"mode": "w", "task_id": "a"}) is None
+    assert cache.key("url", {"url": "https://example.com"}) is not None
+    assert cache.key("search", {"query": "x"}) is None
+    assert ToolCache(ttl={**TTL, "url": 0}).key("url", {"url": "https://example.com"}) is None
+
+def test_key_ignores_empty_arguments_and_order():
+    cache = ToolCache(ttl=TTL)
+    key = cache.key("notion", {"mode": "query_db", "database_id": "db", "filter": None})
+    assert key == cache.key("notion", {"database_id": "db", "mode": "query_db", "sort": ""})
+    assert key != cache.key("notion", {"mode": "query_db", "database_id": "other"})
+
+def test_least_recently_used_entry_is_evicted():
+    cache = ToolCache(max_size=2, ttl=TTL)
+    keys = [cache.key("url", {"url": f"https://example.com/{i}"}) for i in range(3)]
+    cache.put(keys[0], "zero")
+    cache.put(keys[1], "one")
+    assert cache.get(keys[0]) == "zero"
+    cache.put(keys[2], "two")
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) == "zero"
+    assert cache.get(keys[2]) == "two"
+
+def test_entries_expire_after_their_ttl():
+    cache = ToolCache(ttl={**TTL, "url": 0.05})
+    key = cache.key("url", {"url": "https://example.com"})
+    cache.put(key, "page")
+    assert cache.get(key) == "page"
+    time.sleep(0.06)
+    assert cache.get(key) is None
+    assert not cache.entries
+
+def test_errors_are_not_cached():
+    cache = ToolCache(ttl=TTL)
+    key = cache.key("url", {"url": "https://example.com"})
+    cache.put(key, "Error: timed out")
+    cache.put(key, {"not": "text"})
+    assert cache.get(key) is None
+
+def test_writes_invalidate_only_stale_modes():
+    cache = ToolCache(ttl=TTL)
+    listing = cache.key("notion", {"mode": "list_databases"})
+    query = cache.key("notion", {"mode": "query_db", "database_id": "db"})
+    tasks = cache.key("tasks", {"mode": "r"})
+    for key in (listing, query, tasks):
+        cache.put(key, "result")
+
+    cache.after_write("notion", {"mode": "create_page", "database_id": "db"})
+    assert cache.get(query) is None
+    assert cache.get(listing) == "result"
+
+    cache.after_write("tasks", {"mode": "r"})
+    assert cache.get(tasks) == "result"
+    cache.after_write("tasks", {"mode": "d", "task_id": "a"})
+    assert cache.get(tasks) is None
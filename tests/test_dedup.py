@@ -0,0 +1,42 @@
+from assistant.tools.dedup import MinHashIndex, jaccard, shingles
+
+def test_shingles_ignore_stop_words_case_and_plurals():
+    assert shingles("The user LIKES coffee") == shingles("coffee")
+    assert shingles("favorite_drinks") == shingles("favorite drink")
+    assert shingles("a an of") == frozenset()
+
+def test_jaccard():
+    assert jaccard(frozenset("ab"), frozenset("ab")) == 1.0
+    assert jaccard(frozenset("ab"), frozenset("bc")) == 1 / 3
+    assert jaccard(frozenset(), frozenset("a")) == 0.0
+
+def test_similar_finds_rewordings_not_unrelated_memories():
+    index = MinHashIndex()
+    index.add("favorite_coffee", "favorite_coffee Prefers oat milk flat white in the morning")
+    index.add("dentist", "dentist Dentist appointment every six months at Dr. Weber")
+
+    matches = index.similar("coffee_favorite Prefers a flat white with oat milk in the morning", 0.6)
+    assert [key for _, key in matches] == ["favorite_coffee"]
+    assert 0.6 <= matches[0][0] <= 1.0
+    assert index.similar("Allergic to peanuts", 0.3) == []
+
+def test_exclude_remove_and_replace():
+    index = MinHashIndex()
+    text = "gym_schedule Goes to the gym on Monday and Thursday evenings"
+    index.add("gym_schedule", text)
+    assert "gym_schedule" in index
+    assert index.similar(text, 0.9, exclude="gym_schedule") == []
+
+    index.add("gym_schedule", "gym_schedule Swims on Sunday mornings")
+    assert index.similar(text, 0.6) == []
+
+    index.remove("gym_schedule")
+    assert "gym_schedule" not in index
+    assert all(not bucket for bucket in index.buckets)
+    index.remove("gym_schedule")
+
+def test_texts_without_shingles_are_not_indexed():
+    index = MinHashIndex()
+    index.add("empty", "the and for")
+    assert "empty" not in index
+    assert index.similar("the and for", 0.0) == []
@@ -0,0 +1,48 @@
+import pytest
+
+import assistant.tools.memory as memory_module
+from assistant.tools.memory import Memory, MemoryMode
+
+COFFEE = "Prefers oat milk flat white in the morning"
+REWORDED = "Prefers a flat white with oat milk in the morning"
+
+@pytest.fixture
+def memory(workdir):
+    return Memory()
+
+def write(memory, memory_id, content, force=False):
+    return memory.process(MemoryMode.WRITE, memory_id, content, force)
+
+def test_memories_are_indexed_on_load(memory):
+    write(memory, "favorite_coffee", COFFEE)
+    reloaded = Memory()
+    assert "favorite_coffee" in reloaded.dedup
+    assert write(reloaded, "coffee_favorite", REWORDED).startswith("Not saved: coffee_favorite looks like")
+    assert write(reloaded, "coffee_favorite", REWORDED, force=True) == "Memory coffee_favorite saved successfully"
+
+def test_merge_keeps_both_texts(memory, monkeypatch):
+    monkeypatch.setattr(memory_module, "MEMORY_DEDUP", "merge")
+    write(memory, "favorite_coffee", COFFEE)
+    result = write(memory, "coffee_favorite", REWORDED)
+    assert result.startswith("Memory coffee_favorite looks like existing memory favorite_coffee, added to it.")
+    assert memory.memories == {"favorite_coffee": f"{COFFEE}\n{REWORDED}"}
+
+    write(memory, "coffee_order", COFFEE)
+    assert memory.memories == {"favorite_coffee": f"{COFFEE}\n{REWORDED}"}
+
+def test_compaction_merges_stored_duplicates_without_losing_text(memory, monkeypatch):
+    monkeypatch.setattr(memory_module, "MEMORY_DEDUP", "off")
+    plural = "Prefers oat milk flat whites in the mornings"
+    write(memory, "favorite_coffee", COFFEE)
+    write(memory, "coffee_favorite", plural)
+    write(memory, "dentist", "Dentist appointment every six months at Dr. Weber")
+
+    reloaded = Memory()
+    assert reloaded.compact(batch=1) == 1
+    assert reloaded.memories["coffee_favorite"] == f"{plural}\n{COFFEE}"
+    assert "favorite_coffee" not in reloaded.memories
+    assert "favorite_coffee" not in reloaded.dedup
+
+    assert reloaded.compact() == 0
+    assert list(reloaded.memories) == ["coffee_favorite", "dentist"]
+    assert Memory().memories == reloaded.memories
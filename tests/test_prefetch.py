@@ -0,0 +1,30 @@
+from concurrent.futures import Future
+
+from assistant.prefetch import Prefetch
+
+def finished(result=None, error=None):
+    future = Future()
+    if error:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+    return future
+
+def test_context_never_waits_and_hands_over_each_read_once():
+    pending = Future()
+    prefetch = Prefetch({"Calendar": finished("Meeting at 9"), "Tasks": pending,
+                         "Memories": finished(error=RuntimeError("down"))})
+
+    context = prefetch.context()
+    assert "Calendar:\nMeeting at 9" in context
+    assert "Tasks" not in context
+
+    pending.set_result("Water plants")
+    context = prefetch.context()
+    assert "Tasks:\nWater plants" in context
+    assert "Calendar" not in context
+    assert prefetch.context() is None
+
+def test_errors_and_empty_results_are_left_out():
+    prefetch = Prefetch({"Calendar": finished("Error: calendar unavailable"), "Tasks": finished("")})
+    assert prefetch.context() is None
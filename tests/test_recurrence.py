@@ -0,0 +1,91 @@
+from datetime import datetime
+
+import pytest
+
+from assistant.tools.recurrence import Recurrence
+
+def test_never_and_empty_do_not_repeat():
+    assert Recurrence.parse(None) is None
+    assert Recurrence.parse("never") is None
+
+@pytest.mark.parametrize("repeat, expected", [
+    ("daily", datetime(2025, 1, 2, 9)),
+    ("weekly", datetime(2025, 1, 8, 9)),
+    ("biweekly", datetime(2025, 1, 15, 9)),
+    ("monthly", datetime(2025, 2, 1, 9)),
+    ("yearly", datetime(2026, 1, 1, 9)),
+    ("FREQ=HOURLY;INTERVAL=3", datetime(2025, 1, 1, 12)),
+    ("RRULE:FREQ=DAILY;INTERVAL=2", datetime(2025, 1, 3, 9)),
+])
+def test_presets_and_rules(repeat, expected):
+    anchor = datetime(2025, 1, 1, 9)
+    assert Recurrence.parse(repeat).after(anchor, anchor) == expected
+
+def test_monthly_clamps_to_month_end_and_returns():
+    rule = Recurrence.parse("monthly")
+    anchor = datetime(2025, 1, 31, 9)
+    assert rule.after(anchor, anchor) == datetime(2025, 2, 28, 9)
+    assert rule.after(anchor, datetime(2025, 2, 28, 9)) == datetime(2025, 3, 31, 9)
+
+def test_yearly_on_leap_day():
+    rule = Recurrence.parse("yearly")
+    anchor = datetime(2024, 2, 29, 8)
+    assert rule.after(anchor, anchor) == datetime(2025, 2, 28, 8)
+    assert rule.after(anchor, datetime(2027, 3, 1)) == datetime(2028, 2, 29, 8)
+
+def test_weekly_by_day():
+    rule = Recurrence.parse("FREQ=WEEKLY;BYDAY=MO,WE,FR")
+    anchor = datetime(2025, 1, 6, 9)  # Monday
+    assert rule.between(anchor, anchor, datetime(2025, 1, 13, 9), 10) == [
+        datetime(2025, 1, 6, 9), datetime(2025, 1, 8, 9), datetime(2025, 1, 10, 9), datetime(2025, 1, 13, 9)
+    ]
+
+def test_by_day_every_other_week():
+    rule = Recurrence.parse("FREQ=WEEKLY;INTERVAL=2;BYDAY=TU")
+    anchor = datetime(2025, 1, 7, 9)  # Tuesday
+    assert rule.after(anchor, anchor) == datetime(2025, 1, 21, 9)
+
+def test_negative_month_day_counts_from_the_end():
+    rule = Recurrence.parse("FREQ=MONTHLY;BYMONTHDAY=-1")
+    anchor = datetime(2025, 1, 31, 18)
+    assert rule.between(anchor, anchor, datetime(2025, 4, 30, 18), 10) == [
+        datetime(2025, 1, 31, 18), datetime(2025, 2, 28, 18), datetime(2025, 3, 31, 18), datetime(2025, 4, 30, 18)
+    ]
+
+def test_month_day_skips_short_months():
+    rule = Recurrence.parse("FREQ=MONTHLY;BYMONTHDAY=31")
+    anchor = datetime(2025, 1, 31, 9)
+    assert rule.after(anchor, anchor) == datetime(2025, 3, 31, 9)
+
+def test_until_ends_the_rule():
+    rule = Recurrence.parse("FREQ=DAILY;UNTIL=20250103")
+    anchor = datetime(2025, 1, 1, 9)
+    assert rule.after(anchor, datetime(2025, 1, 2, 9)) == datetime(2025, 1, 3, 9)
+    assert rule.after(anchor, datetime(2025, 1, 3, 9)) is None
+
+def test_far_behind_is_constant_time():
+    rule = Recurrence.parse("FREQ=HOURLY")
+    anchor = datetime(2000, 1, 1, 0, 30)
+    assert rule.after(anchor, datetime(2025, 6, 1, 12)) == datetime(2025, 6, 1, 12, 30)
+
+def test_latest_and_between_limit():
+    rule = Recurrence.parse("daily")
+    anchor = datetime(2025, 1, 1, 9)
+    assert rule.latest(anchor, datetime(2025, 1, 10, 8)) == datetime(2025, 1, 9, 9)
+    assert rule.latest(anchor, datetime(2024, 12, 31)) is None
+    assert len(rule.between(anchor, anchor, datetime(2025, 12, 31), 5)) == 5
+
+@pytest.mark.parametrize("repeat", [
+    "hourly-ish",
+    "FREQ=SECONDLY",
+    "FREQ=DAILY;COUNT=3",
+    "FREQ=DAILY;INTERVAL=0",
+    "FREQ=DAILY;BYDAY=MO",
+    "FREQ=WEEKLY;BYDAY=XX",
+    "FREQ=MONTHLY;BYMONTHDAY=32",
+    "FREQ=WEEKLY;BYMONTHDAY=1",
+    "FREQ=DAILY;UNTIL=tomorrow",
+])
+def test_invalid_rules_are_rejected(repeat):
+    with pytest.raises(ValueError):
+        Recurrence.parse(repeat)
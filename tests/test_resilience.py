@@ -0,0 +1,79 @@
+import time
+
+import httpx
+import openai
+import pytest
+
+from assistant.resilience import CircuitBreaker, CircuitOpenError, ModelTimeoutError, ResilientCaller
+
+def connection_error():
+    return openai.APIConnectionError(request=httpx.Request("POST", "https://api.openai.com/v1/responses"))
+
+def failing(errors, result="ok"):
+    """A request that raises the given errors in turn, then returns result."""
+    calls = []
+
+    def request(timeout):
+        calls.append(timeout)
+        if len(calls) <= len(errors):
+            raise errors[len(calls) - 1]
+        return result
+    return request, calls
+
+def caller(**kwargs):
+    return ResilientCaller(**{"timeout": 1, "retries": 2, "backoff": 0, "backoff_max": 0,
+                              "breaker": CircuitBreaker(failures=10, reset_after=60), **kwargs})
+
+def test_retryable_errors_are_retried():
+    request, calls = failing([connection_error(), ModelTimeoutError()])
+    assert caller().call(request) == "ok"
+    assert calls == [1, 1, 1]
+
+def test_other_errors_are_raised_at_once():
+    request, calls = failing([ValueError("bad request")])
+    with pytest.raises(ValueError):
+        caller().call(request)
+    assert len(calls) == 1
+
+def test_gives_up_after_the_last_retry():
+    request, calls = failing([connection_error()] * 3)
+    with pytest.raises(openai.APIConnectionError):
+        caller().call(request)
+    assert len(calls) == 3
+
+def test_deadline_abandons_a_hanging_attempt():
+    def request(timeout):
+        time.sleep(0.5)
+        return "late"
+
+    started = time.monotonic()
+    with pytest.raises(ModelTimeoutError):
+        caller(timeout=0.05, retries=0).call(request)
+    assert time.monotonic() - started < 0.3
+
+def test_breaker_opens_and_lets_one_probe_through():
+    breaker = CircuitBreaker(failures=2, reset_after=0.05)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_failure()
+    assert not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.allow() and breaker.allow()
+
+def test_open_circuit_stops_requests():
+    breaker = CircuitBreaker(failures=1, reset_after=60)
+    request, calls = failing([connection_error()] * 5)
+    with pytest.raises(CircuitOpenError):
+        caller(retries=3, breaker=breaker).call(request)
+    with pytest.raises(CircuitOpenError):
+        caller(breaker=breaker).call(request)
+    assert len(calls) == 1
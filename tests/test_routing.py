@@ -0,0 +1,40 @@
+import pytest
+
+from assistant.routing import ModelRouter
+
+@pytest.fixture
+def router():
+    return ModelRouter(main_model="main", fast_model="fast", simple_max_chars=40)
+
+@pytest.mark.parametrize("text, images, source, route, reason", [
+    ("thanks, that's great", 0, None, "fast", "simple"),
+    ("x" * 41, 0, None, "main", "long"),
+    ("what's on my calendar?", 0, None, "main", "tool_hint"),
+    ("nice", 1, None, "main", "images"),
+    ("TASK water: Say good morning", 0, "task:water", "fast", "simple_task"),
+    ("TASK standup: Summarize my meetings", 0, "task:standup", "main", "tool_hint"),
+])
+def test_classify(router, text, images, source, route, reason):
+    decision = router.classify(text, images, source)
+    assert (decision.route, decision.reason) == (route, reason)
+    assert decision.model == ("fast" if route == "fast" else "main")
+
+def test_task_prefix_does_not_count_towards_length(router):
+    assert router.classify("TASK " + "x" * 30 + ": hi", source="task:" + "x" * 30).route == "fast"
+
+def test_without_fast_model_everything_goes_to_main():
+    router = ModelRouter(main_model="main", fast_model=None)
+    decision = router.classify("hi")
+    assert (decision.model, decision.reason) == ("main", "routing_disabled")
+
+def test_tool_calls_escalate_fast_turns_only(router):
+    escalated = router.escalate(router.classify("hi"))
+    assert (escalated.model, escalated.route) == ("main", "escalated")
+    main = router.classify("x" * 41)
+    assert router.escalate(main) is main
+
+def test_forced_summary_never_uses_the_fast_model(router):
+    final = router.final(router.classify("hi"))
+    assert (final.model, final.route) == ("main", "escalated")
+    main = router.classify("x" * 41)
+    assert router.final(main) is main
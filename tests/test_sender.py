@@ -0,0 +1,56 @@
+import asyncio
+import time
+
+from interfaces.telegram.sender import TokenBucket, split_message, utf16_length
+
+def test_short_text_is_one_chunk():
+    assert split_message("hello", 10) == ["hello"]
+    assert split_message("", 10) == [""]
+
+def test_split_prefers_line_then_word_breaks():
+    assert split_message("first line\nsecond line", 15) == ["first line", "second line"]
+    assert split_message("one two three four", 9) == ["one two", "three", "four"]
+
+def test_text_without_breaks_is_cut_at_the_limit():
+    assert split_message("a" * 25, 10) == ["a" * 10, "a" * 10, "a" * 5]
+
+def test_indentation_survives_a_split():
+    assert split_message("def f():\n    return 1", 12) == ["def f():", "    return 1"]
+
+def test_astral_characters_count_twice():
+    assert utf16_length("a\U0001F600") == 3
+    assert split_message("\U0001F600" * 6, 5) == ["\U0001F600" * 2] * 3
+    chunks = split_message("ok \U0001F44D " * 1200)
+    assert len(chunks) == 2
+    assert all(utf16_length(chunk) <= 4096 for chunk in chunks)
+
+def test_chunks_stay_within_the_limit_and_keep_every_word():
+    text = "\n".join(f"line {i} " + "word " * (i % 7) for i in range(300))
+    chunks = split_message(text, 100)
+    assert all(len(chunk) <= 100 for chunk in chunks)
+    assert " ".join(chunks).split() == text.split()
+
+def test_bucket_allows_a_burst_then_paces():
+    async def run():
+        bucket = TokenBucket(rate=50, capacity=3)
+        started = time.monotonic()
+        for _ in range(3):
+            await bucket.acquire()
+        burst = time.monotonic() - started
+        for _ in range(2):
+            await bucket.acquire()
+        return burst, time.monotonic() - started
+
+    burst, total = asyncio.run(run())
+    assert burst < 0.02
+    assert total >= 0.035
+
+def test_block_holds_back_acquires():
+    async def run():
+        bucket = TokenBucket(rate=1000, capacity=5)
+        bucket.block(0.05)
+        started = time.monotonic()
+        await bucket.acquire()
+        return time.monotonic() - started
+
+    assert asyncio.run(run()) >= 0.045
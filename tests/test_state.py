@@ -0,0 +1,116 @@
+import threading
+import time
+
+import pytest
+
+from assistant.state import SharedRecords, SharedState
+from assistant.tools.tasks import Tasks, TaskMode
+
+@pytest.fixture
+def state(tmp_path):
+    return SharedState(tmp_path / "state.db")
+
+def test_lease_is_exclusive_until_it_expires(state):
+    assert state.acquire("leader", "a", ttl=0.2)
+    assert not state.acquire("leader", "b", ttl=0.2)
+    assert state.acquire("leader", "a", ttl=0.2)
+    time.sleep(0.25)
+    assert state.acquire("leader", "b", ttl=0.2)
+    assert not state.acquire("leader", "a", ttl=0.2)
+
+def test_release_only_frees_own_lease(state):
+    state.acquire("leader", "a")
+    state.release("leader", "b")
+    assert not state.acquire("leader", "b")
+    state.release("leader", "a")
+    assert state.acquire("leader", "b")
+
+def test_hold_serializes_holders(state):
+    inside, overlaps = [], []
+
+    def turn(holder):
+        with state.hold("conversation", holder, ttl=1, poll=0.01):
+            if inside:
+                overlaps.append(holder)
+            inside.append(holder)
+            time.sleep(0.05)
+            inside.remove(holder)
+
+    threads = [threading.Thread(target=turn, args=(f"worker{i}",)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert overlaps == []
+    assert state.acquire("conversation", "someone else")
+
+def test_inbox_claims_in_order_per_shard(state):
+    state.enqueue(0, 10, {"text": "first"})
+    state.enqueue(1, 11, {"text": "other shard"})
+    state.enqueue(0, 10, {"text": "second"})
+    assert state.claim(0) == [(10, {"text": "first"}), (10, {"text": "second"})]
+    assert state.claim(0) == []
+    assert state.claim(1) == [(11, {"text": "other shard"})]
+
+def test_transaction_rolls_back_on_error(state):
+    with pytest.raises(RuntimeError):
+        with state.transaction():
+            state.put("notes", {"a": 1})
+            raise RuntimeError
+    assert state.records("notes") == ({}, 0)
+
+def test_records_sync_changes_and_deletes(state):
+    first, second = SharedRecords(state, "notes"), SharedRecords(state, "notes")
+    data_first, data_second = first.load(), second.load()
+
+    data_first.update(a=1, b=2)
+    first.save(data_first, ["a", "b"])
+    assert second.sync(data_second) == {"a", "b"}
+    assert data_second == {"a": 1, "b": 2}
+
+    del data_second["a"]
+    second.save(data_second, ["a"])
+    assert first.sync(data_first) == {"a"}
+    assert data_first == {"b": 2}
+    assert first.sync(data_first) == set()
+
+def test_legacy_json_is_imported_once(state, tmp_path):
+    legacy = tmp_path / "tasks.json"
+    legacy.write_text('{"old": {"datetime": "2030-01-01 09:00:00"}}', encoding="utf-8")
+    assert SharedRecords(state, "tasks", legacy).load() == {"old": {"datetime": "2030-01-01 09:00:00"}}
+    legacy.write_text('{"changed": {}}', encoding="utf-8")
+    assert list(SharedRecords(state, "tasks", legacy).load()) == ["old"]
+
+def test_concurrent_task_writers_lose_nothing(state):
+    def writer(n):
+        tasks = Tasks(SharedRecords(state, "tasks"))
+        for i in range(25):
+            tasks.process(TaskMode.WRITE, f"t{n}-{i}", "x", "2030-01-01 09:00:00")
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(Tasks(SharedRecords(state, "tasks")).tasks) == 100
+
+def test_due_task_is_taken_by_one_worker(state):
+    first, second = Tasks(SharedRecords(state, "tasks")), Tasks(SharedRecords(state, "tasks"))
+    first.process(TaskMode.WRITE, "now", "x", "2020-01-01 09:00:00")
+    assert [task["id"] for task in second.get_due_tasks()] == ["now"]
+    assert first.get_due_tasks() == []
+    assert "now" not in first.tasks
+
+def test_history_appends(state):
+    assert state.append_history([{"role": "user", "content": "hi"}]) == 1
+    last = state.append_history([{"role": "assistant", "content": "hello"}, {"role": "user", "content": "bye"}])
+    items, last_id = state.history(1)
+    assert last_id == last == 3
+    assert [item["content"] for item in items] == ["hello", "bye"]
+
+def test_cache_generation(state):
+    assert state.cache_generation("calendar") == 0
+    state.bump_cache("calendar")
+    state.bump_cache("calendar")
+    assert state.cache_generation("calendar") == 2
+    assert state.cache_generation("notion") == 0
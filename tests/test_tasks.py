@@ -0,0 +1,92 @@
+from datetime import datetime
+
+import pytest
+
+import assistant.tools.tasks as tasks_module
+from assistant.tools.tasks import Tasks, TaskMode
+
+@pytest.fixture
+def tasks(workdir):
+    return Tasks()
+
+def write(tasks, task_id, when, repeat=None):
+    return tasks.process(TaskMode.WRITE, task_id, f"do {task_id}", when, repeat)
+
+def due_at(tasks, monkeypatch, now):
+    """Run the due-task scan as if the local time were now."""
+    class Clock(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return now.replace(tzinfo=tz)
+
+    monkeypatch.setattr(tasks_module, "datetime", Clock)
+    return tasks.get_due_tasks()
+
+def test_index_follows_writes_and_deletes(tasks):
+    write(tasks, "late", "2030-01-03 09:00:00")
+    write(tasks, "early", "2030-01-01 09:00:00")
+    write(tasks, "middle", "2030-01-02 09:00:00")
+    assert [task_id for _, task_id in tasks.index] == ["early", "middle", "late"]
+
+    assert write(tasks, "early", "2030-01-04 09:00:00") == "Task early has been updated"
+    tasks.process(TaskMode.DELETE, "middle")
+    assert tasks.index == [("2030-01-03 09:00:00", "late"), ("2030-01-04 09:00:00", "early")]
+    assert Tasks().index == tasks.index
+
+def test_window_query_covers_whole_days(tasks):
+    for day in range(1, 6):
+        write(tasks, f"t{day}", f"2030-01-0{day} 23:30:00")
+    result = tasks.process(TaskMode.READ, "", start="2030-01-02", end="2030-01-03")
+    assert [line.split()[2] for line in result.splitlines()] == ["t2", "t3"]
+
+def test_paging(tasks):
+    for day in range(1, 6):
+        write(tasks, f"t{day}", f"2030-01-0{day} 09:00:00")
+    first = tasks.process(TaskMode.READ, "", limit=2)
+    assert first.splitlines()[-1] == "[Showing 1-2 of 5 tasks; use offset=2 for more]"
+    last = tasks.process(TaskMode.READ, "", limit=2, offset=4)
+    assert last == "2030-01-05 09:00:00 t5 (never): do t5"
+    assert tasks.process(TaskMode.READ, "", offset=9) == "No tasks at offset 9, there are 5"
+
+def test_repeat_filter(tasks):
+    write(tasks, "once", "2030-01-01 09:00:00")
+    write(tasks, "daily", "2030-01-01 10:00:00", "daily")
+    write(tasks, "weekly", "2030-01-01 11:00:00", "FREQ=WEEKLY;BYDAY=TU")
+    assert "once" not in tasks.process(TaskMode.READ, "", repeat="repeating")
+    assert tasks.process(TaskMode.READ, "", repeat="DAILY").split()[2] == "daily"
+
+def test_paging_arguments_are_validated(tasks):
+    write(tasks, "t1", "2030-01-01 09:00:00")
+    assert tasks.process(TaskMode.READ, "", limit="1", offset="0").startswith("2030-01-01")
+    assert tasks.process(TaskMode.READ, "", limit="many") == "Error: limit and offset must be whole numbers"
+
+def test_repeat_rule_starts_on_first_occurrence(tasks):
+    # 2030-01-01 is a Tuesday
+    write(tasks, "standup", "2030-01-01 09:00:00", "FREQ=WEEKLY;BYDAY=TH")
+    assert tasks.tasks["standup"]["datetime"] == "2030-01-03 09:00:00"
+    assert write(tasks, "bad", "2030-01-01 09:00:00", "FREQ=DAILY;COUNT=2").startswith("Error:")
+
+def test_due_scan_runs_one_off_and_reschedules_repeating(tasks, monkeypatch):
+    write(tasks, "once", "2030-01-01 08:00:00")
+    write(tasks, "daily", "2030-01-01 09:00:00", "daily")
+    write(tasks, "future", "2030-02-01 09:00:00")
+
+    due = due_at(tasks, monkeypatch, datetime(2030, 1, 1, 9, 0, 30))
+    assert [(task["id"], task["scheduled"], task["late"]) for task in due] == [
+        ("once", "2030-01-01 08:00:00", True),
+        ("daily", "2030-01-01 09:00:00", False),
+    ]
+    assert "once" not in tasks.tasks
+    assert tasks.index == [("2030-01-02 09:00:00", "daily"), ("2030-02-01 09:00:00", "future")]
+
+@pytest.mark.parametrize("policy, expected", [
+    ("skip", []),
+    ("run-once", ["2030-01-05 09:00:00"]),
+    ("run-all", [f"2030-01-0{day} 09:00:00" for day in range(1, 6)]),
+])
+def test_catch_up_policies(tasks, monkeypatch, policy, expected):
+    monkeypatch.setattr(tasks_module, "TASK_CATCH_UP", policy)
+    write(tasks, "daily", "2030-01-01 09:00:00", "daily")
+    due = due_at(tasks, monkeypatch, datetime(2030, 1, 5, 12))
+    assert [task["scheduled"] for task in due] == expected
+    assert tasks.tasks["daily"]["datetime"] == "2030-01-06 09:00:00"
@@ -0,0 +1,26 @@
+from types import SimpleNamespace
+
+from assistant.usage import UsageTracker, model_prices
+
+def test_dated_snapshots_use_their_model_prices():
+    assert model_prices("gpt-4.1-2025-04-14") == model_prices("gpt-4.1")
+    assert model_prices("gpt-4.1-mini-2025-04-14") == model_prices("gpt-4.1-mini")
+    assert model_prices("gpt-4.1x") is None
+    assert model_prices("some-new-model") is None
+
+def test_cost():
+    assert UsageTracker.cost("gpt-4.1-2025-04-14", 1_000_000, 500_000, 100_000) == 2.05
+    assert UsageTracker.cost("some-new-model", 1000, 0, 1000) is None
+
+def test_summary_attributes_input_to_tools(tmp_path):
+    tracker = UsageTracker(tmp_path / "usage.db")
+    usage = SimpleNamespace(input_tokens=1000, output_tokens=50,
+                            input_tokens_details=SimpleNamespace(cached_tokens=0),
+                            output_tokens_details=SimpleNamespace(reasoning_tokens=0))
+    tracker.record("turn", "user", "gpt-4.1-2025-04-14", usage, {"calendar": 0.25})
+    summary = tracker.summary()
+    assert "1 turns, 1 calls" in summary
+    assert "~$0.002" in summary
+    assert "calendar: 250 input tokens" in summary
+    indexes = {row[1] for row in tracker.db.execute("PRAGMA index_list(tool_tokens)")}
+    assert "tool_tokens_call_id" in indexes